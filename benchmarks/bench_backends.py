@@ -0,0 +1,100 @@
+"""
+Compare the C2PA reader backends on the same corpus.
+
+Every image of the synthetic corpus that the prescan cannot settle is read by each
+available backend: c2patool in a subprocess, with `fake_c2patool.py` standing in for it
+unless `GPTZERO_V_C2PATOOL` is set, the in-process c2pa-python bindings when installed,
+and the replay of the recorded manifests. Verdicts are checked against the replay. The
+synthetic manifest stores are not signed, so only the example images read cleanly with a
+real C2PA reader. Run from the repository root:
+
+    uv run --extra native python benchmarks/bench_backends.py [--runs 5]
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import build_corpus
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_C2PATOOL = Path(__file__).resolve().parent / "fake_c2patool.py"
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.c2pa_backends import (
+    C2PABackend,
+    C2PABackendError,
+    NativeBackend,
+    ReplayBackend,
+    SubprocessBackend,
+)
+from authenticity.c2pa_handler import prescan_c2pa
+
+
+def make_backends(recordings: Path) -> list[C2PABackend]:
+    """Returns the backends that can run here, pointing c2patool at the fake one if unset."""
+    os.environ.setdefault("GPTZERO_V_C2PATOOL", str(FAKE_C2PATOOL))
+    os.environ["FAKE_C2PATOOL_RECORDINGS"] = str(recordings)
+
+    backends: list[C2PABackend] = [SubprocessBackend()]
+    if importlib.util.find_spec("c2pa") is not None:
+        backends.append(NativeBackend())
+    backends.append(ReplayBackend(recordings))
+    return backends
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="reads of each image per backend")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = Path(directory)
+        images = []
+        for entry in build_corpus(corpus_dir):
+            file_bytes = Path(entry.path).read_bytes()
+            early_result, mime_type = prescan_c2pa(file_bytes, entry.mime_type)
+            if early_result is None:
+                images.append((Path(entry.path).name, file_bytes, mime_type))
+
+        backends = make_backends(corpus_dir / "recordings")
+        replay = backends[-1]
+        expected = {name: replay.check(file_bytes, mime)[0] for name, file_bytes, mime in images}
+
+        sys.stdout.write(f"{len(images)} images carrying a manifest store, {args.runs} runs\n\n")
+        sys.stdout.write(
+            f"{'backend':<12}{'mean (ms)':>11}{'p50 (ms)':>10}{'max (ms)':>10}"
+            f"{'errors':>8}{'agree':>7}\n"
+        )
+        for backend in backends:
+            timings = []
+            errors = agreements = 0
+            for name, file_bytes, mime_type in images:
+                for run in range(args.runs):
+                    started = time.perf_counter()
+                    try:
+                        is_generated, _, error = backend.check(file_bytes, mime_type)
+                    except C2PABackendError as e:
+                        is_generated, error = False, str(e)
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                    if run == 0:
+                        errors += error is not None
+                        agreements += error is None and is_generated == expected[name]
+
+            sys.stdout.write(
+                f"{backend.name:<12}{statistics.fmean(timings):>11.2f}"
+                f"{statistics.median(timings):>10.2f}{max(timings):>10.2f}"
+                f"{errors:>8}{agreements:>7}\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the lazy EXIF reader with the `exif` package on the example images.
+
+Run from the repository root:
+
+    uv run python benchmarks/bench_exif.py
+"""
+
+import io
+import sys
+import timeit
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+from exif import Image as ExifImage
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.exif_reader import read_exif
+
+
+# The fields displayed by the Streamlit EXIF card
+FIELDS = [
+    "exif_version",
+    "make",
+    "model",
+    "software",
+    "datetime_original",
+    "gps_latitude",
+    "gps_longitude",
+]
+
+
+def exif_package(file_bytes: bytes) -> list:
+    try:
+        exif_img = ExifImage(io.BytesIO(file_bytes))
+        if not exif_img.has_exif:
+            return []
+        return [exif_img.get(field) for field in FIELDS]
+    except Exception:
+        return []
+
+
+def exif_reader(file_bytes: bytes) -> list:
+    exif_record = read_exif(file_bytes)
+    if exif_record is None:
+        return []
+    return [getattr(exif_record, field) for field in FIELDS]
+
+
+def peak_memory(function, file_bytes: bytes) -> int:
+    tracemalloc.start()
+    result = function(file_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def main() -> None:
+    sys.stdout.write(f"{'image':<28}{'parser':<14}{'mean (us)':>12}{'peak (KiB)':>12}\n")
+
+    for path in sorted((ROOT / "examples").iterdir()):
+        file_bytes = path.read_bytes()
+        for name, function in [("exif", exif_package), ("exif_reader", exif_reader)]:
+            timer = timeit.Timer(partial(function, file_bytes))
+            number, _ = timer.autorange()
+            mean = min(timer.repeat(repeat=5, number=number)) / number
+            peak = peak_memory(function, file_bytes)
+            sys.stdout.write(f"{path.name:<28}{name:<14}{mean * 1e6:>12.1f}{peak / 1024:>12.1f}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Compare the selective manifest parser with `json.loads` on deliberately bloated manifests.
+
+The recorded GPT-4o manifest is inflated with base64 thumbnails, a chain of ingredient
+manifests and a long action history, then written to disk and parsed both ways as
+c2patool would hand it over: read whole for `json.loads`, streamed for `parse_manifest`.
+The provenance walk of `C2PAMetadata.from_manifest` is then timed on ingredient chains of
+growing depth. Run from the repository root:
+
+    uv run python benchmarks/bench_manifest.py [--sizes 1 16 64] [--depths 10 1000 100000]
+"""
+
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+MANIFEST = Path(__file__).resolve().parent / "manifests" / "gpt-4o.json"
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.c2pa_metadata import C2PAMetadata
+from authenticity.manifest_parser import parse_manifest
+
+
+def bloat(manifest: dict, size: int, ingredients: int = 32, actions: int = 2000) -> dict:
+    """Inflate a manifest to about `size` bytes, keeping what `from_manifest` reads intact."""
+    manifest = json.loads(json.dumps(manifest))
+    thumbnail = base64.b64encode(os.urandom(size * 3 // 4 // (ingredients + 1))).decode()
+
+    for store in (entry["assertion_store"] for entry in manifest["manifests"].values()):
+        store["c2pa.thumbnail.claim.png"] = {"format": "image/png", "data": thumbnail}
+        history = store.setdefault("c2pa.actions.v2", {"actions": []})["actions"]
+        history.extend(
+            {"action": "c2pa.edited", "parameters": {"step": index, "blob": thumbnail[:256]}}
+            for index in range(actions // len(manifest["manifests"]))
+        )
+
+    for index in range(ingredients - len(manifest["manifests"]) + 1):
+        manifest["manifests"][f"urn:uuid:ingredient-{index}"] = {
+            "claim": {"claim_generator_info": {"name": "Editor"}, "instanceID": str(index)},
+            "signature": {"alg": "ps256", "issuer": "Editor"},
+            "assertion_store": {"c2pa.thumbnail.ingredient.png": {"data": thumbnail}},
+        }
+    return manifest
+
+
+def chain(depth: int) -> dict:
+    """Build a manifest store where every manifest has the next one as its ingredient."""
+    manifests = {}
+    for index in range(depth):
+        store: dict = {
+            "c2pa.actions.v2": {
+                "actions": [{"action": "c2pa.edited", "softwareAgent": {"name": f"Editor {index}"}}]
+            }
+        }
+        if index + 1 < depth:
+            store["c2pa.ingredient.v3"] = {
+                "activeManifest": {"url": f"self#jumbf=/c2pa/{index + 1}"}
+            }
+        manifests[str(index)] = {"claim": {}, "signature": {}, "assertion_store": store}
+    return {"active_manifest": "0", "manifests": manifests}
+
+
+def baseline(path: Path) -> C2PAMetadata:
+    return C2PAMetadata.from_manifest(json.loads(path.read_bytes()))
+
+
+def selective(path: Path) -> C2PAMetadata:
+    with path.open("rb") as stream:
+        return C2PAMetadata.from_manifest(parse_manifest(stream))
+
+
+def measure(function: Callable[[Path], C2PAMetadata], path: Path) -> tuple[float, int]:
+    """Returns the best time out of three runs, in seconds, and the peak traced memory."""
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        function(path)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 16, 64], help="manifest sizes in MB"
+    )
+    parser.add_argument(
+        "--depths", type=int, nargs="+", default=[10, 1000, 100000], help="ingredient chain depths"
+    )
+    args = parser.parse_args()
+
+    manifest = json.loads(MANIFEST.read_bytes())
+    sys.stdout.write(f"{'size (MB)':<12}{'parser':<16}{'time (ms)':>12}{'peak (MiB)':>12}\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = Path(directory) / f"manifest-{size}.json"
+            path.write_text(json.dumps(bloat(manifest, size * 2**20), indent=2))
+            if baseline(path) != selective(path):
+                msg = f"Parsers disagree on the {size} MB manifest"
+                raise RuntimeError(msg)
+
+            actual = path.stat().st_size / 2**20
+            for name, function in [("json.loads", baseline), ("parse_manifest", selective)]:
+                elapsed, peak = measure(function, path)
+                sys.stdout.write(
+                    f"{actual:<12.1f}{name:<16}{elapsed * 1e3:>12.1f}{peak / 2**20:>12.2f}\n"
+                )
+
+    sys.stdout.write(f"\n{'depth':<12}{'time (ms)':>12}{'per manifest (us)':>20}\n")
+    for depth in args.depths:
+        manifest = chain(depth)
+        # As timeit does, so that collections of the input do not blur the scaling
+        gc.disable()
+        started = time.perf_counter()
+        metadata = C2PAMetadata.from_manifest(manifest)
+        elapsed = time.perf_counter() - started
+        gc.enable()
+        if len(metadata.provenance) != depth:
+            msg = f"The walk missed manifests of the {depth}-deep chain"
+            raise RuntimeError(msg)
+        sys.stdout.write(f"{depth:<12}{elapsed * 1e3:>12.1f}{elapsed / depth * 1e6:>20.2f}\n")
+
+
+if __name__ == "__main__":
+    main()
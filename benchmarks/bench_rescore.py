@@ -0,0 +1,123 @@
+"""
+Compare re-scoring stored analyses with re-analysing their images through c2patool.
+
+The synthetic corpus is analysed once into an analysis store, whose rows are then
+replicated up to `--rows`. Every pass re-scores the whole store under a new version of the
+generator rules at one batch size, re-running only the manifest interpretation, the rule
+matching and the scoring; the baseline re-reads the corpus images carrying a manifest with
+c2patool, with `fake_c2patool.py` standing in for it unless `GPTZERO_V_C2PATOOL` is set.
+Run from the repository root:
+
+    uv run python benchmarks/bench_rescore.py [--rows 100000] [--batch-sizes 1 256 1024 4096]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import BUCKETS, build_corpus
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_C2PATOOL = Path(__file__).resolve().parent / "fake_c2patool.py"
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.c2pa_backends import PRESCAN_TOOL, ReplayBackend, SubprocessBackend
+from authenticity.c2pa_handler import prescan_c2pa
+from authenticity.exif_handler import check_exif
+from authenticity.rules import GeneratorRules, get_generator_rules
+from authenticity.store import AnalysisStore
+
+
+def fill_store(store: AnalysisStore, corpus_dir: Path, rows: int) -> list[tuple[bytes, str]]:
+    """
+    Record the corpus in `store` and replicate its rows up to `rows`.
+    Returns the images carrying a manifest, to re-read with c2patool.
+    """
+    replay = ReplayBackend(corpus_dir / "recordings")
+    with_manifest = []
+    for entry in build_corpus(corpus_dir, {"small": BUCKETS["small"]}):
+        file_bytes = Path(entry.path).read_bytes()
+        early_result, mime_type = prescan_c2pa(file_bytes, entry.mime_type)
+        if early_result is None:
+            reading, tool = replay.read(file_bytes, mime_type, paths=True), replay.tool
+            with_manifest.append((file_bytes, mime_type))
+        else:
+            reading, tool = (None, early_result[2]), PRESCAN_TOOL
+        _, exif_record = check_exif(file_bytes)
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        store.record(digest, entry.path, mime_type, reading, tool, exif_record)
+
+    originals = len(store)
+    with sqlite3.connect(store.db_path) as db:
+        # Copies of the recorded rows under made-up hashes, with the same inputs
+        db.execute(
+            "INSERT INTO analyses SELECT analyses.sha256 || '-' || copy.n, analyses.path, "
+            "mime_type, output, read_error, exif, forensics, tool_version, rules_version, "
+            "scoring_version, c2pa_generated, c2pa_generator, c2pa_rule, c2pa_error, "
+            "probability, analyzed_at FROM analyses, (WITH RECURSIVE copy(n) AS "
+            "(SELECT 1 UNION ALL SELECT n + 1 FROM copy WHERE n < ?) SELECT n FROM copy) AS copy "
+            "LIMIT ?",
+            (-(-rows // originals), rows - originals),
+        )
+    return with_manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000, help="analyses in the store")
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[1, 256, 1024, 4096],
+        help="re-scoring batches",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = Path(directory)
+        store = AnalysisStore(corpus_dir / "store.db")
+        with_manifest = fill_store(store, corpus_dir, args.rows)
+        rows = len(store)
+
+        os.environ.setdefault("GPTZERO_V_C2PATOOL", str(FAKE_C2PATOOL))
+        os.environ["FAKE_C2PATOOL_RECORDINGS"] = str(corpus_dir / "recordings")
+        subprocess_backend = SubprocessBackend()
+        started = time.perf_counter()
+        for file_bytes, mime_type in with_manifest:
+            subprocess_backend.check(file_bytes, mime_type)
+        reread = len(with_manifest) / (time.perf_counter() - started)
+
+        sys.stdout.write(f"{rows} stored analyses, {len(with_manifest)} distinct manifests\n\n")
+        sys.stdout.write(f"{'pass':<22}{'time (s)':>10}{'analyses/s':>14}{'rescored':>10}\n")
+        sys.stdout.write(
+            f"{'c2patool re-read':<22}{rows / reread:>10.1f}{reread:>14,.0f}{'':>10}\n"
+        )
+
+        base = get_generator_rules()
+        for index, batch_size in enumerate(args.batch_sizes):
+            # A new rules version makes every stored verdict stale
+            rules = GeneratorRules(base.rules, version=f"{base.version}-bench{index}")
+            summary = store.rescore(batch_size=batch_size, rules=rules)
+            sys.stdout.write(
+                f"{f'rescore, batch {batch_size}':<22}{summary.elapsed_s:>10.2f}"
+                f"{summary.throughput:>14,.0f}{summary.rescored:>10}\n"
+            )
+
+        up_to_date = store.rescore(rules=rules)
+        sys.stdout.write(
+            f"{'rescore, up to date':<22}{up_to_date.elapsed_s:>10.3f}"
+            f"{'':>14}{up_to_date.rescored:>10}\n"
+        )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
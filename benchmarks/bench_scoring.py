@@ -0,0 +1,85 @@
+"""
+Compare batch scoring with NumPy against scoring one image per Python call.
+
+Random analyses are scored with the three-branch function the scorer replaced, with the
+`compute_probability` wrapper, and in batches from stored columns with
+`Scorer.score_columns`, from stored columns and from C2PA metadata objects through
+`feature_columns`. Run from the repository root:
+
+    uv run python benchmarks/bench_scoring.py [--rows 1000000]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parents[1]
+MANIFEST = Path(__file__).resolve().parent / "manifests" / "gpt-4o.json"
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.authenticity import compute_probability
+from authenticity.c2pa_metadata import C2PAMetadata
+from authenticity.scoring import feature_columns, get_scorer
+
+
+def three_branches(c2pa_generated: bool, exif_present: bool) -> int:
+    """The scoring function before the scorer, kept as the per-call reference."""
+    if c2pa_generated:
+        return 95
+    if not exif_present:
+        return 50
+    return 10
+
+
+def timed(function: Callable[[], object]) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of analyses")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    generated = rng.random(args.rows) < 0.2
+    exif = rng.random(args.rows) < 0.5
+    pairs = list(zip(generated.tolist(), exif.tolist(), strict=True))
+    metadata = C2PAMetadata.from_manifest(json.loads(MANIFEST.read_text()))
+    metadata_column = [metadata if g else None for g in generated.tolist()]
+
+    scorer = get_scorer()
+    runs = {
+        "three_branches": lambda: [three_branches(g, e) for g, e in pairs],
+        "compute_probability": lambda: [compute_probability(g, e) for g, e in pairs],
+        "score_columns": lambda: scorer.score_columns(
+            {"c2pa_generated": generated, "exif_present": exif}
+        ),
+        "feature_columns": lambda: scorer.score_columns(
+            feature_columns(generated, metadata_column, exif)
+        ),
+    }
+
+    reference = None
+    sys.stdout.write(f"{'scorer':<22}{'time (ms)':>12}{'rows/s':>16}\n")
+    for name, function in runs.items():
+        elapsed, result = timed(function)
+        result = np.asarray(result)
+        if reference is None:
+            reference = result
+        elif not np.array_equal(result, reference):
+            msg = f"{name} disagrees with the reference scores"
+            raise RuntimeError(msg)
+        sys.stdout.write(f"{name:<22}{elapsed * 1e3:>12.1f}{args.rows / elapsed:>16,.0f}\n")
+
+
+if __name__ == "__main__":
+    main()
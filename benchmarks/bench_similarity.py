@@ -0,0 +1,92 @@
+"""
+Compare near-duplicate search in the multi-index hash table with a linear NumPy scan.
+
+Random 64-bit perceptual hashes are indexed, then queried with copies of some of them
+with a few bits flipped, as a screenshot or re-encoding would, and with fresh hashes
+matching nothing. Both searches must find the same neighbours. Run from the repository
+root:
+
+    uv run python benchmarks/bench_similarity.py [--sizes 100000 1000000] [--queries 1000]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.similarity import MAX_DISTANCE, HashIndex
+
+
+def linear_search(hashes: np.ndarray, phash: int, max_distance: int) -> list[tuple[int, int]]:
+    """Returns the (distance, position) of every hash within `max_distance`, scanning them all."""
+    distances = np.bitwise_count(hashes ^ np.uint64(phash))
+    positions = np.flatnonzero(distances <= max_distance)
+    return sorted(zip(distances[positions].tolist(), positions.tolist(), strict=True))
+
+
+def percentiles(timings: list[float]) -> tuple[float, float]:
+    """Returns the p50 and p99 of `timings`, in microseconds."""
+    cuts = statistics.quantiles(timings, n=100)
+    return cuts[49] * 1e6, cuts[98] * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="indexed hashes"
+    )
+    parser.add_argument("--queries", type=int, default=1000, help="queries per size")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sys.stdout.write(
+        f"{'hashes':<12}{'search':<10}{'build (s)':>12}{'p50 (us)':>12}{'p99 (us)':>12}\n"
+    )
+
+    for size in args.sizes:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        started = time.perf_counter()
+        index = HashIndex()
+        for position, phash in enumerate(hashes):
+            index.add(phash, position)
+        build = time.perf_counter() - started
+        array = np.array(hashes, dtype=np.uint64)
+
+        # Half the queries are near copies of indexed hashes, half match nothing
+        queries = []
+        for _ in range(args.queries // 2):
+            flipped = rng.sample(range(64), rng.randint(0, MAX_DISTANCE))
+            queries.append(rng.choice(hashes) ^ sum(1 << bit for bit in flipped))
+            queries.append(rng.getrandbits(64))
+
+        timings: dict[str, list[float]] = {"index": [], "linear": []}
+        for query in queries:
+            started = time.perf_counter()
+            found = index.search(query, MAX_DISTANCE)
+            timings["index"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            expected = linear_search(array, query, MAX_DISTANCE)
+            timings["linear"].append(time.perf_counter() - started)
+
+            if found != expected:
+                msg = f"The index missed neighbours of {query:#018x} among {size} hashes"
+                raise RuntimeError(msg)
+
+        for name, samples in timings.items():
+            p50, p99 = percentiles(samples)
+            setup = f"{build:>12.1f}" if name == "index" else f"{'':>12}"
+            sys.stdout.write(f"{size:<12}{name:<10}{setup}{p50:>12.1f}{p99:>12.1f}\n")
+
+
+if __name__ == "__main__":
+    main()
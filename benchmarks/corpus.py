@@ -0,0 +1,170 @@
+"""
+Build a reproducible synthetic image corpus for the benchmarks.
+
+Every combination of format, size bucket, EXIF presence and C2PA presence is generated,
+alongside copies of the `examples/` images. Images carrying a manifest get a C2PA-like
+JUMBF box embedded in their container, and the manifest returned for them by
+`fake_c2patool.py` is recorded under `<corpus>/recordings`.
+
+    uv run python benchmarks/corpus.py /tmp/corpus
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import shutil
+import struct
+import sys
+import zlib
+from dataclasses import asdict, dataclass
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+ROOT = Path(__file__).resolve().parents[1]
+MANIFESTS_DIR = Path(__file__).resolve().parent / "manifests"
+
+# Approximate encoded size of each bucket, in bytes
+BUCKETS = {"small": 64 * 1024, "medium": 1024 * 1024, "large": 8 * 1024 * 1024}
+
+FORMATS = {
+    "JPEG": ("image/jpeg", ".jpg"),
+    "PNG": ("image/png", ".png"),
+    "WEBP": ("image/webp", ".webp"),
+}
+
+# Encoded bytes per pixel of RGB noise, used to size the images of a bucket
+_BYTES_PER_PIXEL = {"JPEG": 0.95, "PNG": 3.0, "WEBP": 0.85}
+
+# Recorded manifests of the example images, by file name
+EXAMPLE_MANIFESTS = {"GPT-4o.png": "gpt-4o.json"}
+
+C2PA_JUMBF_TYPE = bytes.fromhex("6332706100110010800000aa00389b71")
+
+
+@dataclass
+class CorpusEntry:
+    """One image of the corpus."""
+
+    path: str
+    mime_type: str
+    bucket: str
+    exif: bool
+    c2pa: bool
+    size: int
+
+
+def make_exif() -> Image.Exif:
+    exif = Image.Exif()
+    exif[0x010F] = "Google"
+    exif[0x0110] = "Pixel 8"
+    exif[0x0131] = "HDR+ 1.0.0"
+    exif.get_ifd(0x8769)[0x9000] = b"0232"
+    exif.get_ifd(0x8769)[0x9003] = "2024:05:01 10:20:30"
+    gps = exif.get_ifd(0x8825)
+    gps[0x0001], gps[0x0002] = "N", (44.0, 24.0, 30.5)
+    gps[0x0003], gps[0x0004] = "E", (8.0, 55.0, 12.25)
+    return exif
+
+
+def make_jumbf(manifest: bytes) -> bytes:
+    """Wrap a manifest in a JUMBF superbox labelled as a C2PA manifest store."""
+    description = C2PA_JUMBF_TYPE + b"\x03" + b"c2pa\x00"
+    jumd = struct.pack(">I4s", 8 + len(description), b"jumd") + description
+    json_box = struct.pack(">I4s", 8 + len(manifest), b"json") + manifest
+    return struct.pack(">I4s", 8 + len(jumd) + len(json_box), b"jumb") + jumd + json_box
+
+
+def embed_jumbf(data: bytes, image_format: str, jumbf: bytes) -> bytes:
+    """Insert a JUMBF box where C2PA places it in each container."""
+    if image_format == "JPEG":
+        # APP11: common identifier, box instance, packet sequence, then the box
+        payload = b"JP" + struct.pack(">HI", 1, 1) + jumbf
+        segment = b"\xff\xeb" + struct.pack(">H", 2 + len(payload)) + payload
+        return data[:2] + segment + data[2:]
+
+    if image_format == "PNG":
+        # Right after the 8-byte signature and the 25-byte IHDR chunk
+        crc = zlib.crc32(b"caBX" + jumbf)
+        chunk = struct.pack(">I4s", len(jumbf), b"caBX") + jumbf + struct.pack(">I", crc)
+        return data[:33] + chunk + data[33:]
+
+    chunk = struct.pack("<4sI", b"C2PA", len(jumbf)) + jumbf + b"\x00" * (len(jumbf) & 1)
+    body = data[12:] + chunk
+    return b"RIFF" + struct.pack("<I", 4 + len(body)) + b"WEBP" + body
+
+
+def make_image(image_format: str, target_size: int, exif: bool, rng: np.random.Generator) -> bytes:
+    side = max(16, int((target_size / _BYTES_PER_PIXEL[image_format]) ** 0.5))
+    pixels = rng.integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+
+    stream = io.BytesIO()
+    options = {"exif": make_exif()} if exif else {}
+    if image_format != "PNG":
+        options["quality"] = 90
+    Image.fromarray(pixels).save(stream, image_format, **options)
+    return stream.getvalue()
+
+
+def build_corpus(
+    directory: Path, buckets: dict[str, int] | None = None, seed: int = 0
+) -> list[CorpusEntry]:
+    """Generate the corpus into `directory` and return its entries."""
+    buckets = buckets or BUCKETS
+    rng = np.random.default_rng(seed)
+    recordings = directory / "recordings"
+    recordings.mkdir(parents=True, exist_ok=True)
+    manifest = (MANIFESTS_DIR / "gpt-4o.json").read_bytes()
+
+    entries = []
+    for (image_format, (mime_type, extension)), bucket, exif, c2pa in product(
+        FORMATS.items(), buckets, (False, True), (False, True)
+    ):
+        data = make_image(image_format, buckets[bucket], exif, rng)
+        if c2pa:
+            data = embed_jumbf(data, image_format, make_jumbf(manifest))
+            digest = hashlib.sha256(data).hexdigest()
+            (recordings / f"{digest}.json").write_bytes(manifest)
+
+        name = f"{bucket}-{'exif' if exif else 'noexif'}-{'c2pa' if c2pa else 'noc2pa'}{extension}"
+        path = directory / name
+        path.write_bytes(data)
+        entries.append(CorpusEntry(str(path), mime_type, bucket, exif, c2pa, len(data)))
+
+    for example in sorted((ROOT / "examples").iterdir()):
+        path = directory / example.name
+        shutil.copyfile(example, path)
+        data = path.read_bytes()
+        c2pa = example.name in EXAMPLE_MANIFESTS
+        if c2pa:
+            recording = (MANIFESTS_DIR / EXAMPLE_MANIFESTS[example.name]).read_bytes()
+            (recordings / f"{hashlib.sha256(data).hexdigest()}.json").write_bytes(recording)
+
+        mime_type = "image/png" if example.suffix == ".png" else "image/jpeg"
+        exif = data.startswith(b"\xff\xd8") and b"Exif\x00\x00" in data[:65536]
+        entries.append(CorpusEntry(str(path), mime_type, "example", exif, c2pa, len(data)))
+
+    (directory / "corpus.json").write_text(json.dumps([asdict(entry) for entry in entries]))
+    return entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the synthetic benchmark corpus.")
+    parser.add_argument("directory", type=Path, help="output directory")
+    parser.add_argument(
+        "--buckets", default=",".join(BUCKETS), help="comma-separated size buckets to generate"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    buckets = {name: BUCKETS[name] for name in args.buckets.split(",")}
+    entries = build_corpus(args.directory, buckets, args.seed)
+    sys.stdout.write(f"wrote {len(entries)} images to {args.directory}\n")
+
+
+if __name__ == "__main__":
+    main()
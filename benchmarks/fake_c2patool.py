@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for `c2patool -d <path>` replaying recorded manifests.
+
+Point the app at it with `GPTZERO_V_C2PATOOL=benchmarks/fake_c2patool.py`.
+Manifests are looked up in `FAKE_C2PATOOL_RECORDINGS` as `<sha256 of the file>.json`;
+files without a recording behave like images without Content Credentials.
+`FAKE_C2PATOOL_LATENCY` adds a fixed delay, in seconds, to every invocation.
+"""
+
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> int:
+    if len(sys.argv) != 3 or sys.argv[1] != "-d":
+        sys.stderr.write("usage: fake_c2patool.py -d <path>\n")
+        return 2
+
+    time.sleep(float(os.environ.get("FAKE_C2PATOOL_LATENCY", "0")))
+
+    digest = hashlib.sha256(Path(sys.argv[2]).read_bytes()).hexdigest()
+    recordings = Path(os.environ.get("FAKE_C2PATOOL_RECORDINGS", "recordings"))
+    recording = recordings / f"{digest}.json"
+
+    if not recording.exists():
+        sys.stderr.write("Error: No claim found\n")
+        return 1
+
+    sys.stdout.write(recording.read_text(encoding="utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
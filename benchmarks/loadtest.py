@@ -0,0 +1,348 @@
+"""
+End-to-end load test of the analysis service.
+
+Concurrent sessions repeatedly post images of the synthetic corpus to `/analyze`, drawn
+from a mix of size buckets, each session waiting for its answer before sending the next
+image. By default a local `uvicorn service:app` is started with `fake_c2patool.py`
+standing in for c2patool, so that the test runs offline; pass `--url` to load a running
+service instead, e.g. the Docker container, and `--pid` to sample its processes.
+
+Throughput, p50/p95/p99 latency, error rate, and the process count and RSS of the service
+over time are reported. With `--sweep`, the test is repeated at growing concurrency, with
+the local service pinned to `--cpus` cores, to find the knee of the throughput curve:
+
+    uv run python benchmarks/loadtest.py --sessions 8 --duration 20
+    uv run python benchmarks/loadtest.py --sweep 1 2 4 8 16 32 --cpus 2 -o load.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import pairwise
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from corpus import BUCKETS, build_corpus
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_C2PATOOL = Path(__file__).resolve().parent / "fake_c2patool.py"
+
+# Share of each size bucket in the uploads, skewed towards phone-sized images
+DEFAULT_MIX = "small=0.6,medium=0.3,large=0.1"
+
+
+@dataclass
+class Level:
+    """Outcome of the load test at one concurrency level."""
+
+    sessions: int
+    duration: float
+    requests: int = 0
+    errors: int = 0
+    rejected: int = 0
+    throughput: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    peak_processes: int = 0
+    peak_rss_mb: float = 0.0
+    samples: list[dict] = field(default_factory=list)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse `bucket=weight,...` into bucket weights."""
+    weights = {}
+    for item in mix.split(","):
+        bucket, _, weight = item.partition("=")
+        if bucket not in BUCKETS:
+            msg = f"Unknown size bucket {bucket!r}, expected one of {sorted(BUCKETS)}"
+            raise ValueError(msg)
+        weights[bucket] = float(weight)
+    return weights
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_service(
+    port: int, recordings: Path, latency: float, cpus: int | None
+) -> subprocess.Popen:
+    """Start the service on `port` with the fake c2patool, pinned to the first `cpus` cores."""
+    environment = {
+        **os.environ,
+        "GPTZERO_V_C2PATOOL": str(FAKE_C2PATOOL),
+        "FAKE_C2PATOOL_RECORDINGS": str(recordings),
+        "FAKE_C2PATOOL_LATENCY": str(latency),
+    }
+    process = subprocess.Popen(
+        [
+            *(sys.executable, "-m", "uvicorn", "service:app"),
+            *("--port", str(port), "--log-level", "warning"),
+        ],
+        cwd=ROOT / "src",
+        env=environment,
+    )
+    # c2patool runs inherit the affinity of the service
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(process.pid, range(cpus))
+    return process
+
+
+def wait_until_healthy(url: str, timeout: float = 60.0) -> None:
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    msg = f"The service at {url} did not become healthy within {timeout:g} seconds"
+    raise RuntimeError(msg)
+
+
+def process_tree(pid: int) -> tuple[int, float]:
+    """Returns the number of processes rooted at `pid` and their total RSS in MiB, from /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name is parenthesised and may contain spaces
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    count, rss_kb = 0, 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            continue
+        count += 1
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                rss_kb += int(line.split()[1])
+        pending.extend(children.get(current, ()))
+    return count, rss_kb / 1024
+
+
+def sample(pid: int, interval: float, stop: threading.Event, samples: list[dict]) -> None:
+    started = time.monotonic()
+    while not stop.wait(interval):
+        processes, rss_mb = process_tree(pid)
+        samples.append(
+            {"t": round(time.monotonic() - started, 2), "processes": processes, "rss_mb": rss_mb}
+        )
+
+
+def session(
+    url: str,
+    images: list[tuple[bytes, str]],
+    weights: list[float],
+    deadline: float,
+    seed: int,
+    results: list[tuple[float, bool, bool]],
+) -> None:
+    """Post images one after the other until `deadline`, recording (latency, error, rejected)."""
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+
+    while time.monotonic() < deadline:
+        file_bytes, mime_type = rng.choices(images, weights)[0]
+        started = time.perf_counter()
+        try:
+            connection.request(
+                "POST", "/analyze", body=file_bytes, headers={"Content-Type": mime_type}
+            )
+            response = connection.getresponse()
+            body = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status, body = 0, b""
+        latency = time.perf_counter() - started
+
+        error = status != 200 or json.loads(body).get("c2pa_error") is not None
+        results.append((latency, error, status == 429))
+
+
+def run_level(
+    url: str,
+    sessions: int,
+    duration: float,
+    images: list[tuple[bytes, str]],
+    weights: list[float],
+    pid: int | None,
+    interval: float,
+) -> Level:
+    results: list[tuple[float, bool, bool]] = []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=session, args=(url, images, weights, deadline, index, results))
+        for index in range(sessions)
+    ]
+
+    level = Level(sessions=sessions, duration=duration)
+    stop = threading.Event()
+    sampler = None
+    if pid is not None and Path("/proc").is_dir():
+        sampler = threading.Thread(target=sample, args=(pid, interval, stop, level.samples))
+        sampler.start()
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+    if sampler is not None:
+        sampler.join()
+
+    latencies = sorted(latency * 1000 for latency, _, _ in results)
+    level.requests = len(results)
+    level.errors = sum(error for _, error, _ in results)
+    level.rejected = sum(rejected for _, _, rejected in results)
+    level.throughput = len(results) / elapsed
+    level.p50_ms = percentile(latencies, 0.50)
+    level.p95_ms = percentile(latencies, 0.95)
+    level.p99_ms = percentile(latencies, 0.99)
+    level.peak_processes = max((point["processes"] for point in level.samples), default=0)
+    level.peak_rss_mb = max((point["rss_mb"] for point in level.samples), default=0.0)
+    return level
+
+
+def find_knee(levels: list[Level], min_gain: float) -> Level:
+    """
+    Returns the level past which adding sessions raises throughput by less than
+    `min_gain`, i.e. only adds latency.
+    """
+    for previous, current in pairwise(levels):
+        if current.throughput < previous.throughput * (1 + min_gain):
+            return previous
+    return levels[-1]
+
+
+def report(level: Level) -> None:
+    sys.stdout.write(
+        f"{level.sessions:>9}{level.requests:>10}{level.throughput:>10.1f}"
+        f"{level.p50_ms:>10.0f}{level.p95_ms:>10.0f}{level.p99_ms:>10.0f}"
+        f"{level.error_rate:>9.1%}{level.peak_processes:>7}{level.peak_rss_mb:>10.0f}\n"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="running service to load, e.g. http://localhost:8000")
+    parser.add_argument("--pid", type=int, help="process of the running service to sample")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument(
+        "--sweep", type=int, nargs="+", help="session counts to sweep instead of --sessions"
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="bucket=weight,... of image sizes")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="fake c2patool latency, in seconds"
+    )
+    parser.add_argument("--cpus", type=int, help="cores the local service is pinned to")
+    parser.add_argument("--interval", type=float, default=0.5, help="sampling period, in seconds")
+    parser.add_argument(
+        "--knee-gain", type=float, default=0.1, help="throughput gain below which the curve bends"
+    )
+    parser.add_argument("-o", "--output", type=Path, help="JSON file of the levels and samples")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels_to_run = args.sweep or [args.sessions]
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = Path(directory)
+        entries = [
+            entry
+            for entry in build_corpus(corpus_dir, {name: BUCKETS[name] for name in mix})
+            if entry.bucket in mix
+        ]
+        counts = {bucket: sum(entry.bucket == bucket for entry in entries) for bucket in mix}
+        images = [(Path(entry.path).read_bytes(), entry.mime_type) for entry in entries]
+        weights = [mix[entry.bucket] / counts[entry.bucket] for entry in entries]
+
+        service = None
+        url, pid = args.url, args.pid
+        if url is None:
+            port = free_port()
+            service = start_service(port, corpus_dir / "recordings", args.latency, args.cpus)
+            url, pid = f"http://127.0.0.1:{port}", service.pid
+
+        try:
+            wait_until_healthy(url)
+            sys.stdout.write(
+                f"{'sessions':>9}{'requests':>10}{'req/s':>10}{'p50 (ms)':>10}"
+                f"{'p95 (ms)':>10}{'p99 (ms)':>10}{'errors':>9}{'procs':>7}{'RSS (MB)':>10}\n"
+            )
+            levels = []
+            for sessions in levels_to_run:
+                level = run_level(url, sessions, args.duration, images, weights, pid, args.interval)
+                levels.append(level)
+                report(level)
+        finally:
+            if service is not None:
+                service.terminate()
+                service.wait()
+
+    knee = None
+    if len(levels) > 1:
+        knee = find_knee(levels, args.knee_gain)
+        cores = args.cpus or os.cpu_count()
+        sys.stdout.write(
+            f"\nknee at {knee.sessions} sessions on {cores} cores: "
+            f"{knee.throughput:.1f} req/s, p99 {knee.p99_ms:.0f} ms\n"
+        )
+
+    if args.output is not None:
+        output = {
+            "url": args.url,
+            "cpus": args.cpus,
+            "mix": mix,
+            "fake_c2patool_latency": None if args.url else args.latency,
+            "knee_sessions": knee.sessions if knee else None,
+            "levels": [{**asdict(level), "error_rate": level.error_rate} for level in levels],
+        }
+        args.output.write_text(json.dumps(output, indent=2))
+        sys.stdout.write(f"wrote {len(levels)} levels to {args.output}\n")
+
+
+if __name__ == "__main__":
+    main()
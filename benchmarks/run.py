@@ -0,0 +1,175 @@
+"""
+Per-stage latency benchmark of the analysis pipeline.
+
+Each image of the synthetic corpus is pushed through every stage separately, with
+`fake_c2patool.py` standing in for c2patool so that no real binary is needed. Results are
+saved as JSON; pass a previous results file with `--baseline` to compare releases.
+
+    uv run python benchmarks/run.py -o results.json [--baseline previous.json]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+from corpus import BUCKETS, CorpusEntry, build_corpus
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_C2PATOOL = Path(__file__).resolve().parent / "fake_c2patool.py"
+
+sys.path.insert(0, str(ROOT / "src"))
+
+from authenticity.authenticity import compute_probability
+from authenticity.c2pa_handler import c2pa_check_from_binary
+from authenticity.c2pa_metadata import C2PAMetadata
+from authenticity.exif_handler import check_exif
+from authenticity.forensics import check_forensics
+from authenticity.manifest_parser import parse_manifest
+from authenticity.metadata_utils import C2PATOOL_VERSION
+from components.probability import Probability
+
+
+def measure(function: Callable[[], object], budget: float, max_runs: int = 1000) -> dict:
+    """Run `function` repeatedly within a time budget and summarise the latencies, in us."""
+    timings = []
+    deadline = time.perf_counter() + budget
+    while len(timings) < 3 or (time.perf_counter() < deadline and len(timings) < max_runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1e6)
+
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p95_us": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min_us": timings[0],
+    }
+
+
+def benchmark_entry(entry: CorpusEntry, recordings: Path, budget: float) -> list[dict]:
+    file_bytes = Path(entry.path).read_bytes()
+    stages: dict[str, Callable[[], object]] = {
+        # Streamlit hands uploads over as an in-memory BytesIO subclass
+        "upload_read": lambda: io.BytesIO(file_bytes).read(),
+        "c2pa_check_from_binary": lambda: c2pa_check_from_binary(file_bytes, entry.mime_type),
+        "check_exif": lambda: check_exif(file_bytes),
+        "check_forensics": lambda: check_forensics(file_bytes),
+    }
+
+    recording = recordings / f"{hashlib.sha256(file_bytes).hexdigest()}.json"
+    if recording.exists():
+        output = recording.read_text(encoding="utf-8")
+        manifest = json.loads(output)
+        stages["json_loads"] = lambda: json.loads(output)
+        stages["parse_manifest"] = lambda: parse_manifest(output)
+        stages["from_manifest"] = lambda: C2PAMetadata.from_manifest(manifest)
+
+    c2pa_generated, _, c2pa_error = c2pa_check_from_binary(file_bytes, entry.mime_type)
+    if c2pa_error:
+        msg = f"C2PA stage failed on {entry.path}: {c2pa_error}"
+        raise RuntimeError(msg)
+
+    exif_present, _ = check_exif(file_bytes)
+    probability = compute_probability(c2pa_generated, exif_present)
+    stages["compute_probability"] = lambda: compute_probability(c2pa_generated, exif_present)
+    stages["Probability"] = lambda: Probability(probability)
+
+    return [
+        {
+            "image": Path(entry.path).name,
+            "bucket": entry.bucket,
+            "mime_type": entry.mime_type,
+            "size": entry.size,
+            "exif": entry.exif,
+            "c2pa": entry.c2pa,
+            "stage": stage,
+            **measure(function, budget),
+        }
+        for stage, function in stages.items()
+    ]
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "c2patool_version": C2PATOOL_VERSION,
+    }
+
+
+def compare(results: list[dict], baseline: list[dict]) -> None:
+    """Print the mean latency change of every stage, aggregated over the corpus."""
+
+    def totals(rows: list[dict]) -> dict[str, float]:
+        stage_totals: dict[str, float] = {}
+        for row in rows:
+            stage_totals[row["stage"]] = stage_totals.get(row["stage"], 0.0) + row["mean_us"]
+        return stage_totals
+
+    current, previous = totals(results), totals(baseline)
+    sys.stdout.write(f"{'stage':<26}{'baseline (us)':>16}{'current (us)':>16}{'change':>10}\n")
+    for stage, total in current.items():
+        if stage in previous:
+            change = (total / previous[stage] - 1) * 100
+            sys.stdout.write(f"{stage:<26}{previous[stage]:>16.1f}{total:>16.1f}{change:>+9.1f}%\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the analysis.")
+    parser.add_argument("-o", "--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path, help="previous results to compare against")
+    parser.add_argument(
+        "--buckets", default=",".join(BUCKETS), help="comma-separated size buckets to generate"
+    )
+    parser.add_argument("--budget", type=float, default=0.2, help="seconds spent per stage")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = Path(directory)
+        buckets = {name: BUCKETS[name] for name in args.buckets.split(",")}
+        entries = build_corpus(corpus_dir, buckets)
+
+        os.environ["GPTZERO_V_C2PATOOL"] = str(FAKE_C2PATOOL)
+        os.environ["FAKE_C2PATOOL_RECORDINGS"] = str(corpus_dir / "recordings")
+
+        results = []
+        for entry in entries:
+            results.extend(benchmark_entry(entry, corpus_dir / "recordings", args.budget))
+
+    args.output.write_text(json.dumps({"environment": environment(), "results": results}, indent=2))
+    sys.stdout.write(f"wrote {len(results)} measurements to {args.output}\n")
+
+    if args.baseline is not None:
+        compare(results, json.loads(args.baseline.read_text())["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Cold-start benchmark of the Streamlit app.
+
+Every run starts a fresh interpreter that imports `handler`, renders the page once in
+Streamlit's bare mode, then analyses `examples/GPT-4o.png` the way the analysis tab does,
+with `fake_c2patool.py` standing in for c2patool. Median timings are printed, in ms.
+
+    uv run python benchmarks/startup.py [--runs 10]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_C2PATOOL = Path(__file__).resolve().parent / "fake_c2patool.py"
+EXAMPLE = ROOT / "examples" / "GPT-4o.png"
+MANIFEST = Path(__file__).resolve().parent / "manifests" / "gpt-4o.json"
+
+CHILD = """
+import json
+import sys
+import time
+
+started = time.perf_counter()
+import handler
+imported = time.perf_counter()
+handler.main()
+rendered = time.perf_counter()
+
+# Uploading takes the user longer than warming up, which older revisions did not do
+if hasattr(handler, "start_warm_up"):
+    handler.start_warm_up().join()
+uploaded = time.perf_counter()
+
+from authenticity.authenticity import compute_probability
+from authenticity.cache import cached_c2pa_check, cached_check_exif
+from components.probability import Probability
+
+file_bytes = open(sys.argv[1], "rb").read()
+c2pa_generated, _, _ = cached_c2pa_check(
+    handler.get_result_cache(), file_bytes, "image/png", check=handler.get_c2pa_pool().check
+)
+exif_present, _ = cached_check_exif(handler.get_result_cache(), file_bytes)
+Probability(compute_probability(c2pa_generated, exif_present))
+analysed = time.perf_counter()
+
+json.dump(
+    {
+        "import_ms": (imported - started) * 1000,
+        "first_render_ms": (rendered - imported) * 1000,
+        "first_analysis_ms": (analysed - uploaded) * 1000,
+    },
+    sys.stdout,
+)
+"""
+
+
+def run_once(environment: dict[str, str]) -> dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, str(EXAMPLE)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT / "src",
+        env=environment,
+    )
+    return json.loads(result.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the app.")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as recordings:
+        digest = hashlib.sha256(EXAMPLE.read_bytes()).hexdigest()
+        (Path(recordings) / f"{digest}.json").write_bytes(MANIFEST.read_bytes())
+
+        environment = {
+            **os.environ,
+            "GPTZERO_V_C2PATOOL": str(FAKE_C2PATOOL),
+            "FAKE_C2PATOOL_RECORDINGS": recordings,
+        }
+        runs = [run_once(environment) for _ in range(args.runs)]
+
+    for metric in runs[0]:
+        median = statistics.median(run[metric] for run in runs)
+        sys.stdout.write(f"{metric:<20}{median:>10.1f}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import struct
+import tarfile
+import zipfile
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+
+from .media import ImageBuffer, map_file
+from .metadata_utils import mime_map
+
+
+# Extensions of the archive members analysed, as for image files on disk
+IMAGE_EXTENSIONS = frozenset(mime_map.values()) | {".jpeg", ".tif", ".heif"}
+
+# Fixed part of a zip local file header, followed by the member name and an extra field
+_ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+
+class ArchiveMemberError(Exception):
+    """An archive member cannot be read, e.g. as it is corrupt or encrypted."""
+
+
+@dataclass(frozen=True, slots=True)
+class ArchiveMember:
+    """
+    An image inside a zip or tar archive, located without extracting it.
+
+    Members of zip and uncompressed tar archives are read from the archive by whoever
+    analyses them, the tar ones at `offset`; members of compressed tar archives can only
+    be reached by decompressing the stream in order, so their contents travel as `data`.
+    """
+
+    archive: str
+    name: str
+    size: int
+    offset: int | None = None
+    data: bytes | None = None
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the member, inside the archive, as `zipfile.Path` spells it."""
+        return f"{self.archive}/{self.name}"
+
+
+def is_archive(path: Path) -> bool:
+    """Whether `path` is a zip or tar archive, judging by its contents."""
+    return path.is_file() and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def is_image_name(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def iter_archive_members(archive: Path, max_size: int | None = None) -> Iterator[ArchiveMember]:
+    """
+    Yield the images inside a zip or tar archive, in archive order, without extracting it.
+
+    Only the members of compressed tar archives are read here, one at a time as the
+    iteration advances; those over `max_size` bytes are yielded without their contents.
+    """
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zip_file:
+            for info in zip_file.infolist():
+                if not info.is_dir() and is_image_name(info.filename):
+                    yield ArchiveMember(str(archive), info.filename, info.file_size)
+        return
+
+    try:
+        tar_file = tarfile.open(archive, "r:")
+    except tarfile.ReadError:
+        yield from _iter_tar_stream(archive, max_size)
+        return
+
+    with tar_file:
+        # Members are listed lazily, and dropped once yielded to keep memory flat
+        for info in tar_file:
+            if info.isfile() and is_image_name(info.name):
+                yield ArchiveMember(str(archive), info.name, info.size, offset=info.offset_data)
+            tar_file.members = []
+
+
+def _iter_tar_stream(archive: Path, max_size: int | None) -> Iterator[ArchiveMember]:
+    with tarfile.open(archive, "r|*") as tar_file:
+        for info in tar_file:
+            if not info.isfile() or not is_image_name(info.name):
+                tar_file.members = []
+                continue
+            if max_size is not None and info.size > max_size:
+                yield ArchiveMember(str(archive), info.name, info.size)
+                tar_file.members = []
+                continue
+
+            stream = tar_file.extractfile(info)
+            data = stream.read() if stream is not None else b""
+            yield ArchiveMember(str(archive), info.name, info.size, data=data)
+            tar_file.members = []
+
+
+@lru_cache(maxsize=4)
+def _open_zip(archive: str) -> zipfile.ZipFile:
+    # Kept open across members, as opening reads the whole central directory
+    return zipfile.ZipFile(archive)
+
+
+@contextmanager
+def open_member(member: ArchiveMember) -> Iterator[ImageBuffer]:
+    """
+    Yield the contents of an archive member, as a zero-copy view into the memory-mapped
+    archive where the member is stored uncompressed, and decompressed otherwise.
+    Raises `ArchiveMemberError` when the member cannot be read.
+    """
+    if member.data is not None:
+        yield member.data
+        return
+
+    offset = member.offset
+    if offset is None:
+        try:
+            offset, data = _read_zip_member(member)
+        except (
+            zipfile.BadZipFile,
+            RuntimeError,  # Encrypted
+            NotImplementedError,  # Unsupported compression
+            EOFError,
+            OSError,
+            zlib.error,
+        ) as e:
+            msg = f"Cannot read {member.path}: {e!s}"
+            raise ArchiveMemberError(msg) from e
+        if data is not None:
+            yield data
+            return
+
+    with map_file(member.archive) as archive_bytes:
+        view = archive_bytes[offset : offset + member.size]
+        try:
+            yield view
+        finally:
+            view.release()
+
+
+def _read_zip_member(member: ArchiveMember) -> tuple[int, None] | tuple[None, bytes]:
+    """Returns the offset of the data of a stored zip member, or the data of any other."""
+    zip_file = _open_zip(member.archive)
+    info = zip_file.getinfo(member.name)
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        # Checked against the CRC as it is decompressed
+        return None, zip_file.read(info)
+
+    with open(member.archive, "rb") as file:
+        file.seek(info.header_offset)
+        signature, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(
+            file.read(_ZIP_LOCAL_HEADER.size)
+        )
+    if signature != b"PK\x03\x04":
+        msg = f"Bad local header of zip member {member.name}"
+        raise zipfile.BadZipFile(msg)
+    return info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length, None
@@ -0,0 +1,407 @@
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from .archives import (
+    ArchiveMember,
+    ArchiveMemberError,
+    is_archive,
+    iter_archive_members,
+    open_member,
+)
+from .c2pa_backends import c2pa_read
+from .c2pa_handler import C2PAReading, C2PAResult, interpret_reading
+from .jumbf import sniff_mime_type
+from .manifest_parser import MANIFEST_PATHS
+from .media import MAX_UPLOAD_BYTES, ImageBuffer, check_size, map_file
+from .metadata_utils import mime_map
+from .pipeline import AnalysisResult, analyze_image, get_forensic_check
+from .rules import get_generator_rules
+from .store import get_analysis_store
+
+
+# Bytes of compressed archive members read ahead of the workers
+DEFAULT_READ_AHEAD = 256 * 2**20
+
+
+@dataclass
+class BatchRecord:
+    """Analysis outcome of a single image, written as one JSONL line."""
+
+    path: str
+    mime_type: str | None
+    c2pa_generated: bool
+    c2pa_generator: str | None
+    c2pa_rule: str | None
+    c2pa_error: str | None
+    exif_present: bool
+    probability: int | None
+    elapsed_ms: float
+    thumbnail_mismatch: float | None = None
+    ela_inconsistency: float | None = None
+    # SHA-256 of the close copy with provenance the image was scored on, if any
+    near_duplicate: str | None = None
+    # Why the image could not be analysed at all, e.g. too large or an unreadable archive member
+    error: str | None = None
+
+
+@dataclass
+class BatchSummary:
+    """Totals of a batch run."""
+
+    analyzed: int
+    skipped: int
+    errors: int
+    elapsed_s: float
+
+    @property
+    def throughput(self) -> float:
+        """Returns the number of analysed images per second."""
+        return self.analyzed / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def iter_image_paths(root: Path) -> Iterator[Path]:
+    """Yield the image files under `root`, in a stable order, whose extension is supported."""
+    if root.is_file():
+        yield root
+        return
+
+    extensions = set(mime_map.values()) | {".jpeg", ".tif", ".heif"}
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix.lower() in extensions:
+            yield path
+
+
+def build_record(
+    path: str, mime_type: str | None, analysis: AnalysisResult, started: float
+) -> BatchRecord:
+    """Combine the stage outcomes of one image, scored as in the UI, into a record."""
+    c2pa_metadata = analysis.c2pa_metadata
+    forensic_report = analysis.forensic_report
+    rule_match = get_generator_rules().match(c2pa_metadata) if c2pa_metadata else None
+
+    return BatchRecord(
+        path=path,
+        mime_type=mime_type,
+        c2pa_generated=analysis.c2pa_generated,
+        c2pa_generator=c2pa_metadata.generator_name if c2pa_metadata else None,
+        c2pa_rule=rule_match.rule if rule_match else None,
+        c2pa_error=analysis.c2pa_error,
+        exif_present=analysis.exif_present,
+        probability=analysis.probability,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        thumbnail_mismatch=getattr(forensic_report, "thumbnail_mismatch", None),
+        ela_inconsistency=getattr(forensic_report, "ela_inconsistency", None),
+        near_duplicate=getattr(analysis.near_duplicate, "sha256", None),
+    )
+
+
+def error_record(path: str, error: str, started: float | None = None) -> BatchRecord:
+    """Returns the record of an image whose analysis failed outright."""
+    return BatchRecord(
+        path=path,
+        mime_type=mimetypes.guess_type(path)[0],
+        c2pa_generated=False,
+        c2pa_generator=None,
+        c2pa_rule=None,
+        c2pa_error=None,
+        exif_present=False,
+        probability=None,
+        elapsed_ms=(time.perf_counter() - started) * 1000 if started is not None else 0.0,
+        error=error,
+    )
+
+
+def analyze_buffer(
+    path: str,
+    file_bytes: ImageBuffer,
+    started: float,
+    timeout: float | None = None,
+    source_path: str | None = None,
+    store_path: str | None = None,
+) -> dict[str, Any]:
+    """
+    Run the C2PA, EXIF and probability stages over the contents of the image at `path`.
+    c2patool reads `source_path` in place when the contents are a file on disk, and the
+    inputs of the analysis are recorded in the analysis store at `store_path` if given,
+    with the whole reader output.
+    """
+    readings: list[tuple[C2PAReading, str | None]] = []
+    # The store keeps the whole output, for interpretations reading more of it later
+    paths = True if store_path is not None else MANIFEST_PATHS
+
+    def check_c2pa(data: ImageBuffer, mime: str) -> C2PAResult:
+        reading, tool = c2pa_read(data, mime, timeout=timeout, source_path=source_path, paths=paths)
+        readings.append((reading, tool))
+        return interpret_reading(reading)
+
+    mime_type = sniff_mime_type(file_bytes) or mimetypes.guess_type(path)[0]
+    analysis = analyze_image(
+        file_bytes,
+        mime_type or "",
+        c2pa_check=check_c2pa,
+        forensic_check=get_forensic_check(),
+    )
+
+    record = build_record(path, mime_type, analysis, started)
+    if store_path is not None:
+        reading, tool = readings[0]
+        get_analysis_store(store_path).record(
+            hashlib.sha256(file_bytes).hexdigest(),
+            path,
+            mime_type,
+            reading,
+            tool,
+            analysis.exif_record,
+            analysis.forensic_report,
+        )
+    return asdict(record)
+
+
+def analyze_path(
+    path: str, timeout: float | None = None, store_path: str | None = None
+) -> dict[str, Any]:
+    """
+    Run the C2PA, EXIF and probability stages over one image file.
+    The file is memory-mapped, and c2patool reads it in place.
+    """
+    started = time.perf_counter()
+
+    size_error = check_size(Path(path).stat().st_size)
+    if size_error:
+        return asdict(error_record(path, size_error, started))
+
+    with map_file(path) as file_bytes:
+        return analyze_buffer(path, file_bytes, started, timeout, path, store_path)
+
+
+def analyze_member(
+    member: ArchiveMember, timeout: float | None = None, store_path: str | None = None
+) -> dict[str, Any]:
+    """
+    Run the C2PA, EXIF and probability stages over one image inside an archive,
+    read straight from the archive without extracting it. A member that cannot be read
+    gets an error record.
+    """
+    started = time.perf_counter()
+
+    size_error = check_size(member.size)
+    if size_error:
+        return asdict(error_record(member.path, size_error, started))
+
+    try:
+        with open_member(member) as file_bytes:
+            return analyze_buffer(member.path, file_bytes, started, timeout, store_path=store_path)
+    except ArchiveMemberError as e:
+        return asdict(error_record(member.path, str(e), started))
+
+
+def iter_images(root: Path) -> Iterator[Path | ArchiveMember]:
+    """Yield the images of a directory, an image file, or the members of a zip or tar archive."""
+    if is_archive(root):
+        return iter_archive_members(root, max_size=MAX_UPLOAD_BYTES)
+    return iter_image_paths(root)
+
+
+def image_path(image: Path | ArchiveMember) -> str:
+    """Returns the path an image is recorded under, inside its archive for archive members."""
+    return image.path if isinstance(image, ArchiveMember) else str(image)
+
+
+def load_done_paths(output: Path) -> set[str]:
+    """Returns the paths already recorded in a JSONL output, skipping a torn last line."""
+    done: set[str] = set()
+    if not output.exists():
+        return done
+
+    with output.open(encoding="utf-8") as lines:
+        for line in lines:
+            try:
+                done.add(json.loads(line)["path"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+
+def drop_torn_line(output: Path) -> None:
+    """Truncate a JSONL output back to its last complete line, so that appending resumes it."""
+    if not output.exists():
+        return
+
+    with output.open("r+b") as sink:
+        end = sink.seek(0, os.SEEK_END)
+        # Scan back in blocks from the end for the last newline
+        position = end
+        while position > 0:
+            block = min(position, 64 * 2**10)
+            sink.seek(position - block)
+            newline = sink.read(block).rfind(b"\n")
+            if newline != -1:
+                position += newline - block + 1
+                break
+            position -= block
+        if position != end:
+            sink.truncate(position)
+
+
+def iter_batch(
+    paths: Iterable[Path | ArchiveMember],
+    workers: int | None = None,
+    timeout: float | None = None,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+    store_path: str | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Analyse images across a process pool, yielding records as they complete.
+    At most a few tasks per worker are in flight, holding at most `read_ahead` bytes of
+    archive members read in advance, so `paths` is consumed lazily and memory stays flat.
+    An image whose analysis raises gets an error record, and the batch goes on.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    # Future -> path and bytes held of every task in flight
+    pending: dict[Future, tuple[str, int]] = {}
+    held = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path in paths:
+            if isinstance(path, ArchiveMember):
+                future = executor.submit(analyze_member, path, timeout, store_path)
+                size = len(path.data) if path.data is not None else 0
+            else:
+                future = executor.submit(analyze_path, str(path), timeout, store_path)
+                size = 0
+            pending[future] = (image_path(path), size)
+            held += size
+
+            while len(pending) >= max_in_flight or (held > read_ahead and len(pending) > 1):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    done_path, done_size = pending.pop(future)
+                    held -= done_size
+                    yield _result(future, done_path)
+
+        for future in as_completed(pending):
+            yield _result(future, pending[future][0])
+
+
+def _result(future: Future, path: str) -> dict[str, Any]:
+    try:
+        return future.result()
+    except Exception as e:
+        return asdict(error_record(path, f"Error analysing the image: {e!s}"))
+
+
+def run_batch(
+    root: Path,
+    output: Path,
+    workers: int | None = None,
+    timeout: float | None = None,
+    resume: bool = True,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+    store: Path | None = None,
+) -> BatchSummary:
+    """
+    Analyse every image under `root`, or inside it when it is a zip or tar archive, and
+    append one JSONL record per image to `output`, and their inputs to the analysis store
+    at `store` if given, for `authenticity.store` to re-score them.
+    With `resume`, images already recorded in `output` are skipped, and a line torn by a
+    crash is dropped, its image being analysed again.
+    """
+    done = set()
+    if resume:
+        drop_torn_line(output)
+        done = load_done_paths(output)
+    skipped = 0
+
+    def todo() -> Iterator[Path | ArchiveMember]:
+        nonlocal skipped
+        for image in iter_images(root):
+            if image_path(image) in done:
+                skipped += 1
+                continue
+            yield image
+
+    analyzed = errors = 0
+    started = time.perf_counter()
+    store_path = str(store) if store is not None else None
+
+    with output.open("a" if resume else "w", encoding="utf-8") as sink:
+        for record in iter_batch(
+            todo(), workers=workers, timeout=timeout, read_ahead=read_ahead, store_path=store_path
+        ):
+            # Flush per record so a crash loses at most the in-flight images
+            sink.write(json.dumps(record) + "\n")
+            sink.flush()
+            analyzed += 1
+            errors += record["c2pa_error"] is not None or record["error"] is not None
+
+    return BatchSummary(
+        analyzed=analyzed,
+        skipped=skipped,
+        errors=errors,
+        elapsed_s=time.perf_counter() - started,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m authenticity.batch",
+        description="Analyse the authenticity of every image in a directory or an archive.",
+    )
+    parser.add_argument(
+        "root", type=Path, help="image file, directory, or zip or tar archive to analyse"
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, default=Path("results.jsonl"), help="JSONL output file"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=30.0, help="c2patool timeout in seconds"
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true", help="overwrite the output instead of resuming"
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=float,
+        default=DEFAULT_READ_AHEAD / 2**20,
+        help="MB of compressed archive members read ahead of the workers",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=os.environ.get("GPTZERO_V_STORE_PATH"),
+        help="SQLite analysis store to record the inputs of every analysis in, for re-scoring",
+    )
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.root,
+        args.output,
+        workers=args.workers,
+        timeout=args.timeout,
+        resume=not args.no_resume,
+        read_ahead=int(args.read_ahead * 2**20),
+        store=args.store,
+    )
+
+    sys.stderr.write(
+        f"analyzed {summary.analyzed} images ({summary.skipped} skipped, {summary.errors} errors) "
+        f"in {summary.elapsed_s:.2f}s: {summary.throughput:.1f} images/sec\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+import asyncio
+import hashlib
+import subprocess
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from . import instrumentation
+from .c2pa_handler import (
+    C2PAReading,
+    C2PAResult,
+    interpret_reading,
+    prescan_c2pa,
+    read_with_c2patool,
+    read_with_c2patool_async,
+)
+from .manifest_parser import MANIFEST_PATHS, parse_manifest
+from .media import BufferReader, ImageBuffer
+from .metadata_utils import (
+    get_c2pa_backend_names,
+    get_c2pa_binary_path,
+    get_c2pa_recordings_dir,
+    get_c2patool_version,
+    mime_map,
+)
+
+
+NO_BACKEND_ERROR = "No C2PA reader is available: install c2patool or the c2pa-python bindings"
+
+# Tool of the readings settled by the prescan, without running any reader
+PRESCAN_TOOL = "prescan"
+
+
+class C2PABackendError(Exception):
+    """A backend cannot read an image, e.g. for lack of support; the next backend may."""
+
+
+class C2PABackend(ABC):
+    """
+    Reader of the C2PA manifest store of prescanned images.
+
+    Backends read the `(manifest, error_message)` of images they can read, including
+    images without a manifest, and raise `C2PABackendError` for those they cannot, so that
+    the next backend is tried; `check` interprets the reading into the
+    `(is_generated, c2pa_metadata_obj, error_message)` contract.
+    """
+
+    name = ""
+    version = ""
+
+    @property
+    def tool(self) -> str:
+        """Returns the name and version of the reader, as analysis stores record them."""
+        return f"{self.name} {self.version}"
+
+    @abstractmethod
+    def read(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+        paths: Any = MANIFEST_PATHS,
+    ) -> C2PAReading:
+        """
+        Read the manifest store of an image, pruned to `paths` as by `parse_manifest`,
+        or raise `C2PABackendError`. Returns tuple: (manifest, error_message).
+        """
+
+    async def read_async(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ) -> C2PAReading:
+        """Same as `read`, but awaited, on a worker thread unless the backend is asynchronous."""
+        return await asyncio.to_thread(
+            self.read, file_bytes, mime_type, timeout, memory_limit=memory_limit
+        )
+
+    def check(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+    ) -> C2PAResult:
+        return interpret_reading(
+            self.read(file_bytes, mime_type, timeout, source_path, memory_limit, on_start)
+        )
+
+
+class SubprocessBackend(C2PABackend):
+    """c2patool in a subprocess, which honours timeouts, memory limits and cancellation."""
+
+    name = "subprocess"
+
+    def __init__(self) -> None:
+        self.version = get_c2patool_version()
+
+    def read(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+        paths: Any = MANIFEST_PATHS,
+    ) -> C2PAReading:
+        binary_path = get_c2pa_binary_path()
+        if binary_path is None:
+            msg = "Unsupported platform or missing binary"
+            raise C2PABackendError(msg)
+
+        try:
+            return read_with_c2patool(
+                binary_path,
+                file_bytes,
+                mime_map[mime_type],
+                timeout,
+                source_path,
+                memory_limit,
+                on_start,
+                paths,
+            )
+        except OSError as e:
+            msg = f"Error running c2patool: {e!s}"
+            raise C2PABackendError(msg) from e
+
+    async def read_async(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ) -> C2PAReading:
+        """Same as `read`, but awaits c2patool through an asyncio subprocess."""
+        binary_path = get_c2pa_binary_path()
+        if binary_path is None:
+            msg = "Unsupported platform or missing binary"
+            raise C2PABackendError(msg)
+
+        try:
+            return await read_with_c2patool_async(
+                binary_path, file_bytes, mime_map[mime_type], timeout, memory_limit
+            )
+        except OSError as e:
+            msg = f"Error running c2patool: {e!s}"
+            raise C2PABackendError(msg) from e
+
+
+class NativeBackend(C2PABackend):
+    """
+    The c2pa-python bindings, reading the image bytes in-process without spawning
+    anything. Reads cannot be timed out, memory-capped or cancelled.
+    """
+
+    name = "native"
+
+    def __init__(self) -> None:
+        import c2pa
+
+        self._c2pa = c2pa
+        self.version = c2pa.__version__
+
+    def read(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,  # noqa: ARG002
+        source_path: str | Path | None = None,  # noqa: ARG002
+        memory_limit: int | None = None,  # noqa: ARG002
+        on_start: Callable[[subprocess.Popen], None] | None = None,  # noqa: ARG002
+        paths: Any = MANIFEST_PATHS,
+    ) -> C2PAReading:
+        try:
+            with instrumentation.span("c2pa_native"):
+                # Read through a view of the upload, without copying it
+                reader = self._c2pa.Reader.try_create(mime_type, BufferReader(file_bytes))
+                if reader is None:
+                    instrumentation.increment("c2pa_no_claim")
+                    return None, None
+                with reader:
+                    output = reader.detailed_json()
+        except self._c2pa.C2paError as e:
+            instrumentation.increment("c2pa_parse_errors")
+            return None, f"Error checking C2PA with c2pa-python: {e!s}"
+        except (OSError, ValueError) as e:
+            msg = f"Error running c2pa-python: {e!s}"
+            raise C2PABackendError(msg) from e
+
+        try:
+            with instrumentation.span("c2pa_json"):
+                manifest = parse_manifest(output, paths)
+        except ValueError:
+            instrumentation.increment("c2pa_parse_errors")
+            return None, "The image has C2PA metadata, but it cannot be decoded"
+        return manifest, None
+
+
+class ReplayBackend(C2PABackend):
+    """
+    Recorded c2patool outputs, named after the SHA-256 of the image they were recorded
+    from, as `fake_c2patool.py` reads them; images without a recording have no manifest.
+    For offline tests and benchmarks.
+    """
+
+    name = "replay"
+    version = "recorded"
+
+    def __init__(self, recordings: Path) -> None:
+        self.recordings = recordings
+
+    def read(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
+        source_path: str | Path | None = None,  # noqa: ARG002
+        memory_limit: int | None = None,  # noqa: ARG002
+        on_start: Callable[[subprocess.Popen], None] | None = None,  # noqa: ARG002
+        paths: Any = MANIFEST_PATHS,
+    ) -> C2PAReading:
+        recording = self.recordings / f"{hashlib.sha256(file_bytes).hexdigest()}.json"
+        try:
+            with recording.open("rb") as stream:
+                manifest = parse_manifest(stream, paths)
+        except FileNotFoundError:
+            instrumentation.increment("c2pa_no_claim")
+            return None, None
+        except ValueError:
+            instrumentation.increment("c2pa_parse_errors")
+            return None, "The image has C2PA metadata, but it cannot be decoded"
+        return manifest, None
+
+
+def create_backend(name: str) -> C2PABackend:
+    """Returns a new backend by name, one of `C2PA_BACKENDS`."""
+    if name == "subprocess":
+        return SubprocessBackend()
+    if name == "native":
+        return NativeBackend()
+    if name == "replay":
+        return ReplayBackend(get_c2pa_recordings_dir())
+    msg = f"Unknown C2PA backend: {name}"
+    raise ValueError(msg)
+
+
+class C2PABackendChain:
+    """
+    C2PA backends in order of preference: each image is read by the first backend able to,
+    falling back to the next one when a backend raises `C2PABackendError`.
+    """
+
+    def __init__(self, backends: list[C2PABackend]) -> None:
+        self.backends = backends
+
+    @classmethod
+    def from_env(cls) -> "C2PABackendChain":
+        """Build the chain of the backends configured by `GPTZERO_V_C2PA_BACKENDS` that can run."""
+        return cls([create_backend(name) for name in get_c2pa_backend_names()])
+
+    @property
+    def tools(self) -> list[str]:
+        """Returns the name and version of every backend, in order of preference."""
+        return [backend.tool for backend in self.backends]
+
+    def check(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+    ) -> C2PAResult:
+        """
+        Drop-in replacement for `c2pa_check_from_binary` reading through the backends.
+        The options only apply to the subprocess backend.
+        """
+        return interpret_reading(
+            self.read(file_bytes, mime_type, timeout, source_path, memory_limit, on_start)
+        )
+
+    def read(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+        paths: Any = MANIFEST_PATHS,
+    ) -> C2PAReading:
+        """
+        Same as `check`, but returns the manifest store read, uninterpreted, pruned to
+        `paths` as by `parse_manifest`. Returns tuple: (manifest, error_message).
+        """
+        reading, _ = self.read_with_tool(
+            file_bytes, mime_type, timeout, source_path, memory_limit, on_start, paths
+        )
+        return reading
+
+    def read_with_tool(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        source_path: str | Path | None = None,
+        memory_limit: int | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+        paths: Any = MANIFEST_PATHS,
+    ) -> tuple[C2PAReading, str | None]:
+        """
+        Same as `read`, but also returns the `tool` of the backend that answered,
+        `PRESCAN_TOOL` when the prescan settled the check and None when no backend could.
+        """
+        instrumentation.increment("bytes_processed", len(file_bytes))
+        if not self.backends:
+            return (None, NO_BACKEND_ERROR), None
+
+        early_result, mime_type = prescan_c2pa(file_bytes, mime_type)
+        if early_result is not None:
+            _, _, error = early_result
+            return (None, error), PRESCAN_TOOL
+
+        errors = []
+        for backend in self.backends:
+            try:
+                reading = backend.read(
+                    file_bytes, mime_type, timeout, source_path, memory_limit, on_start, paths
+                )
+            except C2PABackendError as e:
+                instrumentation.increment("c2pa_backend_fallbacks")
+                errors.append(f"{backend.name}: {e!s}")
+            else:
+                return reading, backend.tool
+        return (None, f"Every C2PA reader failed: {'; '.join(errors)}"), None
+
+    async def check_async(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ) -> C2PAResult:
+        """
+        Same as `check`, but awaited, so that many checks can be in flight on a single
+        event loop: c2patool runs in an asyncio subprocess, the other backends on threads.
+        """
+        reading, _ = await self.read_with_tool_async(file_bytes, mime_type, timeout, memory_limit)
+        return interpret_reading(reading)
+
+    async def read_with_tool_async(
+        self,
+        file_bytes: ImageBuffer,
+        mime_type: str,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ) -> tuple[C2PAReading, str | None]:
+        """Same as `read_with_tool`, but awaited, see `check_async`."""
+        instrumentation.increment("bytes_processed", len(file_bytes))
+        if not self.backends:
+            return (None, NO_BACKEND_ERROR), None
+
+        early_result, mime_type = prescan_c2pa(file_bytes, mime_type)
+        if early_result is not None:
+            _, _, error = early_result
+            return (None, error), PRESCAN_TOOL
+
+        errors = []
+        for backend in self.backends:
+            try:
+                reading = await backend.read_async(file_bytes, mime_type, timeout, memory_limit)
+            except C2PABackendError as e:
+                instrumentation.increment("c2pa_backend_fallbacks")
+                errors.append(f"{backend.name}: {e!s}")
+            else:
+                return reading, backend.tool
+        return (None, f"Every C2PA reader failed: {'; '.join(errors)}"), None
+
+
+@cache
+def get_c2pa_backends() -> C2PABackendChain:
+    """Returns the process-wide backend chain, built on first use."""
+    return C2PABackendChain.from_env()
+
+
+def c2pa_check(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+) -> C2PAResult:
+    """
+    Check for C2PA metadata through the configured backends.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    return get_c2pa_backends().check(
+        file_bytes, mime_type, timeout, source_path, memory_limit, on_start
+    )
+
+
+def c2pa_read(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+    paths: Any = MANIFEST_PATHS,
+) -> tuple[C2PAReading, str | None]:
+    """
+    Read the C2PA manifest store through the configured backends, for `interpret_reading`,
+    pruned to `paths` as by `parse_manifest`, e.g. True to keep the whole reader output.
+    Returns tuple: ((manifest, error_message), tool), see `C2PABackendChain.read_with_tool`.
+    """
+    return get_c2pa_backends().read_with_tool(
+        file_bytes, mime_type, timeout, source_path, memory_limit, on_start, paths
+    )
+
+
+async def c2pa_check_async(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> C2PAResult:
+    """
+    Same as `c2pa_check`, but awaited, see `C2PABackendChain.check_async`.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    return await get_c2pa_backends().check_async(file_bytes, mime_type, timeout, memory_limit)
@@ -1,78 +1,465 @@
-import json
+import asyncio
+import contextlib
+import mimetypes
+import signal
 import subprocess
 import tempfile
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
 
 from authenticity.c2pa_metadata import C2PAMetadata
 
+from . import instrumentation
+from .jumbf import has_c2pa_manifest, sniff_mime_type
+from .manifest_parser import CHUNK_SIZE, MANIFEST_PATHS, parse_manifest
+from .media import ImageBuffer
 from .metadata_utils import get_c2pa_binary_path, mime_map
+from .rules import get_generator_rules
+
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+C2PAResult = tuple[bool, C2PAMetadata | None, str | None]
+# What a C2PA reader read, before interpretation: the manifest store in c2patool's detailed
+# format, None without one, and the error message of a failed read
+C2PAReading = tuple[dict[str, Any] | None, str | None]
+
+# Memory-backed filesystem used to hand images to c2patool without touching disk
+SHARED_MEMORY_DIR = Path("/dev/shm")
+
+# Larger images are staged on disk, so that tmpfs does not hold a second copy of them in RAM
+SHARED_MEMORY_MAX_BYTES = 32 * 1024 * 1024
+
+TIMEOUT_ERROR = "C2PA check timed out after {} seconds"
+MEMORY_ERROR = "C2PA check ran over its memory limit of {:g} MB"
+
+# 1x1 grayscale PNG without a manifest, analysed once to warm c2patool up
+WARM_UP_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108000000003a7e9b55"
+    "0000000a49444154789c636000000002000148afa4710000000049454e44ae426082"
+)
+
+
+@dataclass
+class C2PAToolRun:
+    """Outcome of a c2patool run, with its output already parsed down to the paths kept."""
+
+    returncode: int
+    stderr: str
+    manifest: dict[str, Any] | None = None
+    parse_error: ValueError | None = None
+
+
+def get_scratch_dir(size: int = 0) -> str | None:
+    """
+    Returns a memory-backed directory for c2patool inputs of `size` bytes,
+    or None for the default temp dir.
+    """
+    if size <= SHARED_MEMORY_MAX_BYTES and SHARED_MEMORY_DIR.is_dir():
+        return str(SHARED_MEMORY_DIR)
+    return None
+
+
+def limit_memory(pid: int, memory_limit: int | None) -> None:
+    """
+    Cap the address space of a freshly started c2patool process at `memory_limit` bytes,
+    so that a hostile file makes its allocations fail rather than exhaust the host.
+    Only supported on Linux; elsewhere, and for processes already gone, does nothing.
+    """
+    if memory_limit is None or not hasattr(resource, "prlimit"):
+        return
+    with contextlib.suppress(ProcessLookupError):
+        resource.prlimit(pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def run_c2patool(
+    binary_path: Path,
+    file_bytes: ImageBuffer,
+    extension: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+    paths: Any = MANIFEST_PATHS,
+) -> C2PAToolRun:
+    """
+    Run c2patool in detailed mode over the image bytes, keeping the `paths` of its output,
+    see `parse_manifest`.
+
+    c2patool infers the container format from the file extension and cannot read stdin,
+    so the bytes are staged in a shared-memory file where available. When the image
+    already sits in `source_path` with a matching extension, c2patool reads it in place.
+    `on_start` is handed the process as soon as it runs, e.g. to kill it on cancellation.
+    """
+    if source_path is not None and mime_map.get(mimetypes.guess_type(source_path)[0]) == extension:
+        return _run_c2patool(binary_path, str(source_path), timeout, memory_limit, on_start, paths)
+
+    scratch_dir = get_scratch_dir(len(file_bytes))
+    with tempfile.NamedTemporaryFile(suffix=extension, dir=scratch_dir) as temp_file:
+        temp_file.write(file_bytes)
+        temp_file.flush()
+        return _run_c2patool(binary_path, temp_file.name, timeout, memory_limit, on_start, paths)
+
+
+def _run_c2patool(
+    binary_path: Path,
+    path: str,
+    timeout: float | None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+    paths: Any = MANIFEST_PATHS,
+) -> C2PAToolRun:
+    """
+    Parse the stdout of c2patool while it is being written, so that the whole output,
+    which embeds thumbnails and ingredient data, is never held in memory.
+    """
+    # stderr goes to a file, so that c2patool cannot block on it while stdout is read
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            [str(binary_path), "-d", path], stdout=subprocess.PIPE, stderr=stderr_file
+        )
+        limit_memory(process.pid, memory_limit)
+        if on_start is not None:
+            on_start(process)
+        expired = threading.Event()
+
+        def expire() -> None:
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, expire) if timeout is not None else None
+        if timer is not None:
+            timer.start()
+
+        manifest, parse_error = None, None
+        try:
+            with process:
+                try:
+                    manifest = parse_manifest(process.stdout, paths)
+                except ValueError as e:
+                    parse_error = e
+                # Let c2patool finish writing whatever was left unread
+                while process.stdout.read(CHUNK_SIZE):
+                    pass
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(process.args, timeout)
+
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+
+    return C2PAToolRun(process.returncode, stderr, manifest, parse_error)
+
+
+def warm_up_c2patool(timeout: float | None = 30.0) -> str | None:
+    """
+    Run c2patool once over a tiny image, so that the first real check does not pay for
+    loading the binary from disk, and compile the generator rules.
+    Returns an error message when c2patool cannot be run, None otherwise.
+    """
+    get_generator_rules()
+
+    binary_path = get_c2pa_binary_path()
+    if binary_path is None:
+        return "Unsupported platform or missing binary"
+
+    try:
+        result = run_c2patool(binary_path, WARM_UP_PNG, ".png", timeout)
+    except subprocess.TimeoutExpired:
+        return TIMEOUT_ERROR.format(timeout)
+    except OSError as e:
+        return f"Error running c2patool: {e!s}"
+
+    if result.returncode != 0 and result.stderr.strip() != "Error: No claim found":
+        return f"Error checking C2PA from binary: {result.stderr.strip()}"
+    return None
+
+
+def prepare_c2pa_check(
+    file_bytes: ImageBuffer, mime_type: str
+) -> tuple[C2PAResult | None, Path | None, str | None]:
+    """
+    Resolve the c2patool binary and the container extension of an image.
+    Returns tuple: (early_result, binary_path, extension); c2patool only needs to run
+    when early_result is None.
+    """
+    instrumentation.increment("bytes_processed", len(file_bytes))
+    binary_path = get_c2pa_binary_path()
+
+    if binary_path is None:
+        return (False, None, f"Unsupported platform or missing binary"), None, None
+
+    early_result, mime_type = prescan_c2pa(file_bytes, mime_type)
+    if early_result is not None:
+        return early_result, None, None
+
+    return None, binary_path, mime_map[mime_type]
+
+
+def prescan_c2pa(file_bytes: ImageBuffer, mime_type: str) -> tuple[C2PAResult | None, str]:
+    """
+    Resolve the MIME type of an image from its magic bytes, and settle the check early
+    when the image is unsupported or provably carries no manifest store.
+    Returns tuple: (early_result, mime_type); a C2PA reader only needs to run when
+    early_result is None.
+    """
+    with instrumentation.span("c2pa_prescan"):
+        # Trust the magic bytes over the browser-supplied MIME type
+        mime_type = sniff_mime_type(file_bytes) or mime_type
+
+        if mime_type not in mime_map:
+            return (False, None, f"Unsupported MIME type: {mime_type}"), mime_type
+
+        # Skip the reader run when the container provably carries no manifest store
+        if has_c2pa_manifest(file_bytes, mime_type) is False:
+            instrumentation.increment("c2pa_prescan_skips")
+            return (False, None, None), mime_type
+
+    return None, mime_type
 
 
 def c2pa_check_from_binary(
-    file_bytes: bytes, mime_type: str
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
 ) -> tuple[bool, C2PAMetadata | None, str | None]:
     """
     Check for C2PA metadata using platform-specific binaries.
+    Pass the `source_path` the bytes were read from to spare c2patool a copy of them,
+    and a `memory_limit` in bytes to cap the memory c2patool may use.
     Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
     """
-    binary_path = get_c2pa_binary_path()
+    early_result, binary_path, extension = prepare_c2pa_check(file_bytes, mime_type)
+    if early_result is not None:
+        return early_result
 
-    if binary_path is None:
-        return False, None, f"Unsupported platform or missing binary"
+    return check_with_c2patool(
+        binary_path, file_bytes, extension, timeout, source_path, memory_limit, on_start
+    )
+
+
+def check_with_c2patool(
+    binary_path: Path,
+    file_bytes: ImageBuffer,
+    extension: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+) -> C2PAResult:
+    """
+    Run c2patool over an image already prescanned by `prepare_c2pa_check` and interpret
+    its outcome. Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    return interpret_reading(
+        read_with_c2patool(
+            binary_path, file_bytes, extension, timeout, source_path, memory_limit, on_start
+        )
+    )
+
+
+def read_with_c2patool(
+    binary_path: Path,
+    file_bytes: ImageBuffer,
+    extension: str,
+    timeout: float | None = None,
+    source_path: str | Path | None = None,
+    memory_limit: int | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+    paths: Any = MANIFEST_PATHS,
+) -> C2PAReading:
+    """
+    Same as `check_with_c2patool`, but returns the manifest store c2patool read, uninterpreted,
+    pruned to `paths`. Returns tuple: (manifest, error_message).
+    """
+    try:
+        with instrumentation.span("c2patool"):
+            run = run_c2patool(
+                binary_path,
+                file_bytes,
+                extension,
+                timeout,
+                source_path,
+                memory_limit,
+                on_start,
+                paths,
+            )
+    except subprocess.TimeoutExpired:
+        instrumentation.increment("c2pa_timeouts")
+        return None, TIMEOUT_ERROR.format(timeout)
+
+    if memory_limit is not None and _ran_out_of_memory(run.returncode, run.stderr):
+        instrumentation.increment("c2pa_memory_errors")
+        return None, MEMORY_ERROR.format(memory_limit / 2**20)
+    return read_c2patool_run(run)
 
-    extension = mime_map.get(mime_type)
-    if extension is None:
-        return False, None, f"Unsupported MIME type: {mime_type}"
 
-    # Create a temporary file to save the image
-    with tempfile.NamedTemporaryFile(suffix=extension) as temp_file:
+async def c2pa_check_from_binary_async(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> tuple[bool, C2PAMetadata | None, str | None]:
+    """
+    Same as `c2pa_check_from_binary`, but awaits c2patool through an asyncio subprocess
+    so that many checks can be in flight on a single event loop.
+    """
+    early_result, binary_path, extension = prepare_c2pa_check(file_bytes, mime_type)
+    if early_result is not None:
+        return early_result
+
+    return interpret_reading(
+        await read_with_c2patool_async(binary_path, file_bytes, extension, timeout, memory_limit)
+    )
+
+
+async def read_with_c2patool_async(
+    binary_path: Path,
+    file_bytes: ImageBuffer,
+    extension: str,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> C2PAReading:
+    """
+    Same as `read_with_c2patool`, but awaits c2patool through an asyncio subprocess.
+    Returns tuple: (manifest, error_message).
+    """
+    scratch_dir = get_scratch_dir(len(file_bytes))
+    with tempfile.NamedTemporaryFile(suffix=extension, dir=scratch_dir) as temp_file:
         temp_file.write(file_bytes)
-        temp_file_path = temp_file.name
-        # Run the c2patool binary with the image file path as a parameter
-        result = subprocess.run(
-            [str(binary_path), "-d", temp_file_path], capture_output=True, text=True, check=False
+        temp_file.flush()
+
+        process = await asyncio.create_subprocess_exec(
+            str(binary_path),
+            "-d",
+            temp_file.name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
+        limit_memory(process.pid, memory_limit)
+        try:
+            with instrumentation.span("c2patool"):
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except TimeoutError:
+            instrumentation.increment("c2pa_timeouts")
+            return None, TIMEOUT_ERROR.format(timeout)
+        finally:
+            # Reap c2patool when timed out or cancelled
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    stderr = stderr.decode(errors="replace")
+    if memory_limit is not None and _ran_out_of_memory(process.returncode, stderr):
+        instrumentation.increment("c2pa_memory_errors")
+        return None, MEMORY_ERROR.format(memory_limit / 2**20)
+    return read_c2patool_output(process.returncode, stdout, stderr)
 
-    if result.returncode != 0:
-        stderr_stripped = result.stderr.strip()
+
+def parse_c2patool_result(
+    returncode: int, stdout: str | bytes, stderr: str
+) -> tuple[bool, C2PAMetadata | None, str | None]:
+    """
+    Interpret the outcome of a c2patool run whose output was captured whole.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    return interpret_reading(read_c2patool_output(returncode, stdout, stderr))
+
+
+def read_c2patool_output(returncode: int, stdout: str | bytes, stderr: str) -> C2PAReading:
+    """
+    Same as `parse_c2patool_result`, but returns the manifest store read, uninterpreted.
+    Returns tuple: (manifest, error_message).
+    """
+    run = C2PAToolRun(returncode, stderr)
+    if returncode == 0:
+        try:
+            with instrumentation.span("c2pa_json"):
+                run.manifest = parse_manifest(stdout)
+        except ValueError as e:
+            run.parse_error = e
+
+    return read_c2patool_run(run)
+
+
+# Return codes of c2patool killed for its memory use: by the OOM killer, or by a segfault
+# when the stack or a mapping cannot grow under the address-space limit
+_MEMORY_SIGNALS = {
+    -getattr(signal, name) for name in ("SIGKILL", "SIGSEGV") if hasattr(signal, name)
+}
+
+
+def _ran_out_of_memory(returncode: int, stderr: str) -> bool:
+    # Rust reports failed allocations before aborting, other runtimes before exiting;
+    # processes killed on a timeout or a cancellation are accounted for before this
+    return returncode in _MEMORY_SIGNALS or "memory allocation" in stderr or "MemoryError" in stderr
+
+
+def interpret_c2patool_run(run: C2PAToolRun) -> tuple[bool, C2PAMetadata | None, str | None]:
+    """
+    Interpret the outcome of a c2patool run.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    return interpret_reading(read_c2patool_run(run))
+
+
+def read_c2patool_run(run: C2PAToolRun) -> C2PAReading:
+    """
+    Extract the manifest store of a c2patool run, or the reason there is none.
+    Returns tuple: (manifest, error_message).
+    """
+    if run.returncode != 0:
+        stderr_stripped = run.stderr.strip()
         if stderr_stripped == "Error: No claim found":
-            return False, None, None  # Not generated, no manifest, no error
-        return False, None, f"Error checking C2PA from binary: {stderr_stripped}"
+            instrumentation.increment("c2pa_no_claim")
+            return None, None  # No manifest, no error
+        instrumentation.increment("c2pa_subprocess_failures")
+        return None, f"Error checking C2PA from binary: {stderr_stripped}"
+
+    if run.parse_error is not None:
+        instrumentation.increment("c2pa_parse_errors")
+        return None, "The image has C2PA metadata, but it cannot be decoded"
+
+    return run.manifest, None
+
+
+def interpret_reading(reading: C2PAReading) -> C2PAResult:
+    """
+    Interpret what a C2PA reader read, see `interpret_manifest`.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
+    manifest, error = reading
+    if error is not None or manifest is None:
+        return False, None, error
+    return interpret_manifest(manifest)
+
 
-    # Capture the output and try to parse it as JSON
-    output = result.stdout
+def interpret_manifest(manifest: dict[str, Any]) -> C2PAResult:
+    """
+    Interpret a manifest store in c2patool's detailed format, whichever reader produced it.
+    Returns tuple: (is_generated, c2pa_metadata_obj, error_message).
+    """
     try:
-        manifest = json.loads(output)
-        c2pa_metadata = C2PAMetadata.from_manifest(manifest)
-    except json.JSONDecodeError:
-        return False, None, "The image has C2PA metadata, but it cannot be decoded"
+        with instrumentation.span("c2pa_manifest"):
+            c2pa_metadata = C2PAMetadata.from_manifest(manifest)
     except Exception as e:
+        instrumentation.increment("c2pa_parse_errors")
         return False, None, f"Error parsing C2PA metadata: {e!s}"
 
-    # Check if the image is generated based on C2PAMetadata fields
-    is_generated = False
-
-    # Check if generator name indicates AI generation
-    if any(
-        ai_tool in c2pa_metadata.generator_name
-        for ai_tool in ["ChatGPT", "DALL·E", "Dall-E", "OpenAI"]
-    ):
-        is_generated = True
-
-    # Check if any software agent indicates AI generation
-    if not is_generated:
-        for agent in c2pa_metadata.software_agents:
-            if any(
-                ai_tool in agent.name for ai_tool in ["GPT-4o", "DALL-E", "DALL·E", "OpenAI API"]
-            ):
-                is_generated = True
-                break
-
-    # Check if digital source type indicates AI generation
-    if (
-        not is_generated
-        and c2pa_metadata.digital_source_type
-        and "AI tool" in c2pa_metadata.digital_source_type
-    ):
-        is_generated = True
+    # Check if the image is generated based on the generator rules
+    with instrumentation.span("c2pa_rules"):
+        is_generated = get_generator_rules().match(c2pa_metadata) is not None
 
     return is_generated, c2pa_metadata, None
@@ -1,8 +1,23 @@
-from dataclasses import dataclass
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 from typing import Any
 
 
-@dataclass
+# Labels of the assertions linking a manifest to the manifests of its ingredients
+INGREDIENT_LABELS = ("c2pa.ingredient", "c2pa.ingredient.v2", "c2pa.ingredient.v3")
+
+# Labels of the assertions listing the actions performed on an asset
+ACTIONS_LABELS = ("c2pa.actions", "c2pa.actions.v2")
+
+AI_GENERATED_SOURCE = "This content was generated with an AI tool"
+
+
+def assertion_label(key: str) -> str:
+    """Returns the label of an assertion store key, without its "__N" instance suffix."""
+    return key.split("__", 1)[0]
+
+
+@dataclass(slots=True)
 class SoftwareAgent:
     """Represents a software agent that performed an action on the media."""
 
@@ -18,7 +33,118 @@ class SoftwareAgent:
         return f"{self.action} by"
 
 
-@dataclass
+@dataclass(slots=True)
+class ProvenanceStep:
+    """One manifest of the provenance chain, i.e. one signed step in the history of the asset."""
+
+    manifest_id: str
+    generator_name: str
+    issuer: str
+    digital_source_type: str | None
+    software_agents: list[SoftwareAgent]
+    ingredients: list[str]
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ProvenanceStep":
+        """Rebuild a ProvenanceStep object from its `dataclasses.asdict` form."""
+        software_agents = [SoftwareAgent(**agent) for agent in data.get("software_agents", [])]
+        return cls(**{**data, "software_agents": software_agents})
+
+    @classmethod
+    def from_manifest(cls, manifest_id: str, manifest: dict[str, Any]) -> "ProvenanceStep":
+        """
+        Extract the actions and ingredients of one entry of the `manifests` map.
+
+        Args:
+            manifest_id: Key of the manifest in the `manifests` map
+            manifest: Dictionary of the manifest
+
+        Returns:
+            ProvenanceStep with the distinct actions and ingredient manifest IDs
+        """
+        software_agents: list[SoftwareAgent] = []
+        digital_source_type: str | None = None
+        # Ordered set of the ingredient manifest IDs
+        ingredients: dict[str, None] = {}
+        seen_actions: set[tuple[str, str]] = set()
+
+        for key, assertion in manifest.get("assertion_store", {}).items():
+            label = assertion_label(key)
+
+            if label in INGREDIENT_LABELS:
+                # v3 ingredients name their manifest "activeManifest", older ones "c2pa_manifest"
+                reference = assertion.get("activeManifest") or assertion.get("c2pa_manifest") or {}
+                ingredient_id = reference.get("url", "").split("/")[-1]
+                if ingredient_id:
+                    ingredients[ingredient_id] = None
+
+            elif label in ACTIONS_LABELS:
+                for action in assertion.get("actions", []):
+                    agent_name = action.get("softwareAgent", {}).get("name")
+                    action_type = action.get("action", "").replace("c2pa.", "")
+                    if agent_name and (agent_name, action_type) not in seen_actions:
+                        seen_actions.add((agent_name, action_type))
+                        software_agents.append(SoftwareAgent(name=agent_name, action=action_type))
+
+                    if "digitalSourceType" in action:
+                        digital_source_type = action.get("digitalSourceType", "")
+
+        return cls(
+            manifest_id=manifest_id,
+            generator_name=manifest.get("claim", {})
+            .get("claim_generator_info", {})
+            .get("name", "Unknown"),
+            issuer=manifest.get("signature", {}).get("issuer", "Unknown"),
+            digital_source_type=digital_source_type,
+            software_agents=software_agents,
+            ingredients=list(ingredients),
+        )
+
+
+def walk_provenance(
+    manifests: dict[str, Any], active_manifest_id: str | None
+) -> list[ProvenanceStep]:
+    """
+    Walk the ingredient graph of a manifest store from its active manifest.
+
+    Every manifest is parsed once, however many manifests use it as an ingredient, and
+    references back to a manifest being walked are ignored, so the cost is linear in the
+    number of manifests and edges. The walk is iterative, so deep chains are fine too.
+
+    Args:
+        manifests: The `manifests` map of c2patool's output
+        active_manifest_id: Key of the active manifest
+
+    Returns:
+        Steps reachable from the active manifest, ingredients before the manifests using
+        them, i.e. oldest first and the active manifest last
+    """
+    steps: dict[str, ProvenanceStep] = {}
+    stack: list[tuple[ProvenanceStep, Iterator[str]]] = []
+    chain: list[ProvenanceStep] = []
+
+    def enter(manifest_id: str) -> None:
+        step = ProvenanceStep.from_manifest(manifest_id, manifests[manifest_id])
+        steps[manifest_id] = step
+        stack.append((step, iter(step.ingredients)))
+
+    if active_manifest_id in manifests:
+        enter(active_manifest_id)
+
+    while stack:
+        step, ingredients = stack[-1]
+        for ingredient_id in ingredients:
+            if ingredient_id not in steps and ingredient_id in manifests:
+                enter(ingredient_id)
+                break
+        else:
+            stack.pop()
+            chain.append(step)
+
+    return chain
+
+
+@dataclass(slots=True)
 class C2PAMetadata:
     """Represents parsed C2PA metadata from an image."""
 
@@ -28,20 +154,40 @@ class C2PAMetadata:
     generator_name: str
     digital_source_type: str | None
     software_agents: list[SoftwareAgent]
+    # Every manifest behind the asset, oldest first and the active manifest last
+    provenance: list[ProvenanceStep] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "C2PAMetadata":
+        """
+        Rebuild a C2PAMetadata object from its `dataclasses.asdict` form.
+
+        Args:
+            data: Dictionary previously produced by `dataclasses.asdict`
+
+        Returns:
+            C2PAMetadata object equal to the serialised one
+        """
+        software_agents = [SoftwareAgent(**agent) for agent in data.get("software_agents", [])]
+        provenance = [ProvenanceStep.from_dict(step) for step in data.get("provenance", [])]
+        return cls(**{**data, "software_agents": software_agents, "provenance": provenance})
 
     @classmethod
     def from_manifest(cls, manifest: dict[str, Any]) -> "C2PAMetadata":
         """
         Parse a C2PA manifest dictionary and extract relevant metadata.
 
+        The whole provenance chain is walked, so agents and source types recorded by the
+        manifests of ingredients, and of their own ingredients, are all reported.
+
         Args:
             manifest: Dictionary containing C2PA manifest data
 
         Returns:
             C2PAMetadata object with parsed information
         """
-        active_manifest_id = manifest.get("active_manifest")
-        active_manifest = manifest.get("manifests", {}).get(active_manifest_id, {})
+        manifests = manifest.get("manifests", {})
+        active_manifest = manifests.get(manifest.get("active_manifest"), {})
         claim = active_manifest.get("claim", {})
         claim_generator_info = claim.get("claim_generator_info", {})
         instance_id = claim.get("instanceID", "Unknown")
@@ -50,34 +196,23 @@ class C2PAMetadata:
         signature_info = active_manifest.get("signature", {})
         issuer = signature_info.get("issuer", "Unknown")
 
-        assertion_store = active_manifest.get("assertion_store", {})
-        assertion_manifest_id = (
-            assertion_store.get("c2pa.ingredient.v3", {})
-            .get("activeManifest", {})
-            .get("url", "")
-            .split("/")[-1]
-        )
+        provenance = walk_provenance(manifests, manifest.get("active_manifest"))
 
         software_agents: list[SoftwareAgent] = []
         digital_source_type: str | None = None
+        seen_agents: set[str] = set()
 
-        assertion_manifest = manifest.get("manifests", {}).get(assertion_manifest_id, {})
-
-        if assertion_manifest:
-            assertion_assertion_store = assertion_manifest.get("assertion_store", {})
-
-            # Extract software agents and digital source type from assertions
-            actions = assertion_assertion_store.get("c2pa.actions.v2", {}).get("actions", [])
-            for action in actions:
-                agent_name = action.get("softwareAgent", {}).get("name")
-                if agent_name and agent_name not in [sa.name for sa in software_agents]:
-                    action_type = action.get("action", "").replace("c2pa.", "")
-                    software_agents.append(SoftwareAgent(name=agent_name, action=action_type))
+        for step in provenance:
+            for agent in step.software_agents:
+                if agent.name not in seen_agents:
+                    seen_agents.add(agent.name)
+                    software_agents.append(agent)
 
-                if "digitalSourceType" in action:
-                    digital_source_type = action.get("digitalSourceType", "")
-                    if "trainedAlgorithmicMedia" in digital_source_type:
-                        digital_source_type = "This content was generated with an AI tool"
+            # Once generated, an asset stays so whatever the later steps record
+            if step.digital_source_type is not None and digital_source_type != AI_GENERATED_SOURCE:
+                digital_source_type = step.digital_source_type
+                if "trainedAlgorithmicMedia" in digital_source_type:
+                    digital_source_type = AI_GENERATED_SOURCE
 
         return cls(
             instance_id=instance_id,
@@ -86,4 +221,5 @@ class C2PAMetadata:
             generator_name=claim_generator_info.get("name", "Unknown"),
             digital_source_type=digital_source_type,
             software_agents=software_agents,
+            provenance=provenance,
         )
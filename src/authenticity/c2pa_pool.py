@@ -0,0 +1,286 @@
+import contextlib
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from . import instrumentation
+from .c2pa_backends import c2pa_check
+from .c2pa_handler import TIMEOUT_ERROR, C2PAResult
+from .media import ImageBuffer
+
+
+POOL_BUSY_ERROR = "The C2PA checker is busy, please try again later"
+CANCELLED_ERROR = "The C2PA check was cancelled by a newer analysis"
+SHUTDOWN_ERROR = "The C2PA checker is shutting down"
+
+
+@dataclass
+class PoolStats:
+    """Snapshot of the c2patool worker pool state."""
+
+    size: int
+    max_queue: int
+    max_per_session: int = 0
+    active: int = 0
+    queued: int = 0
+    sessions: int = 0
+    submitted: int = 0
+    completed: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    cancelled: int = 0
+
+    @property
+    def utilisation(self) -> float:
+        """Returns the fraction of workers currently running c2patool."""
+        return self.active / self.size if self.size else 0.0
+
+
+@dataclass(eq=False)
+class _Run:
+    """A scheduled check, killed through its c2patool process when cancelled."""
+
+    session: str | None
+    file_bytes: ImageBuffer
+    mime_type: str
+    future: Future = field(default_factory=Future)
+    process: subprocess.Popen | None = None
+    cancelled: bool = False
+
+
+@dataclass
+class _Session:
+    """Checks of one session: those handed to the workers and those held back."""
+
+    running: set[_Run] = field(default_factory=set)
+    waiting: deque[_Run] = field(default_factory=deque)
+
+
+class C2PAToolPool:
+    """
+    Bounded pool of long-lived workers running c2patool invocations.
+
+    At most `size` checks run at once and at most `max_queue` more wait for a worker;
+    submissions beyond that are rejected straight away with a busy error,
+    keeping the `(is_generated, c2pa_metadata_obj, error_message)` contract.
+
+    Checks submitted for a session, e.g. a browser tab, get at most `max_per_session`
+    workers, the rest of its checks waiting in its own queue, so that one large upload
+    cannot starve the other sessions. Every check is bounded by `timeout` seconds and
+    `memory_limit` bytes, and `cancel_session` kills the checks of a session whose
+    results are no longer wanted. The future of a check can be cancelled until it starts.
+    """
+
+    def __init__(
+        self,
+        size: int | None = None,
+        max_queue: int = 64,
+        timeout: float = 30.0,
+        max_per_session: int | None = None,
+        memory_limit: int | None = None,
+    ) -> None:
+        size = size or os.cpu_count() or 1
+        max_per_session = max_per_session or max(1, size // 2)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="c2patool")
+        self._slots = threading.BoundedSemaphore(size + max_queue)
+        self._lock = threading.Lock()
+        self._sessions: dict[str, _Session] = {}
+        # Checks whose futures have not resolved yet, cancelled on shutdown
+        self._runs: set[_Run] = set()
+        self._closed = False
+        self._stats = PoolStats(size=size, max_queue=max_queue, max_per_session=max_per_session)
+
+    @classmethod
+    def from_env(cls) -> "C2PAToolPool":
+        """
+        Build a pool configured by `GPTZERO_V_C2PA_WORKERS`, `GPTZERO_V_C2PA_QUEUE`,
+        `GPTZERO_V_C2PA_TIMEOUT`, `GPTZERO_V_C2PA_SESSION_WORKERS` and
+        `GPTZERO_V_C2PA_MEMORY_MB`.
+        """
+        size = int(os.environ.get("GPTZERO_V_C2PA_WORKERS", "0")) or None
+        max_queue = int(os.environ.get("GPTZERO_V_C2PA_QUEUE", "64"))
+        timeout = float(os.environ.get("GPTZERO_V_C2PA_TIMEOUT", "30"))
+        max_per_session = int(os.environ.get("GPTZERO_V_C2PA_SESSION_WORKERS", "0")) or None
+        memory_mb = float(os.environ.get("GPTZERO_V_C2PA_MEMORY_MB", "2048"))
+        return cls(
+            size=size,
+            max_queue=max_queue,
+            timeout=timeout,
+            max_per_session=max_per_session,
+            memory_limit=int(memory_mb * 2**20) or None,
+        )
+
+    def submit(self, file_bytes: ImageBuffer, mime_type: str, session: str | None = None) -> Future:
+        """
+        Schedules a C2PA check and returns a future resolving to its result tuple.
+        Checks without a `session` are neither limited per session nor cancellable.
+        """
+        with self._lock:
+            self._stats.submitted += 1
+
+            if self._closed:
+                future: Future = Future()
+                future.set_result((False, None, SHUTDOWN_ERROR))
+                return future
+
+            if not self._slots.acquire(blocking=False):
+                self._stats.rejected += 1
+                instrumentation.increment("c2pa_rejections")
+                future = Future()
+                future.set_result((False, None, POOL_BUSY_ERROR))
+                return future
+
+            self._stats.queued += 1
+            run = _Run(session, file_bytes, mime_type)
+            self._runs.add(run)
+            if session is not None:
+                state = self._sessions.setdefault(session, _Session())
+                if len(state.running) >= self._stats.max_per_session:
+                    state.waiting.append(run)
+                    self._publish()
+                    return run.future
+                state.running.add(run)
+            self._publish()
+
+        self._schedule(run)
+        return run.future
+
+    def check(
+        self, file_bytes: ImageBuffer, mime_type: str, session: str | None = None
+    ) -> C2PAResult:
+        """Drop-in replacement for `c2pa_check` running on the pool."""
+        return self.submit(file_bytes, mime_type, session).result()
+
+    def cancel_session(self, session: str) -> int:
+        """
+        Cancel every check of `session`, e.g. when a rerun supersedes them: waiting checks
+        are dropped and running ones have their c2patool process killed. Cancelled checks
+        resolve to a cancellation error.
+
+        Returns:
+            The number of checks cancelled
+        """
+        with self._lock:
+            state = self._sessions.pop(session, None)
+            if state is None:
+                return 0
+
+            for run in state.running:
+                run.cancelled = True
+                if run.process is not None:
+                    run.process.kill()
+            for run in state.waiting:
+                run.cancelled = True
+                self._runs.discard(run)
+                self._slots.release()
+            self._stats.queued -= len(state.waiting)
+
+            cancelled = len(state.running) + len(state.waiting)
+            self._stats.cancelled += cancelled
+            instrumentation.increment("c2pa_cancellations", cancelled)
+            self._publish()
+
+        # Resolved outside the lock, as futures run their callbacks
+        for run in state.waiting:
+            # Unless its future was cancelled meanwhile, e.g. on shutdown
+            if run.future.set_running_or_notify_cancel():
+                run.future.set_result((False, None, CANCELLED_ERROR))
+        return cancelled
+
+    def stats(self) -> PoolStats:
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            return replace(self._stats)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stops accepting work and releases the workers. Checks that have not started have
+        their futures cancelled, so that no caller waits on them forever; running checks
+        finish.
+        """
+        with self._lock:
+            self._closed = True
+            runs = list(self._runs)
+
+        # Cancelled outside the lock, as futures run their callbacks
+        for run in runs:
+            run.future.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _schedule(self, run: _Run) -> None:
+        # Once shut down, the future of the check has been cancelled
+        with contextlib.suppress(RuntimeError):
+            self._executor.submit(self._run, run)
+
+    def _run(self, run: _Run) -> None:
+        with self._lock:
+            self._stats.queued -= 1
+            self._stats.active += 1
+            self._publish()
+
+        if not run.future.set_running_or_notify_cancel():
+            self._finish(run, None)
+            return
+
+        result: C2PAResult | None = None
+        try:
+            if not run.cancelled:
+                result = c2pa_check(
+                    run.file_bytes,
+                    run.mime_type,
+                    timeout=self.timeout,
+                    memory_limit=self.memory_limit,
+                    on_start=lambda process: self._started(run, process),
+                )
+        except Exception as e:
+            self._finish(run, result)
+            run.future.set_exception(e)
+            return
+
+        self._finish(run, result)
+        # A killed c2patool reports some error of its own
+        run.future.set_result((False, None, CANCELLED_ERROR) if run.cancelled else result)
+
+    def _started(self, run: _Run, process: subprocess.Popen) -> None:
+        with self._lock:
+            run.process = process
+            if run.cancelled:
+                process.kill()
+
+    def _finish(self, run: _Run, result: C2PAResult | None) -> None:
+        """Release the slot of a check, handing its worker to the next check of its session."""
+        next_run = None
+        with self._lock:
+            self._runs.discard(run)
+            self._slots.release()
+            self._stats.active -= 1
+            self._stats.completed += 1
+            if result is not None and result[2] == TIMEOUT_ERROR.format(self.timeout):
+                self._stats.timeouts += 1
+
+            # Sessions are dropped on cancellation and once they have no checks left
+            state = self._sessions.get(run.session) if run.session is not None else None
+            if state is not None and run in state.running:
+                state.running.discard(run)
+                if state.waiting and not self._closed:
+                    next_run = state.waiting.popleft()
+                    state.running.add(next_run)
+                elif not state.running:
+                    del self._sessions[run.session]
+            self._publish()
+
+        if next_run is not None:
+            self._schedule(next_run)
+
+    def _publish(self) -> None:
+        # Called with the lock held
+        self._stats.sessions = len(self._sessions)
+        instrumentation.set_gauge("c2pa_queue_depth", self._stats.queued)
+        instrumentation.set_gauge("c2pa_active", self._stats.active)
+        instrumentation.set_gauge("c2pa_sessions", self._stats.sessions)
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from authenticity.c2pa_metadata import C2PAMetadata
+
+from .c2pa_backends import c2pa_check, c2pa_check_async, get_c2pa_backends
+from .c2pa_handler import C2PAResult
+from .exif_handler import check_exif
+from .exif_reader import ExifRecord
+from .media import ImageBuffer
+from .metadata_utils import C2PATOOL_VERSION
+from .rules import get_generator_rules
+
+
+@dataclass
+class CacheStats:
+    """Counters describing how the result cache has been used."""
+
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Returns the fraction of lookups served from either tier."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def content_key(file_bytes: ImageBuffer, namespace: str, version: str = C2PATOOL_VERSION) -> str:
+    """Returns the cache key of an analysis: namespace, tool version and SHA-256 of the bytes."""
+    return f"{namespace}:{version}:{hashlib.sha256(file_bytes).hexdigest()}"
+
+
+def _encode_c2pa(result: C2PAResult) -> str:
+    is_generated, c2pa_metadata, error = result
+    metadata = asdict(c2pa_metadata) if c2pa_metadata is not None else None
+    return json.dumps({"is_generated": is_generated, "metadata": metadata, "error": error})
+
+
+def _decode_c2pa(payload: str) -> C2PAResult:
+    data = json.loads(payload)
+    metadata = data["metadata"]
+    c2pa_metadata = C2PAMetadata.from_dict(metadata) if metadata is not None else None
+    return data["is_generated"], c2pa_metadata, data["error"]
+
+
+def _encode_exif(result: tuple[bool, ExifRecord | None]) -> str:
+    _, exif_record = result
+    return json.dumps(exif_record.to_dict() if exif_record is not None else None)
+
+
+def _decode_exif(payload: str) -> tuple[bool, ExifRecord | None]:
+    values = json.loads(payload)
+    if values is None:
+        return False, None
+    return True, ExifRecord.from_dict(values)
+
+
+# Namespaces whose results can be persisted on the shared on-disk tier
+_codecs: dict[str, tuple[Callable[[Any], str], Callable[[str], Any]]] = {
+    "c2pa": (_encode_c2pa, _decode_c2pa),
+    "exif": (_encode_exif, _decode_exif),
+}
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results keyed by content hash.
+
+    The first tier is a bounded in-memory LRU holding live result objects.
+    The optional second tier is a SQLite database that several replica processes
+    can share.
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: str | Path | None = None) -> None:
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.stats = CacheStats()
+
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            # WAL lets concurrent readers in other processes proceed during writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        """Build a cache configured by `GPTZERO_V_CACHE_SIZE` and `GPTZERO_V_CACHE_PATH`."""
+        max_entries = int(os.environ.get("GPTZERO_V_CACHE_SIZE", "1024"))
+        return cls(max_entries=max_entries, db_path=os.environ.get("GPTZERO_V_CACHE_PATH"))
+
+    def get(self, key: str) -> Any | None:
+        """Returns the cached result for `key`, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return self._entries[key]
+
+            value = self._get_from_disk(key)
+            if value is None:
+                self.stats.misses += 1
+                return None
+
+            self.stats.hits += 1
+            self.stats.disk_hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Stores a result in memory and, if its namespace has a codec, on disk."""
+        with self._lock:
+            self._remember(key, value)
+
+            codec = _codecs.get(key.split(":", 1)[0])
+            if self._db is not None and codec is not None:
+                encode, _ = codec
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, payload) VALUES (?, ?)",
+                    (key, encode(value)),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Drops the in-memory tier; the shared on-disk tier is left untouched."""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _get_from_disk(self, key: str) -> Any | None:
+        codec = _codecs.get(key.split(":", 1)[0])
+        if self._db is None or codec is None:
+            return None
+
+        row = self._db.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        _, decode = codec
+        return decode(row[0])
+
+
+def cached_c2pa_check(
+    cache: ResultCache,
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    check: Callable[[ImageBuffer, str], C2PAResult] = c2pa_check,
+) -> C2PAResult:
+    """
+    Same as `check`, but served from `cache` when the bytes were seen before.
+    Results carrying an error are not cached, so transient failures are retried, and the
+    C2PA readers and generator rules versions are part of the key, as verdicts depend on them.
+    """
+    key = c2pa_cache_key(file_bytes, mime_type)
+    result = cache.get(key)
+    if result is None:
+        result = check(file_bytes, mime_type)
+        if result[2] is None:
+            cache.put(key, result)
+    return result
+
+
+async def cached_c2pa_check_async(
+    cache: ResultCache,
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    check: Callable[[ImageBuffer, str], Awaitable[C2PAResult]] = c2pa_check_async,
+) -> C2PAResult:
+    """
+    Same as `cached_c2pa_check`, but awaits `check`.
+    Hashing and the on-disk tier run on worker threads, off the event loop.
+    """
+    key = await asyncio.to_thread(c2pa_cache_key, file_bytes, mime_type)
+    result = await asyncio.to_thread(cache.get, key)
+    if result is None:
+        result = await check(file_bytes, mime_type)
+        if result[2] is None:
+            await asyncio.to_thread(cache.put, key, result)
+    return result
+
+
+def c2pa_cache_key(file_bytes: ImageBuffer, mime_type: str) -> str:
+    """
+    Returns the cache key of the C2PA verdict of an image under the current rules, read by
+    the configured backends: which of them answers only depends on the chain and the image.
+    """
+    readers = "+".join(get_c2pa_backends().tools)
+    version = f"{readers}:rules{get_generator_rules().version}"
+    return content_key(file_bytes, f"c2pa:{mime_type}", version)
+
+
+def cached_check_exif(
+    cache: ResultCache, file_bytes: ImageBuffer
+) -> tuple[bool, ExifRecord | None]:
+    """Same as `check_exif`, but served from `cache` when the bytes were seen before."""
+    key = content_key(file_bytes, "exif")
+    result = cache.get(key)
+    if result is None:
+        result = check_exif(file_bytes)
+        cache.put(key, result)
+    return result
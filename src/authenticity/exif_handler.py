@@ -1,18 +1,18 @@
-import io
+from . import instrumentation
+from .exif_reader import ExifRecord, read_exif
+from .media import ImageBuffer
 
-from exif import Image as ExifImage
 
-
-def check_exif(file_bytes: bytes) -> tuple[bool, ExifImage | None]:
+def check_exif(file_bytes: ImageBuffer) -> tuple[bool, ExifRecord | None]:
     """
     Check for EXIF metadata in the image.
-    Returns (has_exif, exif_object).
+    Returns (has_exif, exif_record).
     """
     try:
-        stream = io.BytesIO(file_bytes)
-        exif_img = ExifImage(stream)
-        if exif_img.has_exif:
-            return True, exif_img
+        with instrumentation.span("exif"):
+            exif_record = read_exif(file_bytes)
+        if exif_record is not None:
+            return True, exif_record
         return False, None
     except Exception as e:
         return False, None
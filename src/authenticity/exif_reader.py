@@ -0,0 +1,266 @@
+import struct
+from typing import Any
+
+from .media import ImageBuffer, has_prefix
+
+
+# TIFF tags read from IFD0, the Exif sub-IFD and the GPS sub-IFD
+_TAG_MAKE = 0x010F
+_TAG_MODEL = 0x0110
+_TAG_SOFTWARE = 0x0131
+_TAG_EXIF_IFD = 0x8769
+_TAG_GPS_IFD = 0x8825
+_TAG_EXIF_VERSION = 0x9000
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_GPS_LATITUDE = 0x0002
+_TAG_GPS_LONGITUDE = 0x0004
+# IFD1 tags of the embedded JPEG thumbnail
+_TAG_THUMBNAIL_OFFSET = 0x0201
+_TAG_THUMBNAIL_LENGTH = 0x0202
+
+# TIFF field type: (struct format character, size in bytes)
+_field_types = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+    7: ("s", 1),  # UNDEFINED
+    9: ("i", 4),  # SLONG
+    10: ("ii", 8),  # SRATIONAL
+}
+
+# Field name -> (IFD, tag) of the values exposed by `ExifRecord`
+_fields = {
+    "exif_version": ("exif", _TAG_EXIF_VERSION),
+    "make": ("ifd0", _TAG_MAKE),
+    "model": ("ifd0", _TAG_MODEL),
+    "software": ("ifd0", _TAG_SOFTWARE),
+    "datetime_original": ("exif", _TAG_DATETIME_ORIGINAL),
+    "gps_latitude": ("gps", _TAG_GPS_LATITUDE),
+    "gps_longitude": ("gps", _TAG_GPS_LONGITUDE),
+}
+
+# IFD -> {tag: field name} of the entries to index, including the sub-IFD pointers
+_wanted_tags = {
+    ifd: {tag: name for name, (field_ifd, tag) in _fields.items() if field_ifd == ifd}
+    for ifd in ("ifd0", "exif", "gps")
+}
+_wanted_tags["ifd0"].update({_TAG_EXIF_IFD: "exif", _TAG_GPS_IFD: "gps"})
+
+_unset = object()
+
+
+class _LazyField:
+    """Descriptor decoding a TIFF entry on first access and caching the value."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __get__(self, record: "ExifRecord | None", owner: type) -> Any:
+        if record is None:
+            return self
+        value = record._values.get(self.name, _unset)
+        if value is _unset:
+            value = record._decode(self.name)
+            record._values[self.name] = value
+        return value
+
+
+class ExifRecord:
+    """
+    Compact view over the EXIF fields of an image.
+
+    Only the TIFF block of the EXIF segment is retained, and each field
+    is decoded from it the first time it is read.
+    """
+
+    __slots__ = ("_entries", "_little_endian", "_tiff", "_values")
+
+    exif_version = _LazyField("exif_version")
+    make = _LazyField("make")
+    model = _LazyField("model")
+    software = _LazyField("software")
+    datetime_original = _LazyField("datetime_original")
+    gps_latitude = _LazyField("gps_latitude")
+    gps_longitude = _LazyField("gps_longitude")
+
+    def __init__(
+        self,
+        tiff: bytes,
+        little_endian: bool,
+        entries: dict[str, tuple[int, int, int]],
+    ) -> None:
+        self._tiff = tiff
+        self._little_endian = little_endian
+        self._entries = entries
+        self._values: dict[str, Any] = {}
+
+    @classmethod
+    def from_dict(cls, values: dict[str, Any]) -> "ExifRecord":
+        """Rebuild a record from the output of `to_dict`."""
+        record = cls(b"", little_endian=False, entries={})
+        for name, value in values.items():
+            record._values[name] = tuple(value) if isinstance(value, list) else value
+        return record
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns every exposed field, decoding the ones not read yet."""
+        return {name: getattr(self, name) for name in _fields}
+
+    def _decode(self, name: str) -> Any:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+
+        field_type, count, value_offset = entry
+        fmt, size = _field_types[field_type]
+        order = "<" if self._little_endian else ">"
+        raw = bytes(self._tiff[value_offset : value_offset + count * size])
+
+        try:
+            if fmt == "s":
+                return raw.split(b"\x00", 1)[0].decode("ascii", errors="replace").strip()
+            values = struct.unpack(f"{order}{fmt * count}", raw)
+        except struct.error:
+            return None
+
+        if field_type in {5, 10}:
+            # Rationals come as (numerator, denominator) pairs
+            pairs = zip(values[::2], values[1::2], strict=True)
+            values = tuple(num / den if den else 0.0 for num, den in pairs)
+        return values[0] if count == 1 else tuple(values)
+
+
+def find_tiff_block(data: ImageBuffer) -> ImageBuffer | None:
+    """Locate the TIFF block of the EXIF segment in a JPEG, PNG, WEBP or TIFF container."""
+    if has_prefix(data, b"\xff\xd8"):
+        offset = 2
+        while offset + 4 <= len(data) and data[offset] == 0xFF:
+            marker = data[offset + 1]
+            if marker in {0xD9, 0xDA}:
+                return None
+            (length,) = struct.unpack_from(">H", data, offset + 2)
+            if marker == 0xE1 and data[offset + 4 : offset + 10] == b"Exif\x00\x00":
+                return bytes(data[offset + 10 : offset + 2 + length])
+            offset += 2 + length
+        return None
+
+    if has_prefix(data, b"\x89PNG\r\n\x1a\n"):
+        offset = 8
+        while offset + 8 <= len(data):
+            length, chunk_type = struct.unpack_from(">I4s", data, offset)
+            if chunk_type == b"eXIf":
+                return bytes(data[offset + 8 : offset + 8 + length])
+            if chunk_type == b"IEND":
+                return None
+            offset += 12 + length
+        return None
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        offset = 12
+        while offset + 8 <= len(data):
+            chunk_type, length = struct.unpack_from("<4sI", data, offset)
+            if chunk_type == b"EXIF":
+                block = bytes(data[offset + 8 : offset + 8 + length])
+                # Some writers keep the JPEG-style identifier in front of the TIFF header
+                return block.removeprefix(b"Exif\x00\x00")
+            offset += 8 + length + (length & 1)
+        return None
+
+    if has_prefix(data, b"II*\x00", b"MM\x00*"):
+        # The whole file is the TIFF block
+        return data
+
+    return None
+
+
+def _read_ifd(
+    tiff: ImageBuffer, offset: int, order: str, wanted: dict[int, str]
+) -> dict[str, tuple[int, int, int]]:
+    """Returns (type, count, absolute value offset) of the wanted tags of one IFD."""
+    entries: dict[str, tuple[int, int, int]] = {}
+    (count,) = struct.unpack_from(f"{order}H", tiff, offset)
+
+    for index in range(count):
+        entry_offset = offset + 2 + index * 12
+        tag, field_type, value_count = struct.unpack_from(f"{order}HHI", tiff, entry_offset)
+        name = wanted.get(tag)
+        if name is None or field_type not in _field_types:
+            continue
+
+        size = _field_types[field_type][1] * value_count
+        if size <= 4:
+            # Small values are stored inline in the entry itself
+            value_offset = entry_offset + 8
+        else:
+            (value_offset,) = struct.unpack_from(f"{order}I", tiff, entry_offset + 8)
+        entries[name] = (field_type, value_count, value_offset)
+
+    return entries
+
+
+def read_exif(data: ImageBuffer) -> ExifRecord | None:
+    """
+    Index the EXIF fields of an image by walking its IFD structures only.
+    Returns None when the image has no parsable EXIF segment, or one without any of the
+    fields read, e.g. a plain TIFF file without camera tags.
+    """
+    tiff = find_tiff_block(data)
+    if tiff is None or len(tiff) < 8:
+        return None
+
+    little_endian = tiff[:2] == b"II"
+    order = "<" if little_endian else ">"
+
+    try:
+        (ifd0_offset,) = struct.unpack_from(f"{order}I", tiff, 4)
+        entries = _read_ifd(tiff, ifd0_offset, order, _wanted_tags["ifd0"])
+        for ifd in ("exif", "gps"):
+            pointer = entries.pop(ifd, None)
+            if pointer is not None:
+                (sub_offset,) = struct.unpack_from(f"{order}I", tiff, pointer[2])
+                entries.update(_read_ifd(tiff, sub_offset, order, _wanted_tags[ifd]))
+    except struct.error:
+        return None
+    if not entries:
+        return None
+
+    record = ExifRecord(tiff, little_endian, entries)
+    if not isinstance(tiff, bytes):
+        # A TIFF file is its own EXIF block: decode now rather than keep the whole view alive
+        return ExifRecord.from_dict(record.to_dict())
+    return record
+
+
+def read_exif_thumbnail(data: ImageBuffer) -> bytes | None:
+    """
+    Returns the JPEG thumbnail embedded in IFD1 of the EXIF segment of an image,
+    or None when it has none.
+    """
+    tiff = find_tiff_block(data)
+    if tiff is None or len(tiff) < 8:
+        return None
+
+    order = "<" if tiff[:2] == b"II" else ">"
+    wanted = {_TAG_THUMBNAIL_OFFSET: "offset", _TAG_THUMBNAIL_LENGTH: "length"}
+
+    try:
+        (ifd0_offset,) = struct.unpack_from(f"{order}I", tiff, 4)
+        (count,) = struct.unpack_from(f"{order}H", tiff, ifd0_offset)
+        # IFD0 is followed by the offset of the next IFD, 0 when there is none
+        (ifd1_offset,) = struct.unpack_from(f"{order}I", tiff, ifd0_offset + 2 + count * 12)
+        if not ifd1_offset:
+            return None
+        entries = _read_ifd(tiff, ifd1_offset, order, wanted)
+        if len(entries) != len(wanted):
+            return None
+        values = {}
+        for name, (field_type, _, value_offset) in entries.items():
+            fmt = _field_types[field_type][0]
+            (values[name],) = struct.unpack_from(f"{order}{fmt}", tiff, value_offset)
+    except (struct.error, KeyError):
+        return None
+
+    thumbnail = bytes(tiff[values["offset"] : values["offset"] + values["length"]])
+    return thumbnail if thumbnail.startswith(b"\xff\xd8") else None
@@ -0,0 +1,163 @@
+import io
+import math
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+
+from . import instrumentation
+from .exif_reader import read_exif_thumbnail
+from .media import BufferReader, ImageBuffer, has_prefix
+
+
+# Wall-clock budget of the forensic stage of one image, in seconds
+TIME_BUDGET = float(os.environ.get("GPTZERO_V_FORENSICS_BUDGET_MS", "500")) / 1000
+
+# Side of the square tiles images are processed in, a multiple of the 16-pixel JPEG MCU
+TILE_SIZE = 512
+# Quality the tiles are recompressed at for error-level analysis
+ELA_QUALITY = 90
+# Side of the cells of the error grid, i.e. of a JPEG block
+ELA_CELL = 8
+# Cells whose error is over this multiple of the median error are inconsistent
+ELA_OUTLIER_RATIO = 3.0
+# Floor of the median error, so that flat images do not flag every textured cell
+ELA_MIN_ERROR = 0.5
+# Pixels decoded for error-level analysis at most, larger JPEGs being decoded scaled down
+ELA_MAX_PIXELS = 16 * 2**20
+
+# Grey levels two thumbnail pixels may differ by and still match, past re-encoding noise
+THUMBNAIL_TOLERANCE = 32
+
+
+@dataclass(slots=True)
+class ForensicReport:
+    """
+    Pixel-level evidence of editing of one image, each score from 0 to 1.
+
+    Attributes:
+        thumbnail_mismatch: Share of the EXIF thumbnail pixels not matching the image
+            scaled down, None without a thumbnail
+        ela_inconsistency: Share of the JPEG blocks whose recompression error stands out,
+            None for other formats
+        coverage: Share of the image tiles analysed within the time budget
+        elapsed_ms: Time spent on the analysis
+    """
+
+    thumbnail_mismatch: float | None
+    ela_inconsistency: float | None
+    coverage: float
+    elapsed_ms: float
+
+
+def check_forensics(file_bytes: ImageBuffer, budget: float = TIME_BUDGET) -> ForensicReport | None:
+    """
+    Compare the EXIF thumbnail of an image with the image, and run error-level analysis
+    over its tiles until `budget` seconds have passed. The budget is checked before each
+    decode and between tiles, and at most `ELA_MAX_PIXELS` pixels are decoded at once.
+    Returns None when the image cannot be decoded.
+    """
+    started = time.perf_counter()
+    deadline = started + budget
+
+    try:
+        with instrumentation.span("forensics"):
+            thumbnail_mismatch = _thumbnail_mismatch(file_bytes)
+            ela_inconsistency, coverage = None, 1.0
+            if has_prefix(file_bytes, b"\xff\xd8"):
+                ela_inconsistency, coverage = _error_level_analysis(file_bytes, deadline)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        instrumentation.increment("forensics_errors")
+        return None
+
+    if coverage < 1.0:
+        instrumentation.increment("forensics_over_budget")
+    return ForensicReport(
+        thumbnail_mismatch=thumbnail_mismatch,
+        ela_inconsistency=ela_inconsistency,
+        coverage=coverage,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def _thumbnail_mismatch(file_bytes: ImageBuffer) -> float | None:
+    thumbnail_bytes = read_exif_thumbnail(file_bytes)
+    if thumbnail_bytes is None:
+        return None
+
+    with Image.open(io.BytesIO(thumbnail_bytes)) as encoded:
+        thumbnail = encoded.convert("L")
+
+    with Image.open(BufferReader(file_bytes)) as image:
+        # Thumbnails are letterboxed to a fixed size: compare the area the image fills
+        scale = min(thumbnail.width / image.width, thumbnail.height / image.height)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        # JPEGs are scaled down by the decoder, without decoding the full image
+        image.draft("L", size)
+        scaled = np.asarray(image.convert("L").resize(size, Image.Resampling.BOX), np.int16)
+
+    left = (thumbnail.width - size[0]) // 2
+    top = (thumbnail.height - size[1]) // 2
+    reference = np.asarray(thumbnail, np.int16)[top : top + size[1], left : left + size[0]]
+    return float(np.mean(np.abs(reference - scaled) > THUMBNAIL_TOLERANCE))
+
+
+def _error_level_analysis(file_bytes: ImageBuffer, deadline: float) -> tuple[float | None, float]:
+    """Returns the share of inconsistent blocks, and the share of tiles analysed in time."""
+    if time.perf_counter() > deadline:
+        # The budget went on the thumbnail, before decoding anything
+        return None, 0.0
+
+    with Image.open(BufferReader(file_bytes)) as encoded:
+        # Luminance only: a third of the memory, and where recompression errors show most;
+        # images over the pixel cap are decoded at the power-of-two scale bringing them under
+        width, height = encoded.size
+        scale = 2 ** math.ceil(max(0.0, math.log2(width * height / ELA_MAX_PIXELS) / 2))
+        encoded.draft("L", (width // scale, height // scale))
+        image = encoded.convert("L")
+
+    columns = -(-image.width // TILE_SIZE)
+    rows = -(-image.height // TILE_SIZE)
+    # Tiles are visited in a fixed shuffled order, so that a partial pass over an image
+    # that ran out of time still samples all of it
+    order = np.random.default_rng(0).permutation(columns * rows)
+
+    errors: list[npt.NDArray[np.float64]] = []
+    for index in order.tolist():
+        if errors and time.perf_counter() > deadline:
+            break
+        top, left = divmod(index, columns)
+        box = (
+            left * TILE_SIZE,
+            top * TILE_SIZE,
+            min((left + 1) * TILE_SIZE, image.width),
+            min((top + 1) * TILE_SIZE, image.height),
+        )
+        errors.append(_tile_errors(image.crop(box)))
+
+    coverage = len(errors) / len(order)
+    cells = np.concatenate(errors)
+    if not cells.size:
+        return None, coverage
+
+    threshold = ELA_OUTLIER_RATIO * max(float(np.median(cells)), ELA_MIN_ERROR)
+    return float(np.mean(cells > threshold)), coverage
+
+
+def _tile_errors(tile: Image.Image) -> npt.NDArray[np.float64]:
+    """Returns the mean recompression error of every whole JPEG block of a tile."""
+    buffer = io.BytesIO()
+    tile.save(buffer, "JPEG", quality=ELA_QUALITY)
+    buffer.seek(0)
+    with Image.open(buffer) as recompressed:
+        difference = np.abs(np.asarray(tile, np.int16) - np.asarray(recompressed, np.int16))
+
+    height = difference.shape[0] - difference.shape[0] % ELA_CELL
+    width = difference.shape[1] - difference.shape[1] % ELA_CELL
+    blocks = difference[:height, :width].reshape(
+        height // ELA_CELL, ELA_CELL, width // ELA_CELL, ELA_CELL
+    )
+    return blocks.mean(axis=(1, 3)).ravel()
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+# Upper bounds, in seconds, of the stage latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get("GPTZERO_V_METRICS", "").lower() in {"1", "true", "yes"}
+_lock = threading.Lock()
+# Serialises the textfile writes of concurrent sessions
+_write_lock = threading.Lock()
+_noop = nullcontext()
+
+
+@dataclass
+class StageTimings:
+    """Latency histogram of one pipeline stage."""
+
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        index = bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            self.buckets[index] += 1
+
+
+_stages: dict[str, StageTimings] = {}
+_counters: dict[str, int] = {}
+_gauges: dict[str, float] = {}
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *_exc: object) -> None:
+        elapsed = time.perf_counter() - self.started
+        with _lock:
+            stage = _stages.get(self.name)
+            if stage is None:
+                stage = _stages[self.name] = StageTimings()
+            stage.observe(elapsed)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn instrumentation on or off at runtime, e.g. from a developer toggle."""
+    global _enabled
+    _enabled = enabled
+
+
+def span(name: str) -> AbstractContextManager:
+    """
+    Time the enclosed block as stage `name`.
+    When instrumentation is disabled, a shared no-op context is returned.
+    """
+    if not _enabled:
+        return _noop
+    return _Span(name)
+
+
+def increment(name: str, value: int = 1) -> None:
+    """Add `value` to counter `name`; a no-op when instrumentation is disabled."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set gauge `name`, e.g. a queue depth, to `value`; a no-op when instrumentation is disabled."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+def gauges() -> dict[str, float]:
+    """Returns a copy of the gauges."""
+    with _lock:
+        return dict(_gauges)
+
+
+def snapshot() -> tuple[dict[str, StageTimings], dict[str, int]]:
+    """Returns copies of the stage timings and counters."""
+    with _lock:
+        stages = {
+            name: StageTimings(stage.count, stage.total, stage.maximum, list(stage.buckets))
+            for name, stage in _stages.items()
+        }
+        return stages, dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    stages, counters = snapshot()
+    lines = []
+
+    for name, value in sorted(counters.items()):
+        metric = f"gptzero_v_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+    for name, value in sorted(gauges().items()):
+        metric = f"gptzero_v_{name}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+
+    metric = "gptzero_v_stage_duration_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for name, stage in sorted(stages.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stage.buckets, strict=True):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {stage.count}')
+        lines.append(f'{metric}_sum{{stage="{name}"}} {stage.total:.6f}')
+        lines.append(f'{metric}_count{{stage="{name}"}} {stage.count}')
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str | Path | None = None) -> None:
+    """
+    Write the metrics to `path` or `GPTZERO_V_METRICS_PATH`, for a node-exporter textfile collector.
+    Does nothing when metrics are disabled or no path is configured.
+    """
+    path = path or os.environ.get("GPTZERO_V_METRICS_PATH")
+    if not is_enabled() or not path:
+        return
+
+    path = Path(path)
+    with _write_lock:
+        # Write then rename, so that scrapers never read a partial file
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=path.parent, prefix=f".{path.name}.", delete=False
+        ) as temp_file:
+            temp_file.write(render_prometheus())
+        temp_path = Path(temp_file.name)
+        try:
+            # Readable by a collector running as another user, as a plain write would be
+            temp_path.chmod(0o644)
+            temp_path.replace(path)
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+            raise
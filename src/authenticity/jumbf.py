@@ -0,0 +1,173 @@
+import struct
+
+from .media import ImageBuffer, has_prefix
+
+
+# JUMBF description box type of a C2PA manifest store ("c2pa" + ISO suffix)
+C2PA_JUMBF_TYPE = bytes.fromhex("6332706100110010800000aa00389b71")
+
+# ISO-BMFF `uuid` box extended type used by C2PA for HEIF/AVIF/MP4
+C2PA_BMFF_UUID = bytes.fromhex("d8fec3d61b0e483c92975828877ec481")
+
+# ISO-BMFF brands mapped to the MIME types listed in `metadata_utils.mime_map`
+_bmff_brands = {
+    b"avif": "image/avif",
+    b"avis": "image/avif",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"heim": "image/heic",
+    b"heis": "image/heic",
+    b"mif1": "image/heif",
+    b"msf1": "image/heif",
+}
+
+
+def sniff_mime_type(data: ImageBuffer) -> str | None:
+    """
+    Detect the image MIME type from its magic bytes.
+    Returns None when the format is not recognised.
+    """
+    if has_prefix(data, b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if has_prefix(data, b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp":
+        return _bmff_brands.get(bytes(data[8:12]))
+    if has_prefix(data, b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if has_prefix(data, b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if has_prefix(data, b"BM"):
+        return "image/bmp"
+    if b"<svg" in bytes(data[:1024]):
+        return "image/svg+xml"
+    return None
+
+
+def has_c2pa_manifest(data: ImageBuffer, mime_type: str | None) -> bool | None:
+    """
+    Look for an embedded C2PA manifest store by walking the container segment headers.
+
+    Returns True or False for the JPEG, PNG, WEBP and ISO-BMFF containers, or None when
+    the container cannot be scanned, or its structure is damaged, and c2patool has to decide.
+    """
+    try:
+        if mime_type in {"image/jpeg", "image/jpg"}:
+            return _scan_jpeg(data)
+        if mime_type == "image/png":
+            return _scan_png(data)
+        if mime_type == "image/webp":
+            return _scan_riff(data)
+        if mime_type in {"image/avif", "image/heic", "image/heif"}:
+            return _scan_bmff(data)
+    except struct.error:
+        # Truncated headers; leave the verdict to c2patool
+        return None
+    return None
+
+
+def _is_c2pa_jumbf(box: ImageBuffer) -> bool:
+    """Check whether a JUMBF superbox describes a C2PA manifest store."""
+    # jumb superbox header (8) + jumd description box header (8) + type UUID (16)
+    return box[4:8] == b"jumb" and box[12:16] == b"jumd" and box[16:32] == C2PA_JUMBF_TYPE
+
+
+def _scan_jpeg(data: ImageBuffer) -> bool | None:
+    offset = 2
+    size = len(data)
+
+    while offset + 4 <= size:
+        if data[offset] != 0xFF:
+            # Not a marker where one should be
+            return None
+
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill bytes between markers
+            offset += 1
+            continue
+        if marker in {0xD9, 0xDA}:
+            # End of image or start of scan: no more metadata segments follow
+            return False
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            offset += 2
+            continue
+
+        (length,) = struct.unpack_from(">H", data, offset + 2)
+        if length < 2:
+            return None
+        # APP11 payload: "JP" common identifier (2), box instance (2), sequence (4), JUMBF box
+        if (
+            marker == 0xEB
+            and data[offset + 4 : offset + 6] == b"JP"
+            and _is_c2pa_jumbf(data[offset + 12 : offset + 44])
+        ):
+            return True
+
+        offset += 2 + length
+
+    # Truncated before the image data
+    return None
+
+
+def _scan_png(data: ImageBuffer) -> bool | None:
+    offset = 8
+    size = len(data)
+
+    while offset + 8 <= size:
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        if chunk_type == b"caBX":
+            return True
+        if chunk_type == b"IEND":
+            return False
+        # length (4) + type (4) + data + CRC (4)
+        offset += 12 + length
+
+    # Truncated before the image end
+    return None
+
+
+def _scan_riff(data: ImageBuffer) -> bool | None:
+    offset = 12
+    size = len(data)
+
+    while offset + 8 <= size:
+        chunk_type, length = struct.unpack_from("<4sI", data, offset)
+        if chunk_type == b"C2PA":
+            return True
+        # Chunks are padded to an even size
+        offset += 8 + length + (length & 1)
+
+    # The last chunk must end with the file
+    return False if offset <= size else None
+
+
+def _scan_bmff(data: ImageBuffer) -> bool | None:
+    offset = 0
+    size = len(data)
+
+    while offset + 8 <= size:
+        box_size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if box_size == 1:
+            (box_size,) = struct.unpack_from(">Q", data, offset + 8)
+            header_size = 16
+        elif box_size == 0:
+            # Box extends to the end of the file
+            box_size = size - offset
+
+        if box_type == b"uuid" and data[offset + header_size : offset + header_size + 16] == (
+            C2PA_BMFF_UUID
+        ):
+            return True
+        if box_type == b"jumb" and _is_c2pa_jumbf(data[offset : offset + 32]):
+            return True
+        if box_size < header_size:
+            return None
+
+        offset += box_size
+
+    # The last box must end with the file
+    return False if offset <= size else None
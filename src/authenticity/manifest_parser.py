@@ -0,0 +1,265 @@
+import codecs
+import io
+import json
+import re
+from typing import Any, BinaryIO, NoReturn
+
+from .c2pa_metadata import ACTIONS_LABELS, INGREDIENT_LABELS, assertion_label
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Paths of the c2patool output read by `C2PAMetadata.from_manifest`: True keeps a value
+# whole, a dict keeps the listed keys of an object ("*" matching any key, and assertion
+# labels matching their "__N" instances) and a one-item list applies its item to every
+# element of an array
+_ACTION_PATHS = {"action": True, "digitalSourceType": True, "softwareAgent": {"name": True}}
+_ACTIONS_PATHS = {"actions": [_ACTION_PATHS]}
+_INGREDIENT_PATHS = {"activeManifest": {"url": True}, "c2pa_manifest": {"url": True}}
+_MANIFEST_PATHS = {
+    "claim": {"claim_generator_info": {"name": True}, "instanceID": True, "dc:title": True},
+    "signature": {"issuer": True},
+    "assertion_store": {
+        **dict.fromkeys(INGREDIENT_LABELS, _INGREDIENT_PATHS),
+        **dict.fromkeys(ACTIONS_LABELS, _ACTIONS_PATHS),
+    },
+}
+MANIFEST_PATHS = {"active_manifest": True, "manifests": {"*": _MANIFEST_PATHS}}
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_SCALAR = re.compile(r"[^,:\[\]{}\s]*")
+
+
+class _Reader:
+    """
+    Pull parser over a JSON text arriving in chunks.
+
+    Skipped values are scanned with regexes for their closing bracket and dropped from the
+    buffer chunk by chunk, so their size does not matter; they are only checked for their
+    structure. Kept leaves are decoded with `json.loads`.
+    """
+
+    def __init__(self, source: BinaryIO | bytes | str) -> None:
+        if isinstance(source, str):
+            self.stream = None
+            self.buffer = source
+        else:
+            self.stream = io.BytesIO(source) if isinstance(source, bytes) else source
+            self.buffer = ""
+        self._read = getattr(self.stream, "read1", None) or getattr(self.stream, "read", None)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pos = 0
+        # Start of the value being captured, which must stay in the buffer
+        self.anchor: int | None = None
+
+    def fail(self, message: str) -> NoReturn:
+        raise json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def fill(self) -> bool:
+        """Append the next chunk to the buffer, dropping what has been consumed."""
+        if self.stream is None:
+            return False
+
+        chunk = self._read(CHUNK_SIZE)
+        text = self._decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            self.stream = None
+            if not text:
+                return False
+
+        keep = self.pos if self.anchor is None else self.anchor
+        self.buffer = self.buffer[keep:] + text
+        self.pos -= keep
+        if self.anchor is not None:
+            self.anchor = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or "" at the end of the input."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def parse(self, paths: Any) -> Any:
+        char = self.peek()
+        if isinstance(paths, dict) and char == "{":
+            return self._parse_object(paths)
+        if isinstance(paths, list) and char == "[":
+            return self._parse_array(paths[0])
+        # A leaf, or a value shaped unlike the paths expect, which is kept whole
+        return self.load_value()
+
+    def load_value(self) -> Any:
+        self.peek()
+        self.anchor = self.pos
+        try:
+            self.skip_value()
+            text = self.buffer[self.anchor : self.pos]
+        finally:
+            self.anchor = None
+
+        # Most keys and kept values are plain strings
+        if text[0] == '"' and "\\" not in text:
+            return text[1:-1]
+        return json.loads(text)
+
+    def skip_value(self) -> None:
+        char = self.peek()
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in {"[", "{"}:
+            self._skip_scalar()
+            return
+
+        depth = 0
+        while True:
+            found = _STRUCTURAL.search(self.buffer, self.pos)
+            if found is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    self.fail("Unterminated array or object")
+                continue
+
+            self.pos = found.start()
+            if found.group() == '"':
+                self._skip_string()
+                continue
+
+            self.pos += 1
+            depth += 1 if found.group() in {"[", "{"} else -1
+            if depth == 0:
+                return
+
+    def _skip_string(self) -> None:
+        self.pos += 1
+        while True:
+            end = self.buffer.find('"', self.pos)
+            if end < 0:
+                # Keep trailing backslashes, which may escape a quote of the next chunk
+                self.pos = len(self.buffer)
+                while self.pos > 0 and self.buffer[self.pos - 1] == "\\":
+                    self.pos -= 1
+                if not self.fill():
+                    self.fail("Unterminated string")
+                continue
+
+            self.pos = end + 1
+            # The quote is escaped by an odd run of backslashes
+            start = end
+            while start > 0 and self.buffer[start - 1] == "\\":
+                start -= 1
+            if (end - start) % 2 == 0:
+                return
+
+    def _skip_scalar(self) -> None:
+        while True:
+            end = _SCALAR.match(self.buffer, self.pos).end()
+            # A number or literal may be cut by the end of the chunk
+            if end < len(self.buffer) or not self.fill():
+                break
+        if end == self.pos:
+            self.fail("Expecting value")
+        self.pos = end
+
+    def _parse_object(self, paths: dict[str, Any]) -> dict[str, Any]:
+        self.pos += 1
+        result: dict[str, Any] = {}
+        if self.peek() == "}":
+            self.pos += 1
+            return result
+
+        while True:
+            if self.peek() != '"':
+                self.fail("Expecting property name enclosed in double quotes")
+            key = self.load_value()
+            if self.peek() != ":":
+                self.fail("Expecting ':' delimiter")
+            self.pos += 1
+
+            key_paths = _lookup(paths, key)
+            if key_paths is None:
+                self.skip_value()
+            else:
+                result[key] = self.parse(key_paths)
+
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return result
+            if char != ",":
+                self.fail("Expecting ',' delimiter")
+
+    def _parse_array(self, paths: Any) -> list[Any]:
+        self.pos += 1
+        result: list[Any] = []
+        if self.peek() == "]":
+            self.pos += 1
+            return result
+
+        while True:
+            result.append(self.parse(paths))
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return result
+            if char != ",":
+                self.fail("Expecting ',' delimiter")
+
+
+def _lookup(paths: dict[str, Any], key: str) -> Any:
+    found = paths.get(key)
+    if found is None:
+        found = paths.get(assertion_label(key))
+    if found is None:
+        found = paths.get("*")
+    return found
+
+
+def _prune(value: Any, paths: Any) -> Any:
+    if isinstance(paths, dict) and isinstance(value, dict):
+        kept = ((key, item, _lookup(paths, key)) for key, item in value.items())
+        return {
+            key: _prune(item, item_paths)
+            for key, item, item_paths in kept
+            if item_paths is not None
+        }
+    if isinstance(paths, list) and isinstance(value, list):
+        return [_prune(item, paths[0]) for item in value]
+    return value
+
+
+def parse_manifest(source: BinaryIO | bytes | str, paths: Any = MANIFEST_PATHS) -> Any:
+    """
+    Parse c2patool's JSON output, keeping only the values under `paths`.
+
+    Large values elsewhere, such as embedded thumbnails or ingredient data, are skipped
+    without being decoded, and a stream is consumed chunk by chunk, so memory stays
+    bounded by the kept values whatever the size of the output. Outputs smaller than a
+    chunk are decoded whole with `json.loads` and pruned afterwards.
+
+    Args:
+        source: Binary stream, e.g. c2patool's stdout pipe, or the whole output
+        paths: Paths to keep; defaults to those read by `C2PAMetadata.from_manifest`
+
+    Returns:
+        The JSON document pruned to `paths`
+
+    Raises:
+        json.JSONDecodeError: If the output is not valid JSON
+    """
+    reader = _Reader(source)
+    while reader.stream is not None and len(reader.buffer) < CHUNK_SIZE:
+        reader.fill()
+    # Most outputs fit in a chunk, and are faster to decode whole
+    if reader.stream is None and len(reader.buffer) <= CHUNK_SIZE:
+        return _prune(json.loads(reader.buffer), paths)
+
+    value = reader.parse(paths)
+    if reader.peek() != "":
+        reader.fail("Extra data")
+    return value
@@ -0,0 +1,76 @@
+import io
+import mmap
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Image contents: bytes, or a zero-copy view over an upload buffer or a memory-mapped file
+ImageBuffer = bytes | bytearray | memoryview
+
+# Largest file accepted for analysis, in bytes
+MAX_UPLOAD_BYTES = int(float(os.environ.get("GPTZERO_V_MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+
+
+def has_prefix(data: ImageBuffer, *prefixes: bytes) -> bool:
+    """Same as `bytes.startswith`, for buffers lacking it such as memoryviews."""
+    return any(data[: len(prefix)] == prefix for prefix in prefixes)
+
+
+def check_size(size: int | None, limit: int = MAX_UPLOAD_BYTES) -> str | None:
+    """Returns an error message when a file of `size` bytes is over the limit, None otherwise."""
+    if size is not None and size > limit:
+        return f"File too large: {size / 2**20:.1f} MB, the limit is {limit / 2**20:g} MB"
+    return None
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file over a buffer, which unlike `io.BytesIO` does not copy it."""
+
+    def __init__(self, data: ImageBuffer) -> None:
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:
+        size = min(len(buffer), max(len(self._view) - self._position, 0))
+        buffer[:size] = self._view[self._position : self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        if base + offset < 0:
+            msg = f"Negative seek position {base + offset}"
+            raise ValueError(msg)
+        self._position = base + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+@contextmanager
+def map_file(path: str | Path) -> Iterator[memoryview]:
+    """
+    Memory-map a file read-only and yield a zero-copy view of its contents.
+    Pages are loaded lazily, so only the parts the stages look at are read from disk.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield memoryview(b"")
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
@@ -1,7 +1,19 @@
+import importlib.util
+import os
 import platform
+import subprocess
+from functools import cache
 from pathlib import Path
 
 
+# Pinned c2patool release shipped under resources/c2patool
+C2PATOOL_VERSION = "v0.16.1"
+
+# C2PA readers, in the default order of preference: c2patool in a subprocess, which can
+# be timed out and memory-capped, then the in-process c2pa-python bindings
+C2PA_BACKENDS = ("subprocess", "native", "replay")
+DEFAULT_C2PA_BACKENDS = "subprocess,native"
+
 # MIME type to file extension mapping
 mime_map = {
     "image/avif": ".avif",
@@ -18,12 +30,20 @@ mime_map = {
 }
 
 
+@cache
 def get_c2pa_binary_path():
-    """Get the path to the C2PA binary based on platform"""
+    """
+    Get the path to the C2PA binary based on platform, or `GPTZERO_V_C2PATOOL` if set.
+    Resolved once per process; None when the binary is missing or not executable.
+    """
+    binary_override = os.environ.get("GPTZERO_V_C2PATOOL")
+    if binary_override:
+        binary_path = Path(binary_override)
+        return binary_path if os.access(binary_path, os.X_OK) else None
+
     current_platform = platform.system()
-    c2patool_version = "v0.16.1"
     script_dir = Path(__file__).resolve().parent
-    c2patool_dir = script_dir / "resources" / "c2patool" / c2patool_version
+    c2patool_dir = script_dir / "resources" / "c2patool" / C2PATOOL_VERSION
 
     if current_platform == "Windows":
         binary_path = c2patool_dir / current_platform / "c2patool.exe"
@@ -34,8 +54,60 @@ def get_c2pa_binary_path():
     else:
         binary_path = None
 
-    # Check if the binary exists
-    if binary_path is not None and not binary_path.exists():
+    # Check if the binary exists and can be run
+    if binary_path is not None and not os.access(binary_path, os.X_OK):
         binary_path = None
 
     return binary_path
+
+
+@cache
+def get_c2patool_version() -> str:
+    """
+    Get the version of the c2patool in use: the pinned release for the bundled binary,
+    otherwise what the `GPTZERO_V_C2PATOOL` override reports, or its path when it cannot.
+    Resolved once per process.
+    """
+    binary_override = os.environ.get("GPTZERO_V_C2PATOOL")
+    if not binary_override:
+        return C2PATOOL_VERSION
+
+    try:
+        run = subprocess.run(
+            [binary_override, "--version"], capture_output=True, text=True, timeout=10, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return f"custom {binary_override}"
+    # e.g. "c2patool 0.16.1"
+    words = run.stdout.split()
+    return f"v{words[-1].removeprefix('v')}" if words else f"custom {binary_override}"
+
+
+def get_c2pa_recordings_dir() -> Path | None:
+    """Get the directory of recorded c2patool outputs set by `GPTZERO_V_C2PA_RECORDINGS`."""
+    recordings = os.environ.get("GPTZERO_V_C2PA_RECORDINGS")
+    return Path(recordings) if recordings and Path(recordings).is_dir() else None
+
+
+@cache
+def get_c2pa_backend_names() -> tuple[str, ...]:
+    """
+    Get the C2PA readers listed by `GPTZERO_V_C2PA_BACKENDS`, in order of preference,
+    keeping those that can run here: c2patool is found, the c2pa-python bindings are
+    installed, or recordings are configured.
+    Resolved once per process; empty when none can run.
+    """
+    names = os.environ.get("GPTZERO_V_C2PA_BACKENDS", DEFAULT_C2PA_BACKENDS)
+    names = [name.strip() for name in names.split(",") if name.strip()]
+
+    unknown = set(names) - set(C2PA_BACKENDS)
+    if unknown:
+        msg = f"Unknown C2PA backends: {sorted(unknown)}, expected some of {list(C2PA_BACKENDS)}"
+        raise ValueError(msg)
+
+    available = {
+        "subprocess": lambda: get_c2pa_binary_path() is not None,
+        "native": lambda: importlib.util.find_spec("c2pa") is not None,
+        "replay": lambda: get_c2pa_recordings_dir() is not None,
+    }
+    return tuple(name for name in dict.fromkeys(names) if available[name]())
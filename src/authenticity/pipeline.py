@@ -0,0 +1,325 @@
+import asyncio
+import os
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Any
+
+from .authenticity import compute_probability, score_analysis
+from .c2pa_backends import c2pa_check as default_c2pa_check
+from .c2pa_backends import c2pa_check_async as default_c2pa_check_async
+from .c2pa_handler import C2PAResult
+from .c2pa_metadata import C2PAMetadata
+from .exif_handler import check_exif
+from .exif_reader import ExifRecord
+from .media import ImageBuffer
+from .similarity import NearDuplicate, ProvenanceIndex, fingerprint
+
+
+if TYPE_CHECKING:
+    from .forensics import ForensicReport
+
+
+ExifResult = tuple[bool, ExifRecord | None]
+ForensicCheck = Callable[[ImageBuffer], "ForensicReport | None"]
+
+
+@dataclass
+class StageResult:
+    """
+    Outcome of one pipeline stage: "c2pa", "exif", "forensics" when the forensic stage
+    runs, "near_duplicate" when a provenance index matched the image or, last,
+    "probability".
+    """
+
+    stage: str
+    value: Any
+
+
+@dataclass
+class AnalysisResult:
+    """Combined outcome of every stage of the analysis of one image."""
+
+    c2pa_generated: bool
+    c2pa_metadata: C2PAMetadata | None
+    c2pa_error: str | None
+    exif_present: bool
+    exif_record: ExifRecord | None
+    probability: int | None
+    near_duplicate: NearDuplicate | None = None
+    forensic_report: "ForensicReport | None" = None
+
+
+@cache
+def get_pipeline_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool running the pipeline stages,
+    sized by `GPTZERO_V_PIPELINE_WORKERS`.
+    """
+    workers = int(os.environ.get("GPTZERO_V_PIPELINE_WORKERS", "0")) or None
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline")
+
+
+# Forked children, e.g. batch workers, inherit the pool object but not its threads
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_pipeline_executor.cache_clear)
+
+
+def get_forensic_check() -> ForensicCheck | None:
+    """Returns the forensic stage when `GPTZERO_V_FORENSICS` turns it on, None otherwise."""
+    if os.environ.get("GPTZERO_V_FORENSICS", "").lower() not in {"1", "true", "yes"}:
+        return None
+
+    # NumPy is only loaded when the stage is on
+    from .forensics import check_forensics
+
+    return check_forensics
+
+
+def iter_analysis(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    c2pa_check: Callable[[ImageBuffer, str], C2PAResult] = default_c2pa_check,
+    exif_check: Callable[[ImageBuffer], ExifResult] = check_exif,
+    executor: Executor | None = None,
+    provenance_index: ProvenanceIndex | None = None,
+    forensic_check: ForensicCheck | None = None,
+) -> Iterator[StageResult]:
+    """
+    Run the C2PA and EXIF stages of an image concurrently, yielding each result as soon
+    as it is ready, then the probability once both are known.
+
+    Args:
+        file_bytes: Image bytes or a zero-copy view of them
+        mime_type: MIME type announced for the image
+        c2pa_check: C2PA stage, e.g. a cached or pooled `c2pa_backends.c2pa_check`
+        exif_check: EXIF stage, e.g. a cached `check_exif`
+        executor: Pool running the stages; defaults to the shared pipeline pool
+        provenance_index: Index recording the image, and matching it to a close copy with
+            provenance when it has none of its own
+        forensic_check: Pixel-level stage, e.g. `forensics.check_forensics`, whose scores
+            feed the probability
+
+    Yields:
+        StageResult of "c2pa", "exif" and "forensics" if run, in completion order, then of
+        "near_duplicate" if any, then of "probability"
+    """
+    executor = executor or get_pipeline_executor()
+    futures: dict[Future, str] = {
+        executor.submit(c2pa_check, file_bytes, mime_type): "c2pa",
+        executor.submit(exif_check, file_bytes): "exif",
+    }
+    if forensic_check is not None:
+        futures[executor.submit(forensic_check, file_bytes)] = "forensics"
+    # Hashed alongside the other stages, but only reported through its match
+    hashing = executor.submit(fingerprint, file_bytes) if provenance_index is not None else None
+
+    results: dict[str, Any] = {}
+    try:
+        for future in as_completed(futures):
+            stage = futures[future]
+            results[stage] = future.result()
+            yield StageResult(stage, results[stage])
+
+        near_duplicate = None
+        if hashing is not None:
+            near_duplicate = provenance_index.resolve(
+                hashing.result(), results["c2pa"], results["exif"][0]
+            )
+            if near_duplicate is not None:
+                yield StageResult("near_duplicate", near_duplicate)
+    finally:
+        # The consumer went away early: drop the stages that have not started yet
+        for future in futures:
+            future.cancel()
+        if hashing is not None:
+            hashing.cancel()
+
+    yield StageResult(
+        "probability",
+        _probability(results["c2pa"], results["exif"], near_duplicate, results.get("forensics")),
+    )
+
+
+def analyze_image(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    c2pa_check: Callable[[ImageBuffer, str], C2PAResult] = default_c2pa_check,
+    exif_check: Callable[[ImageBuffer], ExifResult] = check_exif,
+    executor: Executor | None = None,
+    provenance_index: ProvenanceIndex | None = None,
+    forensic_check: ForensicCheck | None = None,
+) -> AnalysisResult:
+    """
+    Same as `iter_analysis`, but waits for every stage.
+    The latency is that of the slowest stage rather than the sum of them.
+    """
+    stages = iter_analysis(
+        file_bytes, mime_type, c2pa_check, exif_check, executor, provenance_index, forensic_check
+    )
+    results = {result.stage: result.value for result in stages}
+    return _to_analysis_result(
+        results["c2pa"], results["exif"], results.get("near_duplicate"), results.get("forensics")
+    )
+
+
+async def analyze_image_async(
+    file_bytes: ImageBuffer,
+    mime_type: str,
+    c2pa_check: Callable[[ImageBuffer, str], Awaitable[C2PAResult]] = default_c2pa_check_async,
+    exif_check: Callable[[ImageBuffer], ExifResult] = check_exif,
+    provenance_index: ProvenanceIndex | None = None,
+    forensic_check: ForensicCheck | None = None,
+) -> AnalysisResult:
+    """
+    Same as `analyze_image`, but awaited on an event loop, e.g. by the HTTP service:
+    `c2pa_check` is awaited, e.g. a cached `c2pa_backends.c2pa_check_async`, and the
+    other stages run on worker threads.
+    """
+    stages = [c2pa_check(file_bytes, mime_type), asyncio.to_thread(exif_check, file_bytes)]
+    if provenance_index is not None:
+        stages.append(asyncio.to_thread(fingerprint, file_bytes))
+    if forensic_check is not None:
+        stages.append(asyncio.to_thread(forensic_check, file_bytes))
+    c2pa_result, exif_result, *rest = await asyncio.gather(*stages)
+
+    near_duplicate = None
+    if provenance_index is not None:
+        near_duplicate = await asyncio.to_thread(
+            provenance_index.resolve, rest.pop(0), c2pa_result, exif_result[0]
+        )
+    forensic_report = rest.pop(0) if forensic_check is not None else None
+    return _to_analysis_result(c2pa_result, exif_result, near_duplicate, forensic_report)
+
+
+def iter_analyses(
+    images: Iterable[tuple[ImageBuffer, str]],
+    c2pa_check: Callable[[ImageBuffer, str], C2PAResult] = default_c2pa_check,
+    exif_check: Callable[[ImageBuffer], ExifResult] = check_exif,
+    max_in_flight: int = 4,
+    executor: Executor | None = None,
+    provenance_index: ProvenanceIndex | None = None,
+    forensic_check: ForensicCheck | None = None,
+) -> Iterator[tuple[int, AnalysisResult]]:
+    """
+    Analyse many images in parallel, yielding each result as soon as its image is done.
+
+    At most `max_in_flight` images have stages scheduled at once, so `images` is consumed
+    lazily. The stages are submitted straight to the pool rather than through
+    `analyze_image`, so that a bounded pool can never wait on itself.
+
+    Args:
+        images: (image bytes, MIME type) pairs
+        c2pa_check: C2PA stage, e.g. a cached or pooled `c2pa_backends.c2pa_check`
+        exif_check: EXIF stage, e.g. a cached `check_exif`
+        max_in_flight: Maximum number of images analysed at once
+        executor: Pool running the stages; defaults to the shared pipeline pool
+        provenance_index: Index recording the images, and matching those without
+            provenance to a close copy with some
+        forensic_check: Pixel-level stage, e.g. `forensics.check_forensics`, whose scores
+            feed the probabilities
+
+    Yields:
+        (index of the image in `images`, AnalysisResult), in completion order
+    """
+    executor = executor or get_pipeline_executor()
+    stage_count = 2 + (provenance_index is not None) + (forensic_check is not None)
+    images = enumerate(images)
+    pending: dict[Future, tuple[int, str]] = {}
+    # Image index -> stage results gathered so far
+    partial: dict[int, dict[str, Any]] = {}
+
+    try:
+        while True:
+            while len(partial) < max_in_flight:
+                item = next(images, None)
+                if item is None:
+                    break
+                index, (file_bytes, mime_type) = item
+                partial[index] = {}
+                pending[executor.submit(c2pa_check, file_bytes, mime_type)] = (index, "c2pa")
+                pending[executor.submit(exif_check, file_bytes)] = (index, "exif")
+                if provenance_index is not None:
+                    hashing = executor.submit(fingerprint, file_bytes)
+                    pending[hashing] = (index, "fingerprint")
+                if forensic_check is not None:
+                    pending[executor.submit(forensic_check, file_bytes)] = (index, "forensics")
+
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, stage = pending.pop(future)
+                partial[index][stage] = future.result()
+                if len(partial[index]) == stage_count:
+                    results = partial.pop(index)
+                    near_duplicate = None
+                    if provenance_index is not None:
+                        near_duplicate = provenance_index.resolve(
+                            results["fingerprint"], results["c2pa"], results["exif"][0]
+                        )
+                    yield (
+                        index,
+                        _to_analysis_result(
+                            results["c2pa"],
+                            results["exif"],
+                            near_duplicate,
+                            results.get("forensics"),
+                        ),
+                    )
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _probability(
+    c2pa_result: C2PAResult,
+    exif_result: ExifResult,
+    near_duplicate: NearDuplicate | None,
+    forensic_report: "ForensicReport | None" = None,
+) -> int | None:
+    c2pa_generated, c2pa_metadata, c2pa_error = c2pa_result
+    exif_present, _ = exif_result
+
+    # The probability is unknown when C2PA parsing failed
+    if c2pa_error:
+        return None
+    # An image without metadata is scored on the provenance of the close copy it was
+    # matched to, and on its own pixels
+    if near_duplicate is not None:
+        c2pa_generated = near_duplicate.c2pa_generated
+        c2pa_metadata = near_duplicate.c2pa_metadata
+        exif_present = near_duplicate.exif_present
+    if forensic_report is not None:
+        return score_analysis(c2pa_generated, c2pa_metadata, exif_present, forensic_report)
+    return compute_probability(c2pa_generated, exif_present)
+
+
+def _to_analysis_result(
+    c2pa_result: C2PAResult,
+    exif_result: ExifResult,
+    near_duplicate: NearDuplicate | None = None,
+    forensic_report: "ForensicReport | None" = None,
+) -> AnalysisResult:
+    c2pa_generated, c2pa_metadata, c2pa_error = c2pa_result
+    exif_present, exif_record = exif_result
+
+    return AnalysisResult(
+        c2pa_generated=c2pa_generated,
+        c2pa_metadata=c2pa_metadata,
+        c2pa_error=c2pa_error,
+        exif_present=exif_present,
+        exif_record=exif_record,
+        probability=_probability(c2pa_result, exif_result, near_duplicate, forensic_report),
+        near_duplicate=near_duplicate,
+        forensic_report=forensic_report,
+    )
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from functools import cache
+from itertools import accumulate
+from pathlib import Path
+
+from authenticity.c2pa_metadata import C2PAMetadata
+
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / "resources" / "config" / "generators.json"
+
+# Metadata fields rules can target, in the order they are checked
+RULE_FIELDS = ("generator_name", "software_agent", "digital_source_type")
+
+# Joins the values of a batch; it cannot occur inside a metadata string pattern
+_SEPARATOR = "\x00"
+
+
+@dataclass(frozen=True)
+class GeneratorRule:
+    """Substring patterns identifying an AI generator in one C2PA metadata field."""
+
+    name: str
+    vendor: str | None
+    field: str
+    patterns: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    """The rule that flagged an image and the metadata value it matched."""
+
+    rule: str
+    vendor: str | None
+    field: str
+    value: str
+
+
+def _field_values(c2pa_metadata: C2PAMetadata, field: str) -> Iterator[str]:
+    if field == "generator_name":
+        yield c2pa_metadata.generator_name
+    elif field == "software_agent":
+        for agent in c2pa_metadata.software_agents:
+            yield agent.name
+    elif c2pa_metadata.digital_source_type:
+        yield c2pa_metadata.digital_source_type
+
+
+def _collect_values(
+    batch: list[C2PAMetadata | None], pending: list[int], field: str
+) -> tuple[list[int], list[str]]:
+    """Returns the values of `field` across the pending batch items and the item owning each."""
+    if field == "generator_name":
+        return pending, [batch[index].generator_name for index in pending]
+
+    if field == "software_agent":
+        pairs = [(index, agent.name) for index in pending for agent in batch[index].software_agents]
+    else:
+        pairs = [
+            (index, batch[index].digital_source_type)
+            for index in pending
+            if batch[index].digital_source_type
+        ]
+    return [index for index, _ in pairs], [value for _, value in pairs]
+
+
+class GeneratorRules:
+    """
+    Rule set compiled once for fast matching.
+
+    Patterns are case-sensitive substrings, as generators spell their own names.
+    Single manifests are matched with one regex per metadata field,
+    whose named groups tell which rule fired. Batches are matched by searching each
+    pattern once through the values of the whole batch.
+    """
+
+    def __init__(self, rules: list[GeneratorRule], version: str) -> None:
+        self.rules = rules
+        self.version = version
+
+        self._groups: dict[str, GeneratorRule] = {}
+        self._matchers: dict[str, re.Pattern] = {}
+        self._patterns: dict[str, list[tuple[str, GeneratorRule]]] = {}
+
+        for field in RULE_FIELDS:
+            alternatives = []
+            patterns = []
+            for index, rule in enumerate(rules):
+                if rule.field != field:
+                    continue
+                group = f"rule{index}"
+                self._groups[group] = rule
+                pattern = "|".join(re.escape(pattern) for pattern in rule.patterns)
+                alternatives.append(f"(?P<{group}>{pattern})")
+                patterns.extend((pattern, rule) for pattern in rule.patterns)
+            if alternatives:
+                self._matchers[field] = re.compile("|".join(alternatives))
+                self._patterns[field] = patterns
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "GeneratorRules":
+        """
+        Load and compile a JSON rule file.
+
+        Args:
+            path: Rule file; defaults to `GPTZERO_V_RULES_PATH` or the bundled rules
+
+        Returns:
+            Compiled GeneratorRules
+        """
+        path = path or os.environ.get("GPTZERO_V_RULES_PATH") or DEFAULT_RULES_PATH
+        with open(path, encoding="utf-8") as rule_file:
+            config = json.load(rule_file)
+
+        unknown = {rule["field"] for rule in config["rules"]} - set(RULE_FIELDS)
+        if unknown:
+            msg = f"Unknown rule fields in {path}: {sorted(unknown)}"
+            raise ValueError(msg)
+
+        rules = [
+            GeneratorRule(
+                name=rule["name"],
+                vendor=rule.get("vendor"),
+                field=rule["field"],
+                patterns=tuple(rule["patterns"]),
+            )
+            for rule in config["rules"]
+        ]
+        return cls(rules, version=str(config.get("version", "0")))
+
+    def match(self, c2pa_metadata: C2PAMetadata) -> RuleMatch | None:
+        """Returns the first rule matching the metadata, or None if it looks non-generated."""
+        for field, matcher in self._matchers.items():
+            for value in _field_values(c2pa_metadata, field):
+                found = matcher.search(value)
+                if found is not None:
+                    return self._to_match(found, field, value)
+        return None
+
+    def match_batch(self, batch: Iterable[C2PAMetadata | None]) -> list[RuleMatch | None]:
+        """
+        Same as `match` over many parsed manifests at once.
+
+        The values of each field across the batch are joined into one text, and every
+        pattern is searched through it with `str.find`; the leftmost hit per manifest wins,
+        ties going to the earlier pattern, as with the single-manifest regex.
+        """
+        batch = list(batch)
+        matches: list[RuleMatch | None] = [None] * len(batch)
+        pending = [index for index, c2pa_metadata in enumerate(batch) if c2pa_metadata is not None]
+
+        for field, patterns in self._patterns.items():
+            owners, values = _collect_values(batch, pending, field)
+            text = _SEPARATOR.join(values)
+            # Start offset of every value inside the joined text
+            starts = list(accumulate((len(value) + 1 for value in values), initial=0))
+
+            # Batch index -> ((text offset, pattern order), value position) of its best hit
+            best: dict[int, tuple[tuple[int, int], int]] = {}
+            for order, (pattern, _) in enumerate(patterns):
+                offset = text.find(pattern)
+                while offset != -1:
+                    position = bisect_right(starts, offset) - 1
+                    index = owners[position]
+                    if index not in best or (offset, order) < best[index][0]:
+                        best[index] = ((offset, order), position)
+                    offset = text.find(pattern, offset + 1)
+
+            for index, ((_, order), position) in best.items():
+                rule = patterns[order][1]
+                matches[index] = RuleMatch(
+                    rule=rule.name, vendor=rule.vendor, field=field, value=values[position]
+                )
+
+            pending = [index for index in pending if matches[index] is None]
+
+        return matches
+
+    def _to_match(self, found: re.Match, field: str, value: str) -> RuleMatch:
+        rule = self._groups[found.lastgroup]
+        return RuleMatch(rule=rule.name, vendor=rule.vendor, field=field, value=value)
+
+
+@cache
+def get_generator_rules() -> GeneratorRules:
+    """Returns the process-wide rule set, loaded and compiled on first use."""
+    return GeneratorRules.load()
@@ -0,0 +1,233 @@
+import json
+import os
+from collections.abc import Iterable, Mapping, Sequence
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+from authenticity.c2pa_metadata import AI_GENERATED_SOURCE, C2PAMetadata
+
+
+if TYPE_CHECKING:
+    from authenticity.forensics import ForensicReport
+
+
+DEFAULT_SCORING_PATH = Path(__file__).resolve().parent / "resources" / "config" / "scoring.json"
+
+# Signals an image is scored on, in the column order of the feature matrix
+FEATURES = (
+    "c2pa_generated",
+    "c2pa_present",
+    "ai_source_type",
+    "exif_present",
+    "provenance_depth",
+    "thumbnail_mismatch",
+    "ela_inconsistency",
+)
+
+
+def extract_features(
+    c2pa_generated: bool,
+    c2pa_metadata: C2PAMetadata | None,
+    exif_present: bool,
+    forensic_report: "ForensicReport | None" = None,
+) -> tuple[float, ...]:
+    """
+    Returns the feature row of one analysed image, in `FEATURES` order.
+    Forensic scores that were not computed are zero.
+    """
+    thumbnail_mismatch = ela_inconsistency = None
+    if forensic_report is not None:
+        thumbnail_mismatch = forensic_report.thumbnail_mismatch
+        ela_inconsistency = forensic_report.ela_inconsistency
+
+    return (
+        float(c2pa_generated),
+        float(c2pa_metadata is not None),
+        float(
+            c2pa_metadata is not None and c2pa_metadata.digital_source_type == AI_GENERATED_SOURCE
+        ),
+        float(exif_present),
+        float(len(c2pa_metadata.provenance)) if c2pa_metadata is not None else 0.0,
+        thumbnail_mismatch or 0.0,
+        ela_inconsistency or 0.0,
+    )
+
+
+def feature_columns(
+    c2pa_generated: npt.ArrayLike,
+    c2pa_metadata: Sequence[C2PAMetadata | None],
+    exif_present: npt.ArrayLike,
+    forensic_reports: "Sequence[ForensicReport | None] | None" = None,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Build the feature columns of many analysed images, for `Scorer.score_columns`.
+    Only the images with C2PA metadata, or a forensic report, have features read one by one.
+
+    Args:
+        c2pa_generated: C2PA verdict of every image
+        c2pa_metadata: C2PA metadata of every image, None without any
+        exif_present: Whether every image carries EXIF
+        forensic_reports: Forensic report of every image, None when it was not computed
+
+    Returns:
+        Feature name -> values, one per image; forensic scores not computed are zero
+    """
+    size = len(c2pa_metadata)
+    present = np.fromiter((item is not None for item in c2pa_metadata), dtype=bool, count=size)
+    ai_source_type = np.zeros(size)
+    provenance_depth = np.zeros(size)
+    indices = np.flatnonzero(present)
+    if indices.size:
+        described = [c2pa_metadata[index] for index in indices.tolist()]
+        ai_source_type[indices] = [
+            item.digital_source_type == AI_GENERATED_SOURCE for item in described
+        ]
+        provenance_depth[indices] = [len(item.provenance) for item in described]
+
+    columns = {
+        "c2pa_generated": np.asarray(c2pa_generated, dtype=np.float64),
+        "c2pa_present": present.astype(np.float64),
+        "ai_source_type": ai_source_type,
+        "exif_present": np.asarray(exif_present, dtype=np.float64),
+        "provenance_depth": provenance_depth,
+    }
+    if forensic_reports is not None:
+        thumbnail_mismatch = np.zeros(size)
+        ela_inconsistency = np.zeros(size)
+        reported = np.fromiter(
+            (report is not None for report in forensic_reports), dtype=bool, count=size
+        )
+        indices = np.flatnonzero(reported)
+        if indices.size:
+            reports = [forensic_reports[index] for index in indices.tolist()]
+            thumbnail_mismatch[indices] = [report.thumbnail_mismatch or 0.0 for report in reports]
+            ela_inconsistency[indices] = [report.ela_inconsistency or 0.0 for report in reports]
+        columns["thumbnail_mismatch"] = thumbnail_mismatch
+        columns["ela_inconsistency"] = ela_inconsistency
+    return columns
+
+
+class Scorer:
+    """
+    Linear scorer turning feature matrices into AI-generated probabilities.
+
+    The weighted sum of the features of an image goes through a piecewise-linear
+    calibration table, mapping raw scores to probabilities from 0 to 100; scores beyond
+    the table get the probability of its nearest end.
+    """
+
+    def __init__(
+        self,
+        weights: Mapping[str, float],
+        bias: float,
+        calibration: Iterable[tuple[float, float]],
+        version: str,
+    ) -> None:
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            msg = f"Unknown scoring features: {sorted(unknown)}"
+            raise ValueError(msg)
+
+        self.weights = np.array([weights.get(name, 0.0) for name in FEATURES])
+        self.bias = bias
+        self.version = version
+        self._scores, self._probabilities = np.array(sorted(calibration), dtype=np.float64).T
+        if len(np.unique(self._scores)) != len(self._scores):
+            msg = "Calibration scores must be distinct"
+            raise ValueError(msg)
+
+        # Every outcome of `compute_probability`, scored once through the batch path; a
+        # C2PA verdict implies metadata, the other signals are unknown and taken as zero
+        signals = [(generated, exif) for generated in (False, True) for exif in (False, True)]
+        generated = [generated for generated, _ in signals]
+        probabilities = self.score_columns(
+            {
+                "c2pa_generated": generated,
+                "c2pa_present": generated,
+                "exif_present": [exif for _, exif in signals],
+            }
+        )
+        self._single = dict(zip(signals, probabilities.tolist(), strict=True))
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "Scorer":
+        """
+        Load a JSON scoring config.
+
+        Args:
+            path: Config file; defaults to `GPTZERO_V_SCORING_PATH` or the bundled config
+
+        Returns:
+            Scorer with the configured weights and calibration table
+        """
+        path = path or os.environ.get("GPTZERO_V_SCORING_PATH") or DEFAULT_SCORING_PATH
+        with open(path, encoding="utf-8") as config_file:
+            config = json.load(config_file)
+
+        return cls(
+            weights=config["weights"],
+            bias=float(config.get("bias", 0.0)),
+            calibration=[tuple(point) for point in config["calibration"]],
+            version=str(config.get("version", "0")),
+        )
+
+    @property
+    def levels(self) -> tuple[int, ...]:
+        """Returns every value `score_signals` can return."""
+        return tuple(sorted(set(self._single.values())))
+
+    def score(self, features: npt.ArrayLike) -> npt.NDArray[np.int64]:
+        """
+        Score a batch of images at once.
+
+        Args:
+            features: Matrix with one row per image and one column per feature
+
+        Returns:
+            Integer probabilities from 0 to 100, one per row
+        """
+        raw = np.asarray(features, dtype=np.float64) @ self.weights + self.bias
+        return self._calibrate(raw)
+
+    def score_columns(self, columns: Mapping[str, npt.ArrayLike]) -> npt.NDArray[np.int64]:
+        """
+        Score stored analyses from one array per feature, without building the matrix.
+        Missing features are zero, so e.g. batch records, which only keep `c2pa_generated`
+        and `exif_present`, can be re-scored as they are.
+
+        Args:
+            columns: Feature name -> values, one per image
+
+        Returns:
+            Integer probabilities from 0 to 100, one per image
+        """
+        unknown = set(columns) - set(FEATURES)
+        if unknown:
+            msg = f"Unknown features: {sorted(unknown)}"
+            raise ValueError(msg)
+
+        arrays = [(name, np.asarray(values)) for name, values in columns.items()]
+        raw = np.full(len(arrays[0][1]) if arrays else 0, self.bias)
+        for name, values in arrays:
+            weight = self.weights[FEATURES.index(name)]
+            if weight:
+                raw += weight * values
+        return self._calibrate(raw)
+
+    def _calibrate(self, raw: npt.NDArray[np.float64]) -> npt.NDArray[np.int64]:
+        probabilities = np.interp(raw, self._scores, self._probabilities)
+        return np.rint(probabilities, out=probabilities).astype(np.int64)
+
+    def score_signals(self, c2pa_generated: bool, exif_present: bool) -> int:
+        """Same as `score`, for a single image known by its C2PA and EXIF signals only."""
+        return self._single[bool(c2pa_generated), bool(exif_present)]
+
+
+@cache
+def get_scorer() -> Scorer:
+    """Returns the process-wide scorer, loaded on first use."""
+    return Scorer.load()
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from functools import cache
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from .c2pa_handler import C2PAResult
+from .c2pa_metadata import C2PAMetadata
+from .media import BufferReader, ImageBuffer
+
+
+# Side of the difference hash grid: 8 x 8 comparisons, i.e. a 64-bit hash
+HASH_SIZE = 8
+
+# Largest Hamming distance between the hashes of copies of the same image, e.g. a
+# screenshot and its original
+MAX_DISTANCE = int(os.environ.get("GPTZERO_V_PHASH_DISTANCE", "6"))
+
+
+@dataclass(slots=True)
+class Fingerprint:
+    """Exact and perceptual hashes of an image."""
+
+    sha256: str
+    phash: int
+
+
+@dataclass(slots=True)
+class NearDuplicate:
+    """A previously analysed image with provenance, closely matching an image without any."""
+
+    sha256: str
+    distance: int
+    c2pa_generated: bool
+    c2pa_metadata: C2PAMetadata | None
+    exif_present: bool
+
+
+def perceptual_hash(file_bytes: ImageBuffer) -> int | None:
+    """
+    Compute the 64-bit difference hash of an image: whether each pixel of a 9 x 8
+    grayscale thumbnail is brighter than its left neighbour. It survives rescaling,
+    re-encoding and metadata stripping, but not cropping.
+
+    Returns:
+        The hash, or None when the image cannot be decoded
+    """
+    try:
+        with Image.open(BufferReader(file_bytes)) as image:
+            # JPEGs are decoded straight at a reduced scale
+            image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            thumbnail = image.convert("L").resize(
+                (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0
+            )
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    pixels = thumbnail.tobytes()
+    phash = 0
+    for row in range(0, len(pixels), HASH_SIZE + 1):
+        for column in range(row, row + HASH_SIZE):
+            phash = phash << 1 | (pixels[column + 1] > pixels[column])
+    return phash
+
+
+def fingerprint(file_bytes: ImageBuffer) -> Fingerprint | None:
+    """Returns the fingerprint of an image, or None when it cannot be decoded."""
+    phash = perceptual_hash(file_bytes)
+    if phash is None:
+        return None
+    return Fingerprint(hashlib.sha256(file_bytes).hexdigest(), phash)
+
+
+@cache
+def _flip_masks(bits: int, radius: int) -> tuple[int, ...]:
+    """Returns every mask of `bits` bits with at most `radius` bits set."""
+    return tuple(
+        sum(1 << bit for bit in flipped)
+        for count in range(radius + 1)
+        for flipped in combinations(range(bits), count)
+    )
+
+
+class HashIndex:
+    """
+    Multi-index hashing table for Hamming-distance search over 64-bit hashes.
+
+    Each hash is split into four 16-bit chunks, each indexing its own table. Two hashes
+    within distance d have at least one chunk within distance d // 4, so a search only
+    probes the buckets of the chunks of the query with up to d // 4 bits flipped, and
+    compares the few hashes found there at once with NumPy. Up to distance 7, that is 17
+    buckets per chunk, which keeps searches well under a millisecond at millions of hashes.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self) -> None:
+        self._hashes = array("Q")
+        self._items = array("q")
+        # Chunk value -> positions of the hashes having it, for every chunk
+        self._tables: list[defaultdict[int, array]] = [
+            defaultdict(lambda: array("I")) for _ in range(self.CHUNKS)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, phash: int, item: int) -> None:
+        """Index `phash`, returning `item` when searches find it."""
+        position = len(self._hashes)
+        self._hashes.append(phash)
+        self._items.append(item)
+        for chunk, table in zip(self._chunks(phash), self._tables, strict=True):
+            table[chunk].append(position)
+
+    def search(self, phash: int, max_distance: int) -> list[tuple[int, int]]:
+        """
+        Find the indexed hashes within `max_distance` bits of `phash`.
+
+        Returns:
+            (distance, item) pairs, closest first
+        """
+        masks = _flip_masks(self.CHUNK_BITS, max_distance // self.CHUNKS)
+        # Positions in every probed bucket, joined without leaving C
+        buckets = b"".join(
+            [
+                table.get(chunk ^ mask, b"")
+                for chunk, table in zip(self._chunks(phash), self._tables, strict=True)
+                for mask in masks
+            ]
+        )
+        positions = np.unique(np.frombuffer(buckets, dtype=np.uint32))
+
+        hashes = np.frombuffer(self._hashes, dtype=np.uint64)[positions]
+        distances = np.bitwise_count(hashes ^ np.uint64(phash))
+        close = distances <= max_distance
+        items = np.frombuffer(self._items, dtype=np.int64)[positions[close]]
+        return sorted(zip(distances[close].tolist(), items.tolist(), strict=True))
+
+    def _chunks(self, phash: int) -> list[int]:
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(phash >> (self.CHUNK_BITS * index)) & mask for index in range(self.CHUNKS)]
+
+
+class ProvenanceIndex:
+    """
+    Fingerprints and verdicts of every analysed image, to carry the provenance of an
+    image over to its copies stripped of metadata, e.g. screenshots or re-uploads.
+
+    Verdicts live in a SQLite table, optionally on disk so that the index outlives the
+    process; the perceptual hashes of the images with provenance, i.e. C2PA or EXIF
+    metadata, are searched in memory and loaded from the table at start.
+    """
+
+    def __init__(self, db_path: str | Path | None = None, max_distance: int = MAX_DISTANCE) -> None:
+        self.db_path = db_path
+        self.max_distance = max_distance
+
+        self._hashes = HashIndex()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or ":memory:", timeout=30, check_same_thread=False)
+        if db_path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (sha256 TEXT PRIMARY KEY, "
+            "phash INTEGER NOT NULL, provenance INTEGER NOT NULL, verdict TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+        for rowid, phash in self._db.execute(
+            "SELECT rowid, phash FROM fingerprints WHERE provenance"
+        ):
+            self._hashes.add(phash % (1 << 64), rowid)
+
+    @classmethod
+    def from_env(cls) -> "ProvenanceIndex":
+        """Build an index configured by `GPTZERO_V_PHASH_PATH` and `GPTZERO_V_PHASH_DISTANCE`."""
+        return cls(db_path=os.environ.get("GPTZERO_V_PHASH_PATH"))
+
+    def __len__(self) -> int:
+        """Returns the number of images with provenance that copies can be matched to."""
+        return len(self._hashes)
+
+    def resolve(
+        self, fingerprint: Fingerprint | None, c2pa_result: C2PAResult, exif_present: bool
+    ) -> NearDuplicate | None:
+        """
+        Record the verdict of an analysed image and, if it carries no metadata at all,
+        look for a close copy of it that does.
+
+        Args:
+            fingerprint: Fingerprint of the image, None when it could not be decoded
+            c2pa_result: Outcome of the C2PA stage
+            exif_present: Outcome of the EXIF stage
+
+        Returns:
+            The closest image with provenance, or None
+        """
+        c2pa_generated, c2pa_metadata, c2pa_error = c2pa_result
+        # Failed checks say nothing about the image
+        if fingerprint is None or c2pa_error:
+            return None
+
+        has_provenance = c2pa_metadata is not None or exif_present
+        verdict = json.dumps(
+            {
+                "c2pa_generated": c2pa_generated,
+                "c2pa_metadata": asdict(c2pa_metadata) if c2pa_metadata is not None else None,
+                "exif_present": exif_present,
+            }
+        )
+
+        with self._lock:
+            self._record(fingerprint, has_provenance, verdict)
+            if has_provenance:
+                return None
+            return self._nearest(fingerprint.phash)
+
+    def _record(self, fingerprint: Fingerprint, has_provenance: bool, verdict: str) -> None:
+        row = self._db.execute(
+            "SELECT rowid, provenance FROM fingerprints WHERE sha256 = ?", (fingerprint.sha256,)
+        ).fetchone()
+        # Stored signed, as SQLite integers are
+        phash = fingerprint.phash - (1 << 64) if fingerprint.phash >= 1 << 63 else fingerprint.phash
+
+        if row is None:
+            rowid = self._db.execute(
+                "INSERT INTO fingerprints (sha256, phash, provenance, verdict) VALUES (?, ?, ?, ?)",
+                (fingerprint.sha256, phash, has_provenance, verdict),
+            ).lastrowid
+            indexed = False
+        else:
+            rowid, indexed = row
+            self._db.execute(
+                "UPDATE fingerprints SET provenance = ?, verdict = ? WHERE rowid = ?",
+                (has_provenance or indexed, verdict, rowid),
+            )
+        self._db.commit()
+
+        if has_provenance and not indexed:
+            self._hashes.add(fingerprint.phash, rowid)
+
+    def _nearest(self, phash: int) -> NearDuplicate | None:
+        for distance, rowid in self._hashes.search(phash, self.max_distance):
+            row = self._db.execute(
+                "SELECT sha256, verdict FROM fingerprints WHERE rowid = ?", (rowid,)
+            ).fetchone()
+            if row is None:
+                continue
+
+            sha256, verdict = row[0], json.loads(row[1])
+            metadata = verdict["c2pa_metadata"]
+            if metadata is None and not verdict["exif_present"]:
+                # Re-analysed since without provenance, e.g. under new generator rules
+                continue
+
+            return NearDuplicate(
+                sha256=sha256,
+                distance=distance,
+                c2pa_generated=verdict["c2pa_generated"],
+                c2pa_metadata=C2PAMetadata.from_dict(metadata) if metadata is not None else None,
+                exif_present=verdict["exif_present"],
+            )
+        return None
@@ -0,0 +1,400 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Collection
+from dataclasses import asdict, dataclass
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .c2pa_backends import PRESCAN_TOOL, get_c2pa_backends
+from .c2pa_handler import C2PAReading
+from .c2pa_metadata import C2PAMetadata
+from .exif_reader import ExifRecord
+from .forensics import ForensicReport
+from .manifest_parser import parse_manifest
+from .rules import GeneratorRules, get_generator_rules
+from .scoring import Scorer, feature_columns, get_scorer
+
+
+# Analyses re-scored per transaction
+DEFAULT_BATCH_SIZE = 1024
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analyses ("
+    "sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, mime_type TEXT, "
+    "output BLOB, read_error TEXT, exif TEXT, forensics TEXT, "
+    "tool_version TEXT, rules_version TEXT NOT NULL, scoring_version TEXT NOT NULL, "
+    "c2pa_generated INTEGER NOT NULL, c2pa_generator TEXT, c2pa_rule TEXT, c2pa_error TEXT, "
+    "probability INTEGER, analyzed_at REAL NOT NULL)",
+    # `output` is the whole reader output, zlib-compressed, NULL without a manifest store.
+    # Stale verdicts are looked up by the versions they were computed with; `tool_version`
+    # is the reader that answered, as `C2PABackend.tool`, NULL when none could
+    "CREATE INDEX IF NOT EXISTS analyses_versions ON analyses (rules_version, scoring_version)",
+    "CREATE INDEX IF NOT EXISTS analyses_tool_version ON analyses (tool_version)",
+)
+
+
+@dataclass
+class StoredInputs:
+    """What the verdict of an analysed image is computed from, as the store keeps it."""
+
+    manifest: dict[str, Any] | None
+    read_error: str | None
+    exif_present: bool
+    forensic_report: ForensicReport | None = None
+
+
+@dataclass
+class Verdict:
+    """Outcome of scoring the inputs of one analysed image, as batch records report it."""
+
+    c2pa_generated: bool
+    c2pa_generator: str | None
+    c2pa_rule: str | None
+    c2pa_error: str | None
+    probability: int | None
+
+
+@dataclass
+class RescoreSummary:
+    """Totals of a re-scoring pass over a store."""
+
+    rescored: int
+    changed: int
+    up_to_date: int
+    outdated_tool: int
+    elapsed_s: float
+
+    @property
+    def throughput(self) -> float:
+        """Returns the number of re-scored analyses per second."""
+        return self.rescored / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def score_inputs(
+    inputs: list[StoredInputs], rules: GeneratorRules, scorer: Scorer
+) -> list[Verdict]:
+    """
+    Interpret the manifests of many analyses, match them against the generator rules and
+    score them at once, as the pipeline would for each image alone.
+    """
+    metadata_batch: list[C2PAMetadata | None] = []
+    errors: list[str | None] = []
+    for item in inputs:
+        c2pa_metadata, error = None, item.read_error
+        if item.manifest is not None:
+            try:
+                c2pa_metadata = C2PAMetadata.from_manifest(item.manifest)
+            except Exception as e:
+                error = f"Error parsing C2PA metadata: {e!s}"
+        metadata_batch.append(c2pa_metadata)
+        errors.append(error)
+
+    matches = rules.match_batch(metadata_batch)
+
+    generated = np.array([match is not None for match in matches], dtype=bool)
+    forensic_reports = [item.forensic_report for item in inputs]
+    columns = feature_columns(
+        generated,
+        metadata_batch,
+        [item.exif_present for item in inputs],
+        forensic_reports,
+    )
+    # Analyses without forensics are scored as `compute_probability` does: a C2PA verdict
+    # implies metadata, and the other signals are unknown
+    unscanned = np.fromiter(
+        (report is None for report in forensic_reports), dtype=bool, count=len(inputs)
+    )
+    columns["c2pa_present"] = np.where(unscanned, generated, columns["c2pa_present"])
+    columns["ai_source_type"][unscanned] = 0.0
+    columns["provenance_depth"][unscanned] = 0.0
+    probabilities = scorer.score_columns(columns).tolist() if inputs else []
+
+    return [
+        Verdict(
+            c2pa_generated=match is not None,
+            c2pa_generator=c2pa_metadata.generator_name if c2pa_metadata else None,
+            c2pa_rule=match.rule if match else None,
+            c2pa_error=error,
+            # Mirror the UI: the probability is unknown when C2PA parsing failed
+            probability=None if error else probability,
+        )
+        for c2pa_metadata, match, error, probability in zip(
+            metadata_batch, matches, errors, probabilities, strict=True
+        )
+    ]
+
+
+def _load_inputs(
+    output: bytes | None, read_error: str | None, exif_present: int, forensics: str | None
+) -> StoredInputs:
+    manifest = None
+    if output is not None:
+        # Pruned as the readers prune it, so that a new interpretation sees all it reads
+        try:
+            manifest = parse_manifest(zlib.decompress(output))
+        except (ValueError, zlib.error):
+            read_error = "The image has C2PA metadata, but it cannot be decoded"
+    return StoredInputs(
+        manifest=manifest,
+        read_error=read_error,
+        exif_present=bool(exif_present),
+        forensic_report=ForensicReport(**json.loads(forensics)) if forensics is not None else None,
+    )
+
+
+class AnalysisStore:
+    """
+    Inputs and verdicts of analysed images keyed by content hash, so that verdicts can be
+    refreshed under new generator rules or scoring weights without reading images again.
+
+    Each analysis keeps the whole output of the C2PA reader, compressed and only pruned to
+    what `C2PAMetadata.from_manifest` reads when re-scored, its EXIF fields and forensic
+    scores, the reader and its version, and the rules and scoring versions its verdict was
+    computed with. Several batch worker processes can record into the same SQLite database.
+    """
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # WAL lets re-scoring read while batch workers record
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def record(
+        self,
+        sha256: str,
+        path: str,
+        mime_type: str | None,
+        reading: C2PAReading,
+        tool: str | None,
+        exif_record: ExifRecord | None,
+        forensic_report: ForensicReport | None = None,
+    ) -> Verdict:
+        """
+        Store the inputs of an analysed image with their verdict under the current rules
+        and scoring weights, replacing any earlier analysis of the same contents.
+
+        Args:
+            sha256: SHA-256 of the image contents
+            path: Path the image was analysed at
+            mime_type: MIME type of the image
+            reading: What the C2PA reader read, unpruned, see `c2pa_read` with `paths=True`
+            tool: Name and version of the reader that answered, see `c2pa_read`
+            exif_record: EXIF fields of the image, None without EXIF
+            forensic_report: Outcome of the forensic stage, None when it did not run
+
+        Returns:
+            The verdict stored
+        """
+        rules, scorer = get_generator_rules(), get_scorer()
+        manifest, read_error = reading
+        inputs = StoredInputs(manifest, read_error, exif_record is not None, forensic_report)
+        (verdict,) = score_inputs([inputs], rules, scorer)
+
+        values = (
+            sha256,
+            path,
+            mime_type,
+            zlib.compress(json.dumps(manifest, separators=(",", ":")).encode())
+            if manifest is not None
+            else None,
+            read_error,
+            json.dumps(exif_record.to_dict()) if exif_record is not None else None,
+            json.dumps(asdict(forensic_report)) if forensic_report is not None else None,
+            tool,
+            rules.version,
+            scorer.version,
+            verdict.c2pa_generated,
+            verdict.c2pa_generator,
+            verdict.c2pa_rule,
+            verdict.c2pa_error,
+            verdict.probability,
+            time.time(),
+        )
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO analyses VALUES ({', '.join('?' * len(values))})",
+                values,
+            )
+            self._db.commit()
+        return verdict
+
+    def rescore(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        rules: GeneratorRules | None = None,
+        scorer: Scorer | None = None,
+        everything: bool = False,
+        tools: Collection[str] | None = None,
+    ) -> RescoreSummary:
+        """
+        Recompute the verdicts computed under other generator rules or scoring weights than
+        the current ones, `batch_size` analyses at a time, from their stored inputs.
+
+        Analyses read by another C2PA reader or version than the configured ones are
+        re-scored too, but only re-analysing their images refreshes what was read; they are
+        counted apart.
+
+        Args:
+            batch_size: Analyses interpreted, scored and written per transaction
+            rules: Generator rules to score with, the configured ones by default
+            scorer: Scorer to score with, the configured one by default
+            everything: Re-score every analysis, e.g. after a change of the manifest
+                interpretation that no version tracks
+            tools: Readers whose readings are up to date, the configured ones by default
+
+        Returns:
+            RescoreSummary of the pass
+        """
+        rules = rules or get_generator_rules()
+        scorer = scorer or get_scorer()
+        tools = set(tools if tools is not None else current_tools())
+        current = (rules.version, scorer.version)
+        started = time.perf_counter()
+
+        with self._lock:
+            # Both read from the indexes alone
+            groups = self._db.execute(
+                "SELECT rules_version, scoring_version, COUNT(*) FROM analyses "
+                "GROUP BY rules_version, scoring_version"
+            ).fetchall()
+            tool_groups = self._db.execute(
+                "SELECT tool_version, COUNT(*) FROM analyses GROUP BY tool_version"
+            ).fetchall()
+        # Analyses no reader could read have nothing to refresh
+        outdated_tool = sum(
+            count for tool, count in tool_groups if tool is not None and tool not in tools
+        )
+
+        stale = [
+            (rules_version, scoring_version)
+            for rules_version, scoring_version, _ in groups
+            if everything or (rules_version, scoring_version) != current
+        ]
+        rescored = changed = 0
+        for rules_version, scoring_version in stale:
+            last_rowid = 0
+            while True:
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT rowid, output, read_error, exif IS NOT NULL, forensics, "
+                        "c2pa_generated, probability FROM analyses "
+                        "WHERE rules_version = ? AND scoring_version = ? AND rowid > ? "
+                        "ORDER BY rowid LIMIT ?",
+                        (rules_version, scoring_version, last_rowid, batch_size),
+                    ).fetchall()
+                if not rows:
+                    break
+                last_rowid = rows[-1][0]
+
+                verdicts = score_inputs([_load_inputs(*row[1:5]) for row in rows], rules, scorer)
+                updates = [
+                    (
+                        verdict.c2pa_generated,
+                        verdict.c2pa_generator,
+                        verdict.c2pa_rule,
+                        verdict.c2pa_error,
+                        verdict.probability,
+                        *current,
+                        row[0],
+                    )
+                    for row, verdict in zip(rows, verdicts, strict=True)
+                ]
+                with self._lock:
+                    self._db.executemany(
+                        "UPDATE analyses SET c2pa_generated = ?, c2pa_generator = ?, "
+                        "c2pa_rule = ?, c2pa_error = ?, probability = ?, rules_version = ?, "
+                        "scoring_version = ? WHERE rowid = ?",
+                        updates,
+                    )
+                    self._db.commit()
+
+                rescored += len(rows)
+                changed += sum(
+                    (bool(row[5]), row[6]) != (verdict.c2pa_generated, verdict.probability)
+                    for row, verdict in zip(rows, verdicts, strict=True)
+                )
+
+        return RescoreSummary(
+            rescored=rescored,
+            changed=changed,
+            up_to_date=sum(count for *_, count in groups) - rescored,
+            outdated_tool=outdated_tool,
+            elapsed_s=time.perf_counter() - started,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def current_tools() -> list[str]:
+    """Returns the readers of the configured C2PA backends, with the prescan."""
+    return [*get_c2pa_backends().tools, PRESCAN_TOOL]
+
+
+@cache
+def get_analysis_store(db_path: str) -> AnalysisStore:
+    """Returns the store at `db_path`, opened once per process."""
+    return AnalysisStore(db_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m authenticity.store",
+        description="Re-score the analyses of a store whose rules or scoring weights changed.",
+    )
+    parser.add_argument(
+        "store",
+        type=Path,
+        nargs="?",
+        default=os.environ.get("GPTZERO_V_STORE_PATH"),
+        help="SQLite analysis store (default: GPTZERO_V_STORE_PATH)",
+    )
+    parser.add_argument(
+        "-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="analyses per transaction"
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="re-score every analysis, even the up-to-date ones"
+    )
+    args = parser.parse_args(argv)
+    if args.store is None:
+        parser.error("no store given, and GPTZERO_V_STORE_PATH is unset")
+    if not Path(args.store).is_file():
+        parser.error(f"no store at {args.store}")
+
+    store = AnalysisStore(args.store)
+    summary = store.rescore(batch_size=args.batch_size, everything=args.all)
+    store.close()
+
+    sys.stderr.write(
+        f"re-scored {summary.rescored} analyses ({summary.changed} changed, "
+        f"{summary.up_to_date} up to date) in {summary.elapsed_s:.2f}s: "
+        f"{summary.throughput:.1f} analyses/sec\n"
+    )
+    if summary.outdated_tool:
+        sys.stderr.write(
+            f"{summary.outdated_tool} analyses were read by another C2PA reader than "
+            f"{', '.join(current_tools())}: re-run the batch over their images to refresh them\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
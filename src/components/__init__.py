@@ -1,5 +1,6 @@
 from .card import Card
+from .preview import Preview
 from .probability import Probability
 
 
-__all__ = ["Card", "Probability"]
+__all__ = ["Card", "Preview", "Probability"]
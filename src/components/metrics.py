@@ -0,0 +1,61 @@
+import streamlit as st
+
+from authenticity import instrumentation
+from authenticity.c2pa_pool import PoolStats
+from authenticity.cache import CacheStats
+
+
+def MetricsSidebar(cache_stats: CacheStats, pool_stats: PoolStats) -> None:
+    """
+    Display the developer metrics in the sidebar.
+
+    Args:
+        cache_stats: Counters of the result cache
+        pool_stats: Counters of the c2patool worker pool
+    """
+    stages, counters = instrumentation.snapshot()
+
+    with st.sidebar:
+        st.subheader("Developer metrics")
+
+        st.markdown("**Stages**")
+        st.dataframe(
+            [
+                {
+                    "stage": name,
+                    "count": stage.count,
+                    "mean (ms)": stage.total / stage.count * 1000,
+                    "max (ms)": stage.maximum * 1000,
+                }
+                for name, stage in sorted(stages.items())
+            ],
+            hide_index=True,
+        )
+
+        st.markdown("**Counters**")
+        st.dataframe(
+            [{"counter": name, "value": value} for name, value in sorted(counters.items())],
+            hide_index=True,
+        )
+
+        st.markdown("**Result cache**")
+        st.write(
+            f"hit rate {cache_stats.hit_rate:.0%}, {cache_stats.hits} hits "
+            f"({cache_stats.disk_hits} from disk), {cache_stats.misses} misses, "
+            f"{cache_stats.evictions} evictions"
+        )
+
+        st.markdown("**c2patool pool**")
+        st.write(
+            f"utilisation {pool_stats.utilisation:.0%}, {pool_stats.active} active, "
+            f"{pool_stats.queued} queued across {pool_stats.sessions} sessions, "
+            f"{pool_stats.rejected} rejected, {pool_stats.timeouts} timeouts, "
+            f"{pool_stats.cancelled} cancelled"
+        )
+
+        st.download_button(
+            "Download Prometheus metrics",
+            instrumentation.render_prometheus(),
+            file_name="gptzero_v.prom",
+            mime="text/plain",
+        )
@@ -0,0 +1,52 @@
+import io
+from typing import BinaryIO
+
+import streamlit as st
+from PIL import Image
+
+
+# Image modes PNG can store as they are
+_PNG_MODES = {"1", "L", "LA", "P", "RGB", "RGBA"}
+
+
+def make_preview(file: BinaryIO, max_side: int) -> bytes | None:
+    """
+    Decode an image into a thumbnail no larger than `max_side` pixels.
+    JPEGs are decoded straight at a reduced scale, so the full-resolution bitmap is never held.
+
+    Args:
+        file: Seekable binary file with the image
+        max_side: Maximum width and height of the thumbnail
+
+    Returns:
+        Thumbnail encoded as PNG, or None when the image cannot be decoded
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image.draft("RGB", (max_side, max_side))
+            image.thumbnail((max_side, max_side))
+            # e.g. CMYK JPEGs, which PNG cannot store
+            thumbnail = image if image.mode in _PNG_MODES else image.convert("RGB")
+            stream = io.BytesIO()
+            thumbnail.save(stream, "PNG")
+            return stream.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    finally:
+        file.seek(0)
+
+
+def Preview(file: BinaryIO, max_side: int = 768) -> None:
+    """
+    Display a downscaled preview of an uploaded image.
+
+    Args:
+        file: Seekable binary file with the image
+        max_side: Maximum width and height of the preview
+    """
+    preview = make_preview(file, max_side)
+    if preview is None:
+        st.caption("Preview unavailable for this file.")
+    else:
+        st.image(preview, caption="", use_container_width=True)
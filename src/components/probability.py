@@ -1,10 +1,18 @@
-import plotly.graph_objects as go
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
 
-def Probability(probability: int) -> tuple[str, go.Figure]:
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+
+@lru_cache(maxsize=128)
+def Probability(probability: int) -> tuple[str, "go.Figure"]:
     """
     Displays a circular widget filled based on the probability value.
     The color and text change dynamically based on the authenticity probability range.
+    Figures are memoized per probability, as `compute_probability` only returns a few
+    values; callers must not mutate the returned figure.
 
     Args:
         probability: Integer percentage (0-100) representing non-authenticity probability
@@ -12,6 +20,9 @@ def Probability(probability: int) -> tuple[str, go.Figure]:
     Returns:
         Tuple containing (HTML message, Plotly figure)
     """
+    # Plotly is only needed once an image has been analysed
+    import plotly.graph_objects as go
+
     # Define color based on probability range
     if probability < 30:
         color = "#4CAF50"  # Green for high authenticity
@@ -1,17 +1,124 @@
+import csv
+import io
+import json
+import os
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-from authenticity.authenticity import compute_probability
-from authenticity.c2pa_handler import c2pa_check_from_binary
-from authenticity.exif_handler import check_exif
-from authenticity.metadata_utils import get_c2pa_binary_path
+from authenticity import instrumentation
+from authenticity.media import check_size
+from authenticity.metadata_utils import get_c2pa_backend_names
 from components.card import Card
+from components.preview import Preview
 from components.probability import Probability
 
 
+# The analysis modules are imported on first use, to keep the cold start short
+if TYPE_CHECKING:
+    from streamlit.runtime.uploaded_file_manager import UploadedFile
+
+    from authenticity.c2pa_metadata import C2PAMetadata
+    from authenticity.c2pa_pool import C2PAToolPool
+    from authenticity.cache import ResultCache
+    from authenticity.exif_reader import ExifRecord
+    from authenticity.forensics import ForensicReport
+    from authenticity.pipeline import AnalysisResult
+    from authenticity.similarity import NearDuplicate, ProvenanceIndex
+
+
 st.set_page_config(layout="wide", page_title="GPTZero-V")
 
-# Get the binary path
-binary_path = get_c2pa_binary_path()
+# Images of a multi-file upload analysed at once, and columns of the results gallery
+UPLOAD_CONCURRENCY = int(os.environ.get("GPTZERO_V_UPLOAD_CONCURRENCY", "4"))
+GALLERY_COLUMNS = 4
+
+# Largest side, in pixels, of the image previews
+PREVIEW_SIZE = 768
+THUMBNAIL_SIZE = 256
+
+
+@st.cache_resource
+def get_result_cache() -> "ResultCache":
+    """Process-wide result cache shared by all sessions."""
+    from authenticity.cache import ResultCache
+
+    return ResultCache.from_env()
+
+
+@st.cache_resource
+def get_c2pa_pool() -> "C2PAToolPool":
+    """Process-wide pool of c2patool workers shared by all sessions."""
+    from authenticity.c2pa_pool import C2PAToolPool
+
+    return C2PAToolPool.from_env()
+
+
+@st.cache_resource
+def get_provenance_index() -> "ProvenanceIndex":
+    """Process-wide index of the analysed images, matching copies without metadata."""
+    from authenticity.similarity import ProvenanceIndex
+
+    return ProvenanceIndex.from_env()
+
+
+def get_session_id() -> str | None:
+    """Returns the id of the browser session running the script, None outside Streamlit."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def get_stage_checks() -> dict[str, Any]:
+    """
+    C2PA and EXIF stages of the pipeline, served from the result cache and the c2patool
+    pool on behalf of the current session, the provenance index matching copies of
+    earlier uploads, and the forensic stage when it is turned on.
+    """
+    from authenticity.cache import cached_c2pa_check, cached_check_exif
+    from authenticity.pipeline import get_forensic_check
+
+    result_cache = get_result_cache()
+    c2pa_pool = get_c2pa_pool()
+    # Read here, as the stages run on pipeline threads outside the script context
+    session_id = get_session_id()
+
+    return {
+        "c2pa_check": lambda data, mime: cached_c2pa_check(
+            result_cache,
+            data,
+            mime,
+            check=lambda data, mime: c2pa_pool.check(data, mime, session_id),
+        ),
+        "exif_check": lambda data: cached_check_exif(result_cache, data),
+        "provenance_index": get_provenance_index(),
+        "forensic_check": get_forensic_check(),
+    }
+
+
+def warm_up() -> None:
+    """
+    Load c2patool, the C2PA readers, the generator rules, the scorer and the probability
+    figures ahead of the first upload.
+    """
+    from authenticity.c2pa_backends import get_c2pa_backends
+    from authenticity.c2pa_handler import warm_up_c2patool
+    from authenticity.scoring import get_scorer
+
+    warm_up_c2patool()
+    get_c2pa_backends()
+    for probability in get_scorer().levels:
+        Probability(probability)
+
+
+@st.cache_resource
+def start_warm_up() -> threading.Thread:
+    """Warm the analysis up in the background, once per process."""
+    thread = threading.Thread(target=warm_up, name="gptzero-v-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
 def Homepage():
@@ -70,10 +177,266 @@ def Homepage():
         """)
 
 
+def AuthenticitySummary(probability: int | None) -> None:
+    """Display the probability widget and card, or an unknown status when C2PA failed."""
+    if probability is None:
+        Card(
+            title="Image Authenticity",
+            content=f"<p><strong>Unknown</strong> authenticity status due to metadata parsing errors.</p>",
+        )
+    else:
+        # Show Authenticity Probability Circular Widget
+        with instrumentation.span("probability_figure"):
+            message, fig = Probability(probability)
+
+        # Create nested columns to center the chart
+        _, center_col, _ = st.columns([1, 1, 1])
+        with center_col:
+            st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+
+        Card(title="Image Authenticity", content=message)
+
+
+def C2PACard(c2pa_metadata: "C2PAMetadata | None", c2pa_error: str | None) -> None:
+    # If C2PA is present, show its card
+    if c2pa_metadata and not c2pa_error:
+        # Create HTML content for the card
+        c2pa_content = "<div class='card-title'>Claim</div><ul>"
+
+        # Add generators
+        c2pa_content += f"<li><strong>ID:</strong> {c2pa_metadata.instance_id}</li>"
+        c2pa_content += f"<li><strong>generated by:</strong> {c2pa_metadata.generator_name}</li>"
+        c2pa_content += f"<li><strong>title:</strong> {c2pa_metadata.title}</li>"
+        c2pa_content += "</ul>"
+
+        c2pa_content += "<div class='card-title'>Process</div>"
+
+        # Add source type if available
+        if c2pa_metadata.digital_source_type:
+            c2pa_content += c2pa_metadata.digital_source_type
+
+        if c2pa_metadata.software_agents:
+            c2pa_content += ":<ul>"
+            # Add software agents
+            for agent in c2pa_metadata.software_agents:
+                formatted_action = agent.get_formatted_action()
+                c2pa_content += f"<li><strong>{formatted_action}</strong> {agent.name}</li>"
+            c2pa_content += "</ul>"
+        else:
+            c2pa_content += "."
+
+        # Add the earlier manifests the asset was derived from, oldest first
+        if len(c2pa_metadata.provenance) > 1:
+            c2pa_content += "<div class='card-title'>History</div><ol>"
+            for step in c2pa_metadata.provenance:
+                actions = ", ".join(
+                    f"{agent.action} by {agent.name}" for agent in step.software_agents
+                )
+                c2pa_content += (
+                    f"<li><strong>{step.generator_name}</strong>, signed by {step.issuer}"
+                )
+                c2pa_content += f": {actions}</li>" if actions else "</li>"
+            c2pa_content += "</ol>"
+
+        # Add credential info
+        c2pa_content += "<div class='card-title'>About this Content Credential</div><ul>"
+        c2pa_content += f"<li><strong>issued by:</strong> {c2pa_metadata.issuer}</li>"
+        c2pa_content += "</ul>"
+
+        c2pa_content += "For more information, visit C2PA <a href='https://contentcredentials.org/verify'>Verify</a>."
+
+        # Use the card function to display the information
+        Card("C2PA Metadata", c2pa_content)
+
+    elif c2pa_error:
+        Card("C2PA Metadata", f"<p>{c2pa_error}</p>")
+    else:
+        Card("C2PA Metadata", f"<p>No C2PA metadata found.</p>")
+
+
+def NearDuplicateCard(near_duplicate: "NearDuplicate") -> None:
+    # The image has no metadata of its own, show the provenance of its close copy instead
+    Card(
+        "Near Duplicate",
+        "<p>This image has no metadata, but closely matches an image analysed before "
+        f"({near_duplicate.distance} bits apart), whose provenance it is scored on.</p>",
+    )
+    if near_duplicate.c2pa_metadata is not None:
+        C2PACard(near_duplicate.c2pa_metadata, None)
+
+
+def ForensicCard(forensic_report: "ForensicReport | None") -> None:
+    if forensic_report is None:
+        Card("Pixel Forensics", "<p>The image could not be decoded for pixel analysis.</p>")
+        return
+
+    findings = [
+        ("EXIF thumbnail mismatch", forensic_report.thumbnail_mismatch, "no EXIF thumbnail"),
+        ("error-level inconsistency", forensic_report.ela_inconsistency, "not a JPEG"),
+    ]
+    content = "<ul>"
+    for label, score, missing in findings:
+        value = missing if score is None else f"{score:.1%}"
+        content += f"<li><strong>{label}:</strong> {value}</li>"
+    content += "</ul>"
+    if forensic_report.coverage < 1:
+        content += (
+            f"<p>Out of time after {forensic_report.coverage:.0%} of the image "
+            f"({forensic_report.elapsed_ms:.0f} ms).</p>"
+        )
+    Card("Pixel Forensics", content)
+
+
+def ExifCard(exif_present: bool, exif_data: "ExifRecord | None") -> None:
+    # If EXIF is present, show an EXIF card with a few interesting fields
+    if exif_present:
+        # Gather some typical fields
+        exif_fields_of_interest = [
+            ("version", getattr(exif_data, "exif_version", None)),
+            ("device make", getattr(exif_data, "make", None)),
+            ("device model", getattr(exif_data, "model", None)),
+            ("OS", getattr(exif_data, "software", None)),
+            (
+                "taken at",
+                getattr(exif_data, "datetime_original", None),
+            ),
+            ("GPS latitude", getattr(exif_data, "gps_latitude", None)),
+            ("GPS longitude", getattr(exif_data, "gps_longitude", None)),
+        ]
+
+        exif_content = "<ul>"
+        for label, value in exif_fields_of_interest:
+            if value is not None:
+                exif_content += f"<li><strong>{label}:</strong> {value}</li>"
+        exif_content += "</ul>"
+
+        Card("EXIF Metadata", exif_content)
+    else:
+        Card("EXIF Metadata", "<p>No EXIF metadata found.</p>")
+
+
+def analysis_row(file_name: str, analysis: "AnalysisResult") -> dict[str, Any]:
+    """Flatten the analysis of an uploaded image into a row of the results table."""
+    c2pa_metadata = analysis.c2pa_metadata
+    return {
+        "file": file_name,
+        "probability": analysis.probability,
+        "c2pa_generated": analysis.c2pa_generated,
+        "c2pa_generator": c2pa_metadata.generator_name if c2pa_metadata else None,
+        "c2pa_issuer": c2pa_metadata.issuer if c2pa_metadata else None,
+        "c2pa_error": analysis.c2pa_error,
+        "exif_present": analysis.exif_present,
+        "near_duplicate": analysis.near_duplicate.sha256 if analysis.near_duplicate else None,
+        "thumbnail_mismatch": getattr(analysis.forensic_report, "thumbnail_mismatch", None),
+        "ela_inconsistency": getattr(analysis.forensic_report, "ela_inconsistency", None),
+        "device": " ".join(
+            value
+            for value in (
+                getattr(analysis.exif_record, "make", None),
+                getattr(analysis.exif_record, "model", None),
+            )
+            if value
+        )
+        or None,
+    }
+
+
+def rows_to_csv(rows: list[dict[str, Any]]) -> str:
+    stream = io.StringIO()
+    # Rows of rejected files only carry a few of the columns
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    writer = csv.DictWriter(stream, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+    return stream.getvalue()
+
+
+def AuthenticityGallery(uploaded_files: list["UploadedFile"]) -> None:
+    """
+    Analyse several uploaded images in parallel, filling a results table and a gallery
+    of cards as each image is done, then offer the results for download.
+    """
+    from authenticity.pipeline import iter_analyses
+
+    progress = st.progress(0.0, text=f"Analysing {len(uploaded_files)} images...")
+    table_slot = st.empty()
+
+    # One placeholder per image, in upload order
+    cells = []
+    for start in range(0, len(uploaded_files), GALLERY_COLUMNS):
+        columns = st.columns(GALLERY_COLUMNS)
+        cells.extend(column.empty() for column in columns[: len(uploaded_files) - start])
+
+    for uploaded_file, cell in zip(uploaded_files, cells, strict=True):
+        with cell.container():
+            Card(uploaded_file.name, "<p>Waiting for analysis...</p>")
+
+    rows: list[dict[str, Any] | None] = [None] * len(uploaded_files)
+
+    # Oversized files are turned away before any of their bytes are looked at
+    accepted = []
+    for index, uploaded_file in enumerate(uploaded_files):
+        size_error = check_size(uploaded_file.size)
+        if size_error is None:
+            accepted.append(index)
+            continue
+        rows[index] = {"file": uploaded_file.name, "c2pa_error": size_error}
+        with cells[index].container():
+            Card(uploaded_file.name, f"<p>{size_error}</p>")
+
+    # Zero-copy views of the upload buffers
+    images = ((uploaded_files[index].getbuffer(), uploaded_files[index].type) for index in accepted)
+
+    with instrumentation.span("gallery_analysis"):
+        for done, (position, analysis) in enumerate(
+            iter_analyses(images, max_in_flight=UPLOAD_CONCURRENCY, **get_stage_checks()),
+            start=len(uploaded_files) - len(accepted) + 1,
+        ):
+            index = accepted[position]
+            uploaded_file = uploaded_files[index]
+            rows[index] = analysis_row(uploaded_file.name, analysis)
+
+            with cells[index].container():
+                Preview(uploaded_file, max_side=THUMBNAIL_SIZE)
+                if analysis.probability is None:
+                    content = f"<p><strong>Unknown</strong> authenticity status: {analysis.c2pa_error}</p>"
+                else:
+                    content, _ = Probability(analysis.probability)
+                if analysis.near_duplicate is not None:
+                    content += "<p>Scored on a close copy analysed before.</p>"
+                Card(uploaded_file.name, content)
+
+            progress.progress(
+                done / len(uploaded_files), text=f"Processed {done} of {len(uploaded_files)} images"
+            )
+            table_slot.dataframe([row for row in rows if row is not None], hide_index=True)
+
+    progress.progress(1.0, text=f"Processed {len(uploaded_files)} images")
+    table_slot.dataframe(rows, hide_index=True)
+    instrumentation.write_prometheus()
+
+    export_columns = st.columns(2)
+    with export_columns[0]:
+        st.download_button(
+            "Download results as CSV",
+            rows_to_csv(rows),
+            file_name="gptzero-v-results.csv",
+            mime="text/csv",
+        )
+    with export_columns[1]:
+        st.download_button(
+            "Download results as JSON",
+            json.dumps(rows, indent=2),
+            file_name="gptzero-v-results.json",
+            mime="application/json",
+        )
+
+
 def Authenticity():
-    if binary_path is None:
+    if not get_c2pa_backend_names():
         st.error(
-            "c2patool binary is missing. Please ensure the tool is available in the resources directory."
+            "No C2PA reader is available. Please ensure c2patool is available in the resources "
+            "directory, or install the c2pa-python bindings."
         )
     else:
         # Create two columns for side-by-side layout
@@ -83,127 +446,80 @@ def Authenticity():
         with col1:
             subcc = st.columns([1, 4, 1])
             with subcc[1]:
-                uploaded_file = st.file_uploader(
-                    "Choose an image for authenticity analysis",
+                uploaded_files = st.file_uploader(
+                    "Choose one or more images for authenticity analysis",
                     type=["jpg", "jpeg", "png"],
-                    accept_multiple_files=False,
+                    accept_multiple_files=True,
                 )
 
+                # A rerun supersedes the checks of the previous run still in the pool
+                session_id = get_session_id()
+                if uploaded_files and session_id is not None:
+                    get_c2pa_pool().cancel_session(session_id)
+
+                # A single image gets the detailed view, several images the gallery below
+                uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
+
+                size_error = check_size(uploaded_file.size) if uploaded_file else None
+                if size_error:
+                    st.error(size_error)
+                    uploaded_file = None
+
                 if uploaded_file is not None:
-                    file_bytes = uploaded_file.read()
+                    # Zero-copy view of the upload, shared by every stage
+                    file_bytes = uploaded_file.getbuffer()
                     # Get the MIME type of the uploaded file
                     mime_type = uploaded_file.type
-                    st.image(file_bytes, caption="", use_container_width=True)
+                    Preview(uploaded_file, max_side=PREVIEW_SIZE)
 
         # Second column for analysis cards
         with col2:
             if uploaded_file is not None:
-                # 1) Check C2PA with the detected MIME type
-                c2pa_generated, c2pa_metadata, c2pa_error = c2pa_check_from_binary(
-                    file_bytes, mime_type
-                )
-
-                # 2) Check EXIF with the detected MIME type
-                exif_present, exif_data = check_exif(file_bytes)
-
-                if c2pa_error:
-                    Card(
-                        title="Image Authenticity",
-                        content=f"<p><strong>Unknown</strong> authenticity status due to metadata parsing errors.</p>",
-                    )
-                else:
-                    # 3) Compute authenticity probability
-                    authenticity_probability = compute_probability(c2pa_generated, exif_present)
-
-                    # Show Authenticity Probability Circular Widget
-                    message, fig = Probability(authenticity_probability)
-
-                    # Create nested columns to center the chart
-                    _, center_col, _ = st.columns([1, 1, 1])
-                    with center_col:
-                        st.plotly_chart(
-                            fig, use_container_width=True, config={"displayModeBar": False}
-                        )
-
-                    Card(title="Image Authenticity", content=message)
+                from authenticity.pipeline import iter_analysis
 
+                # Placeholders filled in as soon as each stage is done
+                summary_slot = st.empty()
                 subcolumns = st.columns(2)
-
-                with subcolumns[0]:
-                    # If C2PA is present, show its card
-                    if c2pa_metadata and not c2pa_error:
-                        # Create HTML content for the card
-                        c2pa_content = "<div class='card-title'>Claim</div><ul>"
-
-                        # Add generators
-                        c2pa_content += f"<li><strong>ID:</strong> {c2pa_metadata.instance_id}</li>"
-                        c2pa_content += f"<li><strong>generated by:</strong> {c2pa_metadata.generator_name}</li>"
-                        c2pa_content += f"<li><strong>title:</strong> {c2pa_metadata.title}</li>"
-                        c2pa_content += "</ul>"
-
-                        c2pa_content += "<div class='card-title'>Process</div>"
-
-                        # Add source type if available
-                        if c2pa_metadata.digital_source_type:
-                            c2pa_content += c2pa_metadata.digital_source_type
-
-                        if c2pa_metadata.software_agents:
-                            c2pa_content += ":<ul>"
-                            # Add software agents
-                            for agent in c2pa_metadata.software_agents:
-                                formatted_action = agent.get_formatted_action()
-                                c2pa_content += (
-                                    f"<li><strong>{formatted_action}</strong> {agent.name}</li>"
-                                )
-                            c2pa_content += "</ul>"
-                        else:
-                            c2pa_content += "."
-
-                        # Add credential info
-                        c2pa_content += (
-                            "<div class='card-title'>About this Content Credential</div><ul>"
-                        )
-                        c2pa_content += (
-                            f"<li><strong>issued by:</strong> {c2pa_metadata.issuer}</li>"
-                        )
-                        c2pa_content += "</ul>"
-
-                        c2pa_content += "For more information, visit C2PA <a href='https://contentcredentials.org/verify'>Verify</a>."
-
-                        # Use the card function to display the information
-                        Card("C2PA Metadata", c2pa_content)
-
-                    elif c2pa_error:
-                        Card("C2PA Metadata", f"<p>{c2pa_error}</p>")
-                    else:
-                        Card("C2PA Metadata", f"<p>No C2PA metadata found.</p>")
-
-                with subcolumns[1]:
-                    # If EXIF is present, show an EXIF card with a few interesting fields
-                    if exif_present:
-                        # Gather some typical fields
-                        exif_fields_of_interest = [
-                            ("version", getattr(exif_data, "exif_version", None)),
-                            ("device make", getattr(exif_data, "make", None)),
-                            ("device model", getattr(exif_data, "model", None)),
-                            ("OS", getattr(exif_data, "software", None)),
-                            (
-                                "taken at",
-                                getattr(exif_data, "datetime_original", None),
-                            ),
-                            ("GPS latitude", getattr(exif_data, "gps_latitude", None)),
-                            ("GPS longitude", getattr(exif_data, "gps_longitude", None)),
-                        ]
-
-                        exif_content = "<ul>"
-                        for label, value in exif_fields_of_interest:
-                            if value is not None:
-                                exif_content += f"<li><strong>{label}:</strong> {value}</li>"
-                        exif_content += "</ul>"
-
-                        Card("EXIF Metadata", exif_content)
-                    else:
-                        Card("EXIF Metadata", "<p>No EXIF metadata found.</p>")
+                c2pa_slot = subcolumns[0].empty()
+                exif_slot = subcolumns[1].empty()
+
+                with summary_slot.container():
+                    Card("Image Authenticity", "<p>Analysing the image metadata...</p>")
+                with c2pa_slot.container():
+                    Card("C2PA Metadata", "<p>Checking Content Credentials...</p>")
+                with exif_slot.container():
+                    Card("EXIF Metadata", "<p>Reading EXIF metadata...</p>")
+
+                stage_checks = get_stage_checks()
+                if stage_checks["forensic_check"] is not None:
+                    forensic_slot = st.empty()
+                    with forensic_slot.container():
+                        Card("Pixel Forensics", "<p>Analysing the pixels...</p>")
+
+                with instrumentation.span("analysis"):
+                    # C2PA and EXIF run concurrently, then the probability is computed
+                    for result in iter_analysis(file_bytes, mime_type, **stage_checks):
+                        if result.stage == "c2pa":
+                            _, c2pa_metadata, c2pa_error = result.value
+                            with c2pa_slot.container():
+                                C2PACard(c2pa_metadata, c2pa_error)
+                        elif result.stage == "exif":
+                            with exif_slot.container():
+                                ExifCard(*result.value)
+                        elif result.stage == "forensics":
+                            with forensic_slot.container():
+                                ForensicCard(result.value)
+                        elif result.stage == "near_duplicate":
+                            with c2pa_slot.container():
+                                NearDuplicateCard(result.value)
+                        elif result.stage == "probability":
+                            with summary_slot.container():
+                                AuthenticitySummary(result.value)
+
+                instrumentation.write_prometheus()
+
+        if len(uploaded_files) > 1:
+            AuthenticityGallery(uploaded_files)
 
 
 def main() -> None:
@@ -249,6 +565,14 @@ def main() -> None:
     with tab2:
         Authenticity()
 
+    if instrumentation.is_enabled():
+        from components.metrics import MetricsSidebar
+
+        MetricsSidebar(get_result_cache().stats, get_c2pa_pool().stats())
+
+    # Started once the page is on screen, so that it does not slow the first render down
+    start_warm_up()
+
 
 if __name__ == "__main__":
     main()
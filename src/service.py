@@ -0,0 +1,231 @@
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from functools import cache
+from typing import Any
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from authenticity import instrumentation
+from authenticity.batch import build_record
+from authenticity.c2pa_backends import c2pa_check_async, get_c2pa_backends
+from authenticity.c2pa_handler import C2PAResult, warm_up_c2patool
+from authenticity.cache import ResultCache, cached_c2pa_check_async, cached_check_exif
+from authenticity.jumbf import sniff_mime_type
+from authenticity.media import MAX_UPLOAD_BYTES, ImageBuffer, check_size
+from authenticity.pipeline import analyze_image_async, get_forensic_check
+from authenticity.similarity import ProvenanceIndex
+
+
+C2PA_TIMEOUT = float(os.environ.get("GPTZERO_V_C2PA_TIMEOUT", "30"))
+C2PA_MEMORY_LIMIT = int(float(os.environ.get("GPTZERO_V_C2PA_MEMORY_MB", "2048")) * 2**20) or None
+
+
+class Admission:
+    """
+    Concurrency limit with backpressure: at most `max_concurrency` analyses run at once
+    and at most `max_queue` more wait for a slot; requests beyond that are turned away.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int) -> None:
+        self.capacity = max_concurrency + max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self.slots = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def full(self) -> bool:
+        return self.in_flight >= self.capacity
+
+    def try_admit(self, count: int) -> bool:
+        """Reserve room for `count` analyses, all or nothing."""
+        if self.in_flight + count > self.capacity:
+            self.rejected += 1
+            return False
+        self.in_flight += count
+        return True
+
+    def release(self, count: int) -> None:
+        self.in_flight -= count
+
+
+admission = Admission(
+    max_concurrency=int(os.environ.get("GPTZERO_V_SERVICE_CONCURRENCY", "32")),
+    max_queue=int(os.environ.get("GPTZERO_V_SERVICE_QUEUE", "128")),
+)
+
+
+@cache
+def get_result_cache() -> ResultCache:
+    """Returns the result cache of the service, configured as the app's."""
+    return ResultCache.from_env()
+
+
+@cache
+def get_provenance_index() -> ProvenanceIndex:
+    """Returns the index of the analysed images, matching copies without metadata."""
+    return ProvenanceIndex.from_env()
+
+
+async def check_c2pa(file_bytes: ImageBuffer, mime_type: str) -> C2PAResult:
+    """C2PA stage of the service, reading through the configured backends behind the cache."""
+    return await cached_c2pa_check_async(
+        get_result_cache(),
+        file_bytes,
+        mime_type,
+        check=lambda data, mime: c2pa_check_async(data, mime, C2PA_TIMEOUT, C2PA_MEMORY_LIMIT),
+    )
+
+
+async def analyze_upload(filename: str, file_bytes: bytes, mime_type: str) -> dict[str, Any]:
+    """Run the stages of one upload concurrently and score it, as the app does."""
+    async with admission.slots:
+        started = time.perf_counter()
+        mime_type = sniff_mime_type(file_bytes) or mime_type
+
+        analysis = await analyze_image_async(
+            file_bytes,
+            mime_type,
+            c2pa_check=check_c2pa,
+            exif_check=lambda data: cached_check_exif(get_result_cache(), data),
+            provenance_index=get_provenance_index(),
+            forensic_check=get_forensic_check(),
+        )
+        return asdict(build_record(filename, mime_type, analysis, started))
+
+
+def too_large(error: str) -> JSONResponse:
+    return JSONResponse({"error": error}, status_code=413)
+
+
+async def read_body(request: Request) -> bytes | None:
+    """Returns the raw request body, or None as soon as it grows over the upload limit."""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def busy() -> JSONResponse:
+    return JSONResponse(
+        {"error": "Too many analyses in flight, please retry later"},
+        status_code=429,
+        headers={"Retry-After": "1"},
+    )
+
+
+async def analyze(request: Request) -> JSONResponse:
+    """
+    Analyse either a raw image body, returning a single record,
+    or a multipart upload of one or more `file` fields, returning a list of records.
+    """
+    # Shed load before buffering the request body
+    if admission.full:
+        admission.rejected += 1
+        return busy()
+
+    content_type = request.headers.get("content-type", "")
+    multipart = content_type.startswith("multipart/form-data")
+
+    if multipart:
+        form = await request.form()
+        files = [upload for upload in form.getlist("file") if isinstance(upload, UploadFile)]
+
+        # Parts are spooled to disk by the parser; check their size before loading them
+        for upload in files:
+            size_error = check_size(upload.size)
+            if size_error:
+                return too_large(f"{upload.filename}: {size_error}")
+
+        uploads = [
+            (upload.filename or "upload", await upload.read(), upload.content_type or "")
+            for upload in files
+        ]
+    else:
+        content_length = request.headers.get("content-length")
+        size_error = None
+        if content_length:
+            try:
+                declared_size = int(content_length)
+            except ValueError:
+                declared_size = -1
+            if declared_size < 0:
+                return JSONResponse({"error": "Invalid Content-Length header"}, status_code=400)
+            size_error = check_size(declared_size)
+        if size_error:
+            return too_large(size_error)
+
+        file_bytes = await read_body(request)
+        if file_bytes is None:
+            return too_large(f"File too large: the limit is {MAX_UPLOAD_BYTES / 2**20:g} MB")
+
+        filename = request.query_params.get("filename", "upload")
+        uploads = [(filename, file_bytes, content_type)]
+
+    if not uploads or not all(file_bytes for _, file_bytes, _ in uploads):
+        return JSONResponse({"error": "No image uploaded"}, status_code=400)
+
+    if not admission.try_admit(len(uploads)):
+        return busy()
+
+    try:
+        records = await asyncio.gather(*(analyze_upload(*upload) for upload in uploads))
+    finally:
+        admission.release(len(uploads))
+
+    if multipart:
+        return JSONResponse({"results": records})
+    return JSONResponse(records[0])
+
+
+async def health(_request: Request) -> JSONResponse:
+    """Liveness check, failing when none of the configured C2PA readers can run."""
+    readers = get_c2pa_backends().tools
+    return JSONResponse(
+        {
+            "status": "ok" if readers else "no C2PA reader is available",
+            "c2pa_readers": readers,
+            "in_flight": admission.in_flight,
+            "capacity": admission.capacity,
+            "rejected": admission.rejected,
+        },
+        status_code=200 if readers else 503,
+    )
+
+
+async def metrics(_request: Request) -> PlainTextResponse:
+    """Prometheus scrape endpoint, served only when instrumentation is enabled."""
+    if not instrumentation.is_enabled():
+        return PlainTextResponse("Metrics are disabled; set GPTZERO_V_METRICS=1", status_code=404)
+    return PlainTextResponse(
+        instrumentation.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@asynccontextmanager
+async def lifespan(_app: Starlette) -> AsyncIterator[None]:
+    """Warm the C2PA readers up before serving, so that the first request does not pay for it."""
+    await asyncio.to_thread(warm_up_c2patool)
+    await asyncio.to_thread(get_c2pa_backends)
+    yield
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route("/analyze", analyze, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+)